@@ -9,8 +9,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import importlib
+
 __name__ = "MONAIStream"
 __version__ = "0.0.0"
 
-from .threadsafe import *
-from .verify import *
+__all__ = ["verify_install"]
+
+# submodules and their attributes are imported on first access, so that importing the package (eg. from a GStreamer
+# plugin loader) does not pull in Torch, MONAI or Ignite before something actually uses them
+_SUBMODULES = ("datasets", "streamrunner", "transforms", "verify")
+_LAZY_ATTRIBUTES = {"verify_install": "verify"}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"monaistream.{name}")
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(f"monaistream.{_LAZY_ATTRIBUTES[name]}"), name)
+    raise AttributeError(f"module 'monaistream' has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES) | set(_LAZY_ATTRIBUTES))
@@ -9,65 +9,221 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Callable
+import time
+from collections import deque
+from typing import Callable, Optional
 
 import torch
 
-from queue import Empty, Queue
-from threading import RLock
+from queue import Full
+from threading import Condition
 
+from monaistream.datasets.gstreamer.ring_buffer import FrameRingBuffer
 
-__all__ = ["IterableBufferDataset", "StreamSinkTransform"]
+__all__ = ["IterableBufferDataset", "OVERFLOW_POLICIES"]
 
 
-class IterableBufferDataset(torch.utils.data.IterableDataset):
-    """Defines a iterable dataset using a Queue object to permit asynchronous additions of new items, eg. frames."""
+# what `add_item` does when the buffer is full, named as the queue policies of the runners
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+
+class _Stop:
+    def __repr__(self):
+        return "STOP"
 
-    STOP = "STOP"  # stop sentinel used to indicate to the read thread to quit
 
-    def __init__(self, transform: Callable, buffer_size: int = 0, timeout: float = 0.01):
+class IterableBufferDataset(torch.utils.data.IterableDataset):
+    """
+    Defines a iterable dataset using a buffer to permit asynchronous additions of new items, eg. frames.
+
+    Iterating waits on a condition variable for items to arrive, so an idle consumer does not wake until there is
+    something to do. With `batch_size` set, each step yields a list of up to `batch_size` transformed items: all those
+    that arrived within `max_wait` seconds of the first, or fewer if iteration is ending. If `buffer_size` is greater
+    than 0, `overflow` decides what `add_item` does when the buffer holds that many items: "block" waits for room (for
+    at most `timeout` seconds if given, then raises `queue.Full`), "drop-oldest" discards the oldest buffered item and
+    "drop-newest" discards the new one. Dropped items are counted in `dropped`.
+
+    If `storage` is given, items are frames which `add_item` copies into slots of that `FrameRingBuffer` rather than
+    buffering the arrays themselves, and the buffer holds as many items as it has slots instead of `buffer_size`. What
+    is transformed and yielded is then a view of the storage: the frame of one slot, or with `batch_size` one batch
+    view over consecutive slots (a batch ends early where the slots are not adjacent), so frames are neither allocated
+    per item nor collated. The slots of a step are released when the next step is requested, so a consumer that keeps
+    what it was given beyond that must copy it.
+    """
+
+    STOP = _Stop()  # stop sentinel used to indicate to the read thread to quit
+
+    def __init__(
+        self,
+        transform: Callable,
+        buffer_size: int = 0,
+        timeout: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_wait: float = 0.0,
+        overflow: str = "block",
+        storage: Optional[FrameRingBuffer] = None,
+    ):
         super().__init__()
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow}; must be one of {OVERFLOW_POLICIES}")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
         self.transform = transform
         self.buffer_size = buffer_size
         self.timeout = timeout
-        self.buffer: Queue = Queue(self.buffer_size)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.overflow = overflow
+        self.storage = storage
+        self.dropped = 0
+        self._items = deque()
+        self._stop_queued = False
         self._is_running = False
-        self._lock = RLock()
+        self._cond = Condition()
 
     @property
     def is_running(self):
-        with self._lock:
+        with self._cond:
             return self._is_running
 
-    def add_item(self, item):
+    def _is_full(self):
+        return 0 < self.buffer_size <= len(self._items)
+
+    def add_item(self, item, timeout: Optional[float] = None):
         """
         The idea is that the source of the streaming data would add items here and these would be consumed by the
         engine immediately. The engine's `run` method would be running in the main or some other thread separate from
         the source, eg. something reading from port or from a device which puts individual video frames here.
+
+        Returns False if the item was dropped by the "drop-newest" policy. Adding `STOP` ends iteration once the items
+        before it have been consumed; it is never dropped and never waits for room.
         """
-        self.buffer.put(item, timeout=self.timeout)
+        timeout = self.timeout if timeout is None else timeout
+        if self.storage is not None and item is not IterableBufferDataset.STOP:
+            return self._add_to_storage(item, timeout)
+        with self._cond:
+            if item is IterableBufferDataset.STOP:
+                self._stop_queued = True
+            elif self._is_full():
+                if self.overflow == "drop-newest" or (self.overflow == "drop-oldest" and self._items[0] is self.STOP):
+                    self.dropped += 1
+                    return False
+                if self.overflow == "drop-oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                elif not self._cond.wait_for(lambda: not self._is_full(), timeout):
+                    raise Full()
+            self._items.append(item)
+            self._cond.notify_all()
+        return True
+
+    def _add_to_storage(self, frame, timeout):
+        slot = self.storage.try_acquire()
+        if slot is None:
+            if self.overflow == "drop-newest":
+                with self._cond:
+                    self.dropped += 1
+                return False
+            if self.overflow == "drop-oldest":
+                # reuse the slot of the oldest buffered frame, unless every slot is held by the consumer
+                with self._cond:
+                    if self._items and self._items[0] is not IterableBufferDataset.STOP:
+                        slot = self._items.popleft()
+                        self.dropped += 1
+            if slot is None:
+                slot = self.storage.acquire(timeout)
+
+        try:
+            self.storage.write_slot(slot, frame)
+        except Exception:
+            self.storage.release((slot,))
+            raise
+
+        with self._cond:
+            self._items.append(slot)
+            self._cond.notify_all()
+        return True
+
+    def clear(self):
+        """
+        Discard all buffered items, including a pending `STOP`.
+        """
+        with self._cond:
+            if self.storage is not None:
+                self.storage.release(i for i in self._items if i is not IterableBufferDataset.STOP)
+            self._items.clear()
+            self._stop_queued = False
+            self._cond.notify_all()
 
     def stop(self):
-        with self._lock:
+        """
+        End iteration now, without consuming the buffered items.
+        """
+        with self._cond:
             self._is_running = False
+            self._cond.notify_all()
+
+    def _take(self):
+        """
+        Wait for and remove the items of the next step, or return None if iteration should end.
+        """
+        with self._cond:
+            while True:
+                self._cond.wait_for(lambda: self._items or not self._is_running)
+                if not self._is_running:
+                    return None
+
+                count = 1
+                if self.batch_size is not None:
+                    deadline = time.monotonic() + self.max_wait
+                    while self._is_running and len(self._items) < self.batch_size and not self._stop_queued:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    count = min(self.batch_size, len(self._items))
+
+                if self._items and self._items[0] is IterableBufferDataset.STOP:
+                    self._items.popleft()
+                    self._stop_queued = any(i is IterableBufferDataset.STOP for i in self._items)
+                    return None
+
+                items = list()
+                while len(items) < count and self._items[0] is not IterableBufferDataset.STOP:
+                    if self.storage is not None and items and self._items[0] != items[-1] + 1:
+                        break  # a batch view can only span adjacent slots
+                    items.append(self._items.popleft())
+                if items:  # else the buffer was cleared while waiting for the batch to fill
+                    self._cond.notify_all()
+                    return items
 
     def __iter__(self):
         """
-        This will continually attempt to get an item from the queue until STOP is received or stop() called.
+        This will wait for items and yield them, transformed, until STOP is received or stop() called.
         """
-        with self._lock:
+        with self._cond:
             self._is_running = True
 
+        held = ()  # the slots of the storage given to the consumer in the last step
         try:
-            while self.is_running:  # checking exit condition prevents deadlock
-                try:
-                    item = self.buffer.get(timeout=self.timeout)
-
-                    if item == IterableBufferDataset.STOP:  # stop looping when sentinel received
-                        break
-
-                    yield self.transform(item)
-                except Empty:
-                    pass  # queue was empty this time, try again
+            while True:
+                if held:
+                    self.storage.release(held)
+                    held = ()
+                items = self._take()
+                if items is None:
+                    break
+                if self.storage is not None:
+                    held = items
+                    if self.batch_size is None:
+                        yield self.transform(self.storage.slot(items[0]))
+                    else:
+                        yield self.transform(self.storage.view(items[0], len(items)))
+                elif self.batch_size is None:
+                    yield self.transform(items[0])
+                else:
+                    yield [self.transform(i) for i in items]
         finally:
+            if held:
+                self.storage.release(held)
             self.stop()
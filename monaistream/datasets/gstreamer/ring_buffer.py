@@ -0,0 +1,124 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from queue import Full
+from threading import Condition
+from typing import Optional
+
+import numpy as np
+
+from monaistream.streamrunner.arrays import as_numpy, to_array_type
+
+__all__ = ["FrameRingBuffer"]
+
+
+class FrameRingBuffer:
+    """
+    Storage for `capacity` frames of one shape and dtype, preallocated as a single contiguous array of shape
+    (capacity, *frame_shape) of type `array_type` (see `register_array_type`), so frames written in consecutive slots
+    can be read back as a batch by slicing without collating them.
+
+    A producer acquires a free slot, fills it (with `write`, or directly through `slot` so the frame is produced in
+    place) and hands the slot index to the consumer, which releases it once done with its contents. Slots are handed out
+    round-robin, so slots written one after the other are usually adjacent and a consumer taking them in order gets
+    them as one view with `view`.
+    """
+
+    def __init__(self, capacity: int, frame_shape, dtype=np.uint8, array_type: str = "numpy"):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self._frames = np.empty((capacity,) + self.frame_shape, dtype)
+        self.storage = to_array_type(self._frames, array_type)  # shares the memory of self._frames
+        self._free = [True] * capacity
+        self._num_free = capacity
+        self._next = 0
+        self._cond = Condition()
+
+    @property
+    def free_slots(self):
+        with self._cond:
+            return self._num_free
+
+    def _take_free_slot(self):
+        for i in range(self.capacity):
+            slot = (self._next + i) % self.capacity
+            if self._free[slot]:
+                self._free[slot] = False
+                self._num_free -= 1
+                self._next = (slot + 1) % self.capacity
+                return slot
+        return None
+
+    def try_acquire(self) -> Optional[int]:
+        """
+        Take a free slot without waiting, or return None if there is none.
+        """
+        with self._cond:
+            return self._take_free_slot()
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """
+        Take a free slot, waiting for one to be released for at most `timeout` seconds (forever if None), after which
+        `queue.Full` is raised.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._num_free > 0, timeout):
+                raise Full()
+            return self._take_free_slot()
+
+    def release(self, slots):
+        """
+        Return `slots`, an iterable of slot indices, to the free slots.
+        """
+        with self._cond:
+            for slot in slots:
+                if self._free[slot]:
+                    raise ValueError(f"slot {slot} is not in use")
+                self._free[slot] = True
+                self._num_free += 1
+            self._cond.notify_all()
+
+    def slot(self, index: int):
+        """
+        The frame of slot `index`, a view of the storage.
+        """
+        return self.storage[index]
+
+    def view(self, start: int, count: int):
+        """
+        The `count` frames of the slots from `start`, which must not wrap around the end, as one batch view.
+        """
+        if start + count > self.capacity:
+            raise ValueError(f"slots {start} to {start + count - 1} wrap around the end of the buffer")
+        return self.storage[start : start + count]
+
+    def write_slot(self, index: int, frame):
+        """
+        Copy `frame`, a Numpy array or any array `as_numpy` can view, into slot `index`.
+        """
+        frame = as_numpy(frame)
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"frame shape {frame.shape} does not match the buffer's frame shape {self.frame_shape}")
+        np.copyto(self._frames[index], frame)
+
+    def write(self, frame, timeout: Optional[float] = None) -> int:
+        """
+        Copy `frame` into a newly acquired slot and return the slot's index.
+        """
+        index = self.acquire(timeout)
+        try:
+            self.write_slot(index, frame)
+        except Exception:
+            self.release((index,))
+            raise
+        return index
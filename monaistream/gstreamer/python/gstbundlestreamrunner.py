@@ -0,0 +1,15 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# gst-python plugin file, found through GST_PLUGIN_PATH=<repo>/monaistream/gstreamer; see registry.lazy_element_factory
+from monaistream.streamrunner.gstreamer.registry import lazy_element_factory
+
+__gstelementfactory__ = lazy_element_factory("gstbundlestreamrunner")
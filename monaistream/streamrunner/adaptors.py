@@ -1,6 +1,12 @@
+import time
+from queue import Queue
+from threading import Lock, Thread
+
 from ignite.engine import Engine, Events
 # from monai.engines.workflow import Workflow
 
+from monaistream.datasets.gstreamer.iterable_buffer_dataset import IterableBufferDataset
+
 
 class StreamingDataLoader:
     def __init__(self):
@@ -20,23 +26,124 @@ class StreamingDataLoader:
 
 
 class IgniteEngineAdaptor:
+    """
+    Adapts an Ignite engine to a runner's `do_op`, so each call runs one iteration of the engine on the frames passed
+    to it and returns the engine's output.
+
+    By default every call runs the engine with `engine.run` over a `StreamingDataLoader` holding the frames, and
+    interrupts it once the iteration completes. That pays for the engine's run setup and state reset on every frame,
+    so with `persistent` the engine instead runs once, on a background thread, over an `IterableBufferDataset` that
+    each call adds its frames to, and the outputs are handed back through a queue filled when each iteration
+    completes. If the engine's postprocessing ends in a `StreamSinkTransform`, pass it as `sink` to read the results
+    from it instead: what the sink holds when an iteration completes is that iteration's result (a list if the sink
+    split it into several), and a call whose result the sink's policy dropped raises `RuntimeError`. The persistent
+    engine is started by the first call and runs until `stop` is called.
+
+    Iterations are numbered in the order calls add their frames, so a call that timed out waiting, raising
+    `queue.Empty`, leaves its late result to be discarded rather than returned by the next call.
+    """
 
-    def __init__(self, engine, data_loader=StreamingDataLoader()):
+    DROPPED = object()  # queued instead of the output of an iteration whose result the sink dropped
+
+    def __init__(self, engine, data_loader=None, persistent=False, sink=None, timeout=10.0):
         self.running = False
         self.engine = engine
-        self.engine.add_event_handler(Events.ITERATION_COMPLETED, self._interrupt)
-        self.data_loader = data_loader
+        self.persistent = persistent
+        self.sink = sink
+        self.timeout = timeout
+
+        if persistent:
+            self.data_loader = IterableBufferDataset(transform=lambda item: item, buffer_size=1, timeout=timeout)
+            self._results = Queue()
+            self._call_lock = Lock()
+            self._thread = None
+            self._error = None
+            self._submitted = 0
+            self._completed = 0
+            self.engine.add_event_handler(Events.ITERATION_COMPLETED, self._put_result)
+        else:
+            self.data_loader = StreamingDataLoader() if data_loader is None else data_loader
+            self.engine.add_event_handler(Events.ITERATION_COMPLETED, self._interrupt)
 
     def _interrupt(self):
         self.engine.interrupt()
 
+    def _put_result(self):
+        self._completed += 1
+        if self.sink is None:
+            self._results.put((self._completed, self.engine.state.output))
+            return
+        # the sink's postprocessing ran before this, and earlier iterations' results were taken when they completed
+        results = self.sink.get_results()
+        result = self.DROPPED if not results else results[0] if len(results) == 1 else results
+        self._results.put((self._completed, result))
+
     def _stop(self):
         self.running = False
 
+    def start(self):
+        """
+        Start running the persistent engine on its background thread, if it is not running already.
+        """
+        if not self.persistent:
+            raise RuntimeError("Only a persistent IgniteEngineAdaptor runs in the background")
+        if self.running:
+            return
+        # drop what a previous run left behind, such as frames it did not get to and its stop marker
+        self.data_loader.clear()
+        while not self._results.empty():
+            self._results.get_nowait()
+        self._submitted = self._completed = 0
+        self._error = None
+        self.running = True
+        self._thread = Thread(target=self._run_engine, name="ignite-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the persistent engine once it has finished the frames already given to it, and wait for its thread.
+        """
+        if not self.persistent or self._thread is None:
+            return
+        if self._thread.is_alive():
+            self.data_loader.add_item(IterableBufferDataset.STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run_engine(self):
+        try:
+            # a stream has no length, so don't let the engine reuse the length of a previous run's stream
+            self.engine.state.epoch_length = None
+            self.engine.run(self.data_loader)
+        except Exception as e:
+            self._error = e
+        finally:
+            # wake a caller waiting for a result that will never come, before a new run can be started and clear it
+            self._results.put((None, self._results))
+            self._stop()
+
+    def _get_result(self, sequence):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            completed, result = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            if result is self._results:
+                raise RuntimeError("Ignite engine stopped before producing a result") from self._error
+            if completed < sequence:
+                continue  # the late result of a call that timed out
+            if result is self.DROPPED:
+                raise RuntimeError(f"Result of iteration {completed} was dropped by the sink")
+            return result
+
     def __call__(self, src):
-        # provide data sample 'src' to workflow dataset
-        print("IgniteEngineAdaptor: __call__")
-        self.data_loader.set_payload(src)
-        self.engine.run(self.data_loader)
-        print("engine.state.output:", type(self.engine.state.output))
-        return self.engine.state.output
+        if not self.persistent:
+            # provide data sample 'src' to workflow dataset
+            self.data_loader.set_payload(src)
+            self.engine.run(self.data_loader)
+            return self.engine.state.output
+
+        # calls may come from several threads; keep each result paired with its frames
+        with self._call_lock:
+            self.start()
+            self.data_loader.add_item(src)
+            self._submitted += 1
+            return self._get_result(self._submitted)
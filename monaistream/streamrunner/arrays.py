@@ -0,0 +1,136 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+__all__ = [
+    "ArrayType",
+    "register_array_type",
+    "get_array_type",
+    "array_types",
+    "to_array_type",
+    "as_numpy",
+    "array_data_pointer",
+]
+
+
+@dataclass(frozen=True)
+class ArrayType:
+    """
+    How frames are handed to `do_op` as arrays of one library and how its results are read back. `from_numpy` wraps a
+    Numpy view over mapped buffer memory without copying, unless the view is read-only and the library cannot express
+    read-only arrays, in which case it copies; `to_numpy` gets a Numpy view of a result (copying only if it is not in
+    host memory) and `is_instance` recognises the library's arrays.
+    """
+
+    name: str
+    from_numpy: Callable
+    to_numpy: Callable
+    is_instance: Callable
+
+
+_ARRAY_TYPES = dict()
+
+
+def register_array_type(name, from_numpy, to_numpy, is_instance):
+    """
+    Register an array library under `name`, so runners accept it as their `array_type`.
+    """
+    _ARRAY_TYPES[name] = ArrayType(name, from_numpy, to_numpy, is_instance)
+    return _ARRAY_TYPES[name]
+
+
+def get_array_type(name):
+    array_type = _ARRAY_TYPES.get(name)
+    if array_type is None:
+        raise ValueError(f"unknown array type {name}; must be one of {array_types()}")
+    return array_type
+
+
+def array_types():
+    return tuple(_ARRAY_TYPES.keys())
+
+
+def to_array_type(frame, name):
+    """
+    Convert `frame`, a Numpy array or a tuple of per-plane arrays, to array type `name`, without copying unless the
+    type has no read-only arrays and `frame` is read-only.
+    """
+    if name == "numpy":
+        return frame
+    from_numpy = get_array_type(name).from_numpy
+    if isinstance(frame, tuple):
+        return tuple(from_numpy(p) for p in frame)
+    return from_numpy(frame)
+
+
+def as_numpy(array):
+    """
+    Get a Numpy view of `array`, which is a Numpy array, an array of a registered type, or any other array supporting
+    DLPack or the array interface.
+    """
+    if isinstance(array, np.ndarray):
+        return array
+    for array_type in _ARRAY_TYPES.values():
+        if array_type.is_instance(array):
+            return array_type.to_numpy(array)
+    if hasattr(array, "__dlpack__"):
+        return np.from_dlpack(array)
+    return np.asarray(array)
+
+
+def array_data_pointer(array):
+    """
+    Get the address of the first element of `array`, as viewed by `as_numpy`.
+    """
+    return as_numpy(array).__array_interface__["data"][0]
+
+
+def _is_torch_tensor(obj):
+    torch = _torch_module()
+    return torch is not None and isinstance(obj, torch.Tensor)
+
+
+_torch = None
+
+
+def _torch_module():
+    global _torch
+    if _torch is None:
+        import sys
+
+        # never import torch just to check whether an object is a tensor
+        _torch = sys.modules.get("torch")
+    return _torch
+
+
+def _torch_from_numpy(array):
+    import torch
+
+    # torch has no read-only tensors, so a read-only array, eg. over a shared input buffer mapped for reading, is
+    # copied rather than wrapped in a tensor an op could write through
+    return torch.from_numpy(array if array.flags.writeable else array.copy())
+
+
+def _torch_to_numpy(tensor):
+    tensor = tensor.detach()
+    if tensor.device.type != "cpu":
+        tensor = tensor.cpu()
+    if tensor.is_conj() or tensor.is_neg():
+        tensor = tensor.resolve_conj().resolve_neg()
+    return tensor.numpy()
+
+
+register_array_type("numpy", lambda a: a, lambda a: a, lambda a: isinstance(a, np.ndarray))
+register_array_type("torch", _torch_from_numpy, _torch_to_numpy, _is_torch_tensor)
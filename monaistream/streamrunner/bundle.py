@@ -0,0 +1,187 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+
+from monai.bundle import ConfigParser
+from monai.transforms import Compose, MapTransform
+from monai.utils.enums import CommonKeys
+
+__all__ = ["DEFAULT_CONFIG_FILE", "BundleComponents", "load_bundle", "clear_bundle_cache", "BundleRunner"]
+
+
+DEFAULT_CONFIG_FILE = os.path.join("configs", "inference.json")
+
+_BUNDLE_CACHE = dict()
+_BUNDLE_USERS = dict()  # cache key -> number of open `BundleRunner`s using the cached components
+_BUNDLE_CACHE_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class BundleComponents:
+    """
+    The components of a bundle's inference config used to run it on frames. `preprocessing` and `postprocessing` may
+    be None if the config has none, and `dict_preprocessing`/`dict_postprocessing` tell whether they take dicts.
+    """
+
+    preprocessing: Any
+    network: Any
+    inferer: Any
+    postprocessing: Any
+    device: Any
+    image_key: str
+    dict_preprocessing: bool
+    dict_postprocessing: bool
+
+
+def load_bundle(bundle_path, config_file=DEFAULT_CONFIG_FILE, overrides=None):
+    """
+    Parse the bundle config `config_file`, relative to `bundle_path`, and instantiate its `preprocessing`, `network`,
+    `inferer` and `postprocessing`. `overrides` is a dict of config ids to values replacing those of the config, such
+    as {"device": "$torch.device('cpu')"}. The components are cached per process, so loading the same bundle again,
+    eg. when a pipeline is restarted, returns the same components without parsing the config or building the network.
+    """
+    overrides = dict(overrides or {})
+    key = _cache_key(bundle_path, config_file, overrides)
+
+    with _BUNDLE_CACHE_LOCK:
+        components = _BUNDLE_CACHE.get(key)
+        if components is None:
+            components = _BUNDLE_CACHE[key] = _instantiate_bundle(bundle_path, config_file, overrides)
+    return components
+
+
+def clear_bundle_cache():
+    with _BUNDLE_CACHE_LOCK:
+        _BUNDLE_CACHE.clear()
+        _BUNDLE_USERS.clear()
+
+
+def _cache_key(bundle_path, config_file, overrides):
+    overrides = dict(overrides or {})
+    return os.path.realpath(bundle_path), config_file, tuple(sorted((k, repr(v)) for k, v in overrides.items()))
+
+
+def _instantiate_bundle(bundle_path, config_file, overrides):
+    config_path = os.path.join(bundle_path, config_file)
+    if not os.path.isfile(config_path):
+        raise ValueError(f"bundle config {config_path} not found")
+
+    parser = ConfigParser()
+    parser.read_config(config_path)
+    parser["bundle_root"] = bundle_path
+    parser.update(overrides)
+
+    for required in ("network", "inferer"):
+        if required not in parser:
+            raise ValueError(f"bundle config {config_path} has no `{required}`")
+
+    network = parser.get_parsed_content("network")
+    network.eval()
+    preprocessing = parser.get_parsed_content("preprocessing") if "preprocessing" in parser else None
+    postprocessing = parser.get_parsed_content("postprocessing") if "postprocessing" in parser else None
+    device = parser.get_parsed_content("device") if "device" in parser else next(network.parameters()).device
+
+    return BundleComponents(
+        preprocessing=preprocessing,
+        network=network,
+        inferer=parser.get_parsed_content("inferer"),
+        postprocessing=postprocessing,
+        device=torch.device(device),
+        image_key=parser.get("image_key", CommonKeys.IMAGE),
+        dict_preprocessing=_is_dict_transform(preprocessing),
+        dict_postprocessing=_is_dict_transform(postprocessing),
+    )
+
+
+def _is_dict_transform(transform):
+    if isinstance(transform, Compose):
+        return any(isinstance(t, MapTransform) for t in transform.flatten().transforms)
+    return isinstance(transform, MapTransform)
+
+
+class BundleRunner:
+    """
+    Runs a MONAI bundle's inference on frames, for use as a runner's `do_op`. Each call takes a list of frames, one per
+    input, which are (height, width, channels) arrays, and returns a list of results, one per frame: the frames are
+    preprocessed, inferred on together as one batch if their shapes match, and postprocessed. This applies the bundle's
+    components directly, without building a dataset, data loader and evaluator around every frame.
+
+    The bundle is loaded with `load_bundle`, so runners created for the same bundle share its components. With dict
+    postprocessing the result is the `pred_key` item of its output, as written by `SupervisedEvaluator`. `close` drops
+    the runner's components but keeps them cached, so a pipeline closed and restarted does not rebuild the network.
+    `unload` also drops the cache entry once no other open runner uses it, eg. when the runner has been swapped out
+    for another model, so the network's memory can be freed.
+    """
+
+    def __init__(self, bundle_path, config_file=DEFAULT_CONFIG_FILE, overrides=None, pred_key=CommonKeys.PRED):
+        self.bundle_path = bundle_path
+        self.pred_key = pred_key
+        self.components = load_bundle(bundle_path, config_file, overrides)
+        self._cache_key = _cache_key(bundle_path, config_file, overrides)
+        with _BUNDLE_CACHE_LOCK:
+            if _BUNDLE_CACHE.get(self._cache_key) is self.components:
+                _BUNDLE_USERS[self._cache_key] = _BUNDLE_USERS.get(self._cache_key, 0) + 1
+
+    def close(self):
+        self._release(evict=False)
+
+    def unload(self):
+        self._release(evict=True)
+
+    def _release(self, evict):
+        if self.components is None:
+            return
+        with _BUNDLE_CACHE_LOCK:
+            # components dropped from the cache meanwhile, eg. by `clear_bundle_cache`, no longer count their users
+            if _BUNDLE_CACHE.get(self._cache_key) is self.components:
+                users = _BUNDLE_USERS.pop(self._cache_key, 1) - 1
+                if users > 0:
+                    _BUNDLE_USERS[self._cache_key] = users
+                elif evict:
+                    del _BUNDLE_CACHE[self._cache_key]
+        self.components = None
+
+    def preprocess(self, frame):
+        if isinstance(frame, tuple):
+            raise ValueError("bundles need packed frames; set convert_yuv for planar YUV inputs")
+        c = self.components
+        if c.preprocessing is None:
+            return torch.as_tensor(frame)
+        if c.dict_preprocessing:
+            return c.preprocessing({c.image_key: frame})[c.image_key]
+        return c.preprocessing(frame)
+
+    def postprocess(self, image, pred):
+        c = self.components
+        if c.postprocessing is None:
+            return pred
+        if c.dict_postprocessing:
+            return c.postprocessing({c.image_key: image, self.pred_key: pred})[self.pred_key]
+        return c.postprocessing(pred)
+
+    def infer(self, images):
+        c = self.components
+        with torch.inference_mode():
+            if all(i.shape == images[0].shape for i in images):
+                batch = torch.stack([torch.as_tensor(i) for i in images]).to(c.device)
+                return list(c.inferer(batch, c.network))
+            return [c.inferer(torch.as_tensor(i)[None].to(c.device), c.network)[0] for i in images]
+
+    def __call__(self, frames):
+        images = [self.preprocess(f) for f in frames]
+        preds = self.infer(images)
+        return [self.postprocess(i, p) for i, p in zip(images, preds)]
@@ -0,0 +1,288 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import gi
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+import numpy as np
+
+from monaistream.streamrunner.arrays import as_numpy
+from monaistream.streamrunner.gstreamer.bufferpool import OutputBufferPool
+from monaistream.streamrunner.gstreamer.utils import (
+    BufferTimestamps,
+    VideoLayout,
+    copy_buffer_timestamps,
+    map_buffer_to_numpy,
+)
+
+__all__ = ["AppSinkReader", "AppSrcFeeder", "AppBridgeBin"]
+
+
+class AppSinkReader:
+    """
+    Pull-mode reader of an `appsink`, for Python code consuming a pipeline's output without a plugin. Signals are
+    disabled, so no Python callback runs on the streaming thread per sample, and `pull` drains every queued sample in
+    one call with `try-pull-sample`. The appsink holds at most `max_buffers` samples and with `drop` discards the oldest
+    when the reader falls behind, which is what a live source needs; otherwise it blocks upstream.
+
+    `start` runs a thread which passes each drained list of samples to a callback, in place of the `new-sample` signal.
+    The thread ends at EOS and is started again when a flushing seek restarts the stream, until `stop` is called.
+    """
+
+    def __init__(self, appsink, max_buffers=2, drop=True):
+        self.appsink = appsink
+        appsink.set_property("emit-signals", False)
+        appsink.set_property("sync", False)
+        appsink.set_property("max-buffers", max_buffers)
+        appsink.set_property("drop", drop)
+        self._caps = None
+        self._layout = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = None  # Event set while the current thread should keep reading
+        self._run_args = None  # arguments of the thread started by `start`, until `stop`
+        appsink.get_static_pad("sink").add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._on_event)
+
+    @property
+    def is_eos(self):
+        return self.appsink.get_property("eos")
+
+    def pull(self, max_n=None, timeout=0.0):
+        """
+        Take up to `max_n` samples (all queued samples if None), waiting for at most `timeout` seconds for the first.
+        Returns an empty list if there were none, eg. at EOS or while the appsink is not playing.
+        """
+        sample = self.appsink.emit("try-pull-sample", int(timeout * Gst.SECOND))
+        samples = list()
+        while sample is not None:
+            samples.append(sample)
+            if max_n is not None and len(samples) >= max_n:
+                break
+            sample = self.appsink.emit("try-pull-sample", 0)
+        return samples
+
+    def pull_frames(self, max_n=None, timeout=0.0):
+        """
+        As `pull`, but returns a (frame, `BufferTimestamps`) pair for each sample, where the frame is a copy of the
+        sample's video frame (a tuple of planes for planar formats), so the sample's buffer is released at once.
+        """
+        frames = list()
+        for sample in self.pull(max_n, timeout):
+            caps = sample.get_caps()
+            if self._caps is None or not self._caps.is_equal(caps):
+                self._caps, self._layout = caps, VideoLayout.from_caps(caps)
+            buffer = sample.get_buffer()
+            with map_buffer_to_numpy(buffer, Gst.MapFlags.READ, self._layout) as frame:
+                frame = tuple(np.array(p) for p in frame) if isinstance(frame, tuple) else np.array(frame)
+            frames.append((frame, BufferTimestamps.from_buffer(buffer)))
+        return frames
+
+    def start(self, callback, max_n=None, timeout=0.1):
+        """
+        Call `callback(samples)` on a new thread with each non-empty list of samples drained by `pull`, until `stop` is
+        called or the appsink reaches EOS.
+        """
+        with self._lock:
+            self._run_args = (callback, max_n, timeout)
+            self._start_thread()
+
+    def _start_thread(self):
+        # called with `_lock` held; a thread that ended at EOS is replaced
+        if self._running is not None and self._running.is_set():
+            return
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._running, *self._run_args), name=f"{self.appsink.get_name()}-reader",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._run_args = None
+            if self._running is not None:
+                self._running.clear()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _on_event(self, pad, info):
+        # a new segment follows a flushing seek, once the appsink has handled the flush and cleared its EOS
+        if info.get_event().type == Gst.EventType.SEGMENT:
+            with self._lock:
+                if self._run_args is not None:
+                    self._start_thread()
+        return Gst.PadProbeReturn.OK
+
+    def _run(self, running, callback, max_n, timeout):
+        while running.is_set():
+            samples = self.pull(max_n, timeout)
+            if samples:
+                callback(samples)
+                continue
+            with self._lock:
+                # checked under the lock so a new segment either sees this thread running or restarts it
+                if self.is_eos:
+                    running.clear()
+
+
+class AppSrcFeeder:
+    """
+    Feeds frames from Python into an `appsrc` in bulk: `push` copies a list of frames into buffers taken from an
+    `OutputBufferPool` sized from `caps`, so their memory is reused once downstream releases them, and pushes them as
+    one `Gst.BufferList`. The appsrc is set up as a live source in TIME format that blocks the caller when more than
+    `max_bytes` are queued (if greater than 0), rather than queueing without bound.
+
+    Frames without timestamps are stamped from a running clock starting at 0 and advancing by the frame duration of
+    the caps' framerate.
+    """
+
+    def __init__(self, appsrc, caps=None, min_buffers=2, max_buffers=0, is_live=True, max_bytes=0):
+        self.appsrc = appsrc
+        if caps is not None:
+            appsrc.set_property("caps", caps)
+        self.caps = appsrc.get_property("caps")
+        if self.caps is None:
+            raise ValueError(f"appsrc {appsrc.get_name()} needs fixed caps to feed frames")
+        appsrc.set_property("format", Gst.Format.TIME)
+        appsrc.set_property("is-live", is_live)
+        appsrc.set_property("emit-signals", False)
+        if max_bytes > 0:
+            appsrc.set_property("max-bytes", max_bytes)
+            appsrc.set_property("block", True)
+
+        self.min_buffers = min_buffers
+        self.max_buffers = max_buffers
+        self._pool = None
+        self._next_pts = 0
+        success, num, den = self.caps.get_structure(0).get_fraction("framerate")
+        self.duration = Gst.util_uint64_scale_int(Gst.SECOND, den, num) if success and num > 0 else Gst.CLOCK_TIME_NONE
+
+    def _acquire(self):
+        if self._pool is None:
+            self._pool = OutputBufferPool(self.caps, self.min_buffers, self.max_buffers)
+        return self._pool.acquire()
+
+    def _write(self, frame):
+        buffer = self._acquire()
+        with map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, self._pool.layout) as target:
+            if isinstance(target, tuple):
+                for plane, source in zip(target, frame):
+                    np.copyto(plane, as_numpy(source).reshape(plane.shape))
+            else:
+                np.copyto(target, as_numpy(frame).reshape(target.shape))
+        return buffer
+
+    def _stamp(self, buffer, timestamps):
+        if timestamps is None:
+            buffer.pts = self._next_pts
+            buffer.duration = self.duration
+            if self.duration != Gst.CLOCK_TIME_NONE:
+                self._next_pts += self.duration
+        elif isinstance(timestamps, BufferTimestamps):
+            copy_buffer_timestamps(timestamps, buffer)
+        else:
+            buffer.pts = timestamps
+            buffer.duration = self.duration
+
+    def push(self, frames, timestamps=None):
+        """
+        Push `frames`, arrays in the caps' layout (tuples of planes for planar formats), as one buffer list. Each frame
+        is stamped with the entry of `timestamps` at its index, a PTS or `BufferTimestamps`, or from the running clock
+        if `timestamps` is None. Returns the appsrc's flow return.
+        """
+        buffer_list = Gst.BufferList.new_sized(len(frames))
+        for i, frame in enumerate(frames):
+            buffer = self._write(frame)
+            self._stamp(buffer, None if timestamps is None else timestamps[i])
+            buffer_list.insert(-1, buffer)
+        return self.appsrc.emit("push-buffer-list", buffer_list)
+
+    def end_of_stream(self):
+        return self.appsrc.emit("end-of-stream")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        self._next_pts = 0
+
+
+class AppBridgeBin(Gst.Bin):
+    """
+    Bin wrapping a pipeline description, eg. "appsrc name=myappsrc ! videoconvert ! appsink name=myappsink", so a pure
+    Python application can drive it with `feeder` (an `AppSrcFeeder` over the appsrc named `appsrc_name`, if any) and
+    `reader` (an `AppSinkReader` over the appsink named `appsink_name`, if any). The feeder is created when first used,
+    so the appsrc's caps may be given by `caps`, the description or set on the appsrc any time before then. Pads the
+    description leaves unlinked are exposed as ghost pads named "sink", "src" (or "sink_1", "src_1", ... if there are
+    several), so the bin can also be linked into a larger pipeline.
+
+    If `on_samples` is given, the reader's thread calls it with each drained list of samples while the bin is PAUSED
+    or PLAYING.
+    """
+
+    def __init__(
+        self,
+        pipeline_desc,
+        appsrc_name="myappsrc",
+        appsink_name="myappsink",
+        caps=None,
+        max_buffers=2,
+        drop=True,
+        on_samples=None,
+    ):
+        super().__init__()
+        inner = Gst.parse_bin_from_description(pipeline_desc, False)
+        for element in list(inner.children):
+            inner.remove(element)
+            self.add(element)
+        self._ghost_unlinked_pads()
+
+        appsink = self.get_by_name(appsink_name)
+        self._appsrc = self.get_by_name(appsrc_name)
+        self._caps = caps
+        self._feeder = None
+        self.reader = None if appsink is None else AppSinkReader(appsink, max_buffers, drop)
+        self.on_samples = on_samples
+
+    @property
+    def feeder(self):
+        if self._feeder is None and self._appsrc is not None:
+            self._feeder = AppSrcFeeder(self._appsrc, self._caps)
+        return self._feeder
+
+    def _ghost_unlinked_pads(self):
+        counts = {Gst.PadDirection.SINK: 0, Gst.PadDirection.SRC: 0}
+        for element in self.children:
+            for pad in element.pads:
+                if pad.is_linked() or pad.direction not in counts:
+                    continue
+                prefix = "sink" if pad.direction == Gst.PadDirection.SINK else "src"
+                index = counts[pad.direction]
+                counts[pad.direction] += 1
+                ghost = Gst.GhostPad.new(prefix if index == 0 else f"{prefix}_{index}", pad)
+                ghost.set_active(True)
+                self.add_pad(ghost)
+
+    def do_change_state(self, transition):
+        if transition == Gst.StateChange.PAUSED_TO_READY:
+            if self.reader is not None:
+                self.reader.stop()
+            if self._feeder is not None:
+                self._feeder.close()
+        ret = Gst.Bin.do_change_state(self, transition)
+        if transition == Gst.StateChange.READY_TO_PAUSED and self.reader is not None and self.on_samples is not None:
+            self.reader.start(self.on_samples)
+        return ret
@@ -1,19 +1,59 @@
+import itertools
 import threading
+import time
+from contextlib import ExitStack
+from functools import partial
 
 import gi
 gi.require_version('Gst', '1.0')
-from gi.repository import Gst
+from gi.repository import Gst, GLib, GObject
 
 
 import numpy as np
 
-import torch
 
-
-from monaistream.streamrunner.gstreamer.utils import PadEntry
-
-
-Gst.init(None)
+from monaistream.streamrunner.arrays import get_array_type, to_array_type
+from monaistream.streamrunner.gstreamer.batching import (
+    FrameBatcher,
+    FrameSet,
+    batch_inputs_by_shape,
+    scatter_batches,
+    stack_frames,
+    unstack_result,
+)
+from monaistream.streamrunner.gstreamer.bufferpool import OutputPools
+from monaistream.streamrunner.gstreamer.processes import ProcessWorkerPool
+from monaistream.streamrunner.gstreamer.qos import QOS_MODES, QosController
+from monaistream.streamrunner.gstreamer.sync import InputSynchronizer
+from monaistream.streamrunner.gstreamer.workers import OrderedWorkerPool
+from monaistream.streamrunner.gstreamer.utils import (
+    BufferTimestamps,
+    LayoutCache,
+    PadEntry,
+    array_data_pointer,
+    array_to_buffer,
+    MetricsPoster,
+    check_buffer_qos,
+    copy_buffer_timestamps,
+    map_buffer_to_numpy,
+    yuv_to_rgb,
+)
+from monaistream.streamrunner.metrics import (
+    DROPPED_FRAMES,
+    FRAMES,
+    IN_FLIGHT,
+    MAP_SECONDS,
+    OP_SECONDS,
+    OUTPUT_FRAMES,
+    QUEUE_DEPTH,
+    default_registry,
+)
+from monaistream.streamrunner.queues import QUEUE_POLICIES, InputQueues, parse_queue_policy
+
+
+# the pad templates below need an initialised GStreamer; when loaded as a plugin it already is, which makes this free
+if not Gst.is_initialized():
+    Gst.init(None)
 
 
 class GstStreamRunnerBackendStatic(Gst.Element):
@@ -69,14 +109,13 @@ class GstStreamRunnerBackendStatic(Gst.Element):
     def do_chain(self, pad, parent, buffer):
 
         with self._lock:
-            print("=======================================")
-            print(f"do_chain called on {pad.get_name()} with thread id {threading.get_ident()}")
+            Gst.debug(f"do_chain called on {pad.get_name()} with thread id {threading.get_ident()}")
             if pad == self.sinkpad_0:
                 self.buffer_0 = buffer
             elif pad == self.sinkpad_1:
                 self.buffer_1 = buffer
             else:
-                print("Unexpected pad!")
+                Gst.warning(f"do_chain called on unexpected pad {pad.get_name()}")
 
             if self.buffer_0 and self.buffer_1:
                 buffers = (self.buffer_0, self.buffer_1)
@@ -88,13 +127,11 @@ class GstStreamRunnerBackendStatic(Gst.Element):
                     # Extract data from buffer
                     success, map_info = buffer.map(Gst.MapFlags.READ)
                     if not success:
-                        print("Unexpected failure!")
+                        Gst.error(f"Failed to map buffer from {sinkpad.get_name()}")
                         return Gst.FlowReturn.ERROR
 
                     caps = sinkpad.get_current_caps().get_structure(0)
-                    # print("caps:", caps)
                     height, width, channels = caps.get_value("height"), caps.get_value("width"), caps.get_value("channels")
-                    # print("data:", len(map_info.data))
                     frame = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
                     frames.append(frame)
                     buffer.unmap(map_info)
@@ -128,113 +165,993 @@ class GstStreamRunnerBackendStatic(Gst.Element):
 
 class GstStreamRunnerBackend(Gst.Element):
     __gstmetadata__ = ("GstStreamRunnerBackend", "Filter", "Overlay images", "Author")
+    __gsttemplates__ = (
+        Gst.PadTemplate.new("sink_%u", Gst.PadDirection.SINK, Gst.PadPresence.REQUEST, Gst.Caps.new_any()),
+        Gst.PadTemplate.new("src_%u", Gst.PadDirection.SRC, Gst.PadPresence.REQUEST, Gst.Caps.new_any()),
+    )
 
-    def __init__(self, inputs=None, outputs=None, do_op=None, array_type="numpy"):
+    __gproperties__ = {
+        "max-batch": (
+            int, "Max batch", "Maximum number of consecutive frames stacked into one do_op call",
+            1, GLib.MAXINT, 1, GObject.ParamFlags.READWRITE,
+        ),
+        "max-wait-ms": (
+            float, "Max wait ms", "Longest time in milliseconds a frame waits for its batch to fill",
+            0.0, GLib.MAXDOUBLE, 0.0, GObject.ParamFlags.READWRITE,
+        ),
+        "batch-inputs": (
+            bool, "Batch inputs", "Stack same-shaped inputs into one channels-first batch per do_op call",
+            False, GObject.ParamFlags.READWRITE,
+        ),
+        "n-workers": (
+            int, "Worker threads", "Number of threads running do_op; 0 runs it on the streaming thread",
+            0, GLib.MAXINT, 0, GObject.ParamFlags.READWRITE,
+        ),
+        "n-processes": (
+            int, "Worker processes", "Number of processes running do_op over shared memory; 0 to run it in-process",
+            0, GLib.MAXINT, 0, GObject.ParamFlags.READWRITE,
+        ),
+        "max-in-flight": (
+            int, "Max in flight", "Maximum number of frames queued or being processed by the workers",
+            1, GLib.MAXINT, 2, GObject.ParamFlags.READWRITE,
+        ),
+        "queue-policy": (
+            str, "Queue policy", f"Policy of the per-input queues, one of {', '.join(QUEUE_POLICIES)}; unset for none",
+            None, GObject.ParamFlags.READWRITE,
+        ),
+        "qos-mode": (
+            str, "QoS mode", f"What to do with frames that are already late, one of {', '.join(QOS_MODES)}",
+            "off", GObject.ParamFlags.READWRITE,
+        ),
+        "max-lateness-ms": (
+            float, "Max lateness ms", "How late in milliseconds a frame may be and still be processed",
+            0.0, GLib.MAXDOUBLE, 0.0, GObject.ParamFlags.READWRITE,
+        ),
+        "sync-tolerance-ms": (
+            float, "Sync tolerance ms", "Largest timestamp difference between aligned inputs; negative for any",
+            -1.0, GLib.MAXDOUBLE, -1.0, GObject.ParamFlags.READWRITE,
+        ),
+        "primary-input": (
+            str, "Primary input", "Name of the sink pad whose buffers trigger do_op; unset for the first",
+            None, GObject.ParamFlags.READWRITE,
+        ),
+        "metrics-interval-ms": (
+            float, "Metrics interval ms", "Interval between monaistream-metrics bus messages; 0 to only post at EOS",
+            0.0, GLib.MAXDOUBLE, 0.0, GObject.ParamFlags.READWRITE,
+        ),
+    }
+
+    def __init__(
+        self,
+        inputs=None,
+        outputs=None,
+        do_op=None,
+        array_type="numpy",
+        preallocate_outputs=False,
+        convert_yuv=False,
+        max_batch=1,
+        max_wait_ms=0.0,
+        batch_inputs=False,
+        n_workers=0,
+        n_processes=0,
+        max_in_flight=2,
+        queue_policy=None,
+        qos_mode="off",
+        max_lateness_ms=0.0,
+        sync_tolerance_ms=None,
+        primary_input=None,
+        metrics=None,
+        metrics_interval_ms=0.0,
+    ):
+        """
+        Inputs may be packed RGB/GRAY formats, which `do_op` receives as (height, width, channels) arrays, or planar
+        NV12/I420, which it receives as a tuple of per-plane arrays. If `convert_yuv` is True, planar YUV inputs are
+        instead converted to float RGB in [0, 1] by `yuv_to_rgb`, so pipelines need no `videoconvert` before the runner.
+
+        If `preallocate_outputs` is True, each src pad gets a buffer pool sized from its caps and `do_op` is called as
+        `do_op(sink_data, src_data)`, where `src_data` holds writable arrays mapped over the pooled output buffers. The
+        op fills these in place and its return value is ignored, so no output memory is allocated or copied per frame.
+
+        If `max_batch` is greater than 1, consecutive frame sets are accumulated until `max_batch` have arrived or the
+        first has waited `max_wait_ms`, and `do_op` receives one batch per input stacked along a new leading axis. It
+        returns one batched result per output, which is split back into per-frame buffers carrying the timestamps of
+        the frames they came from. With `preallocate_outputs`, `src_data[i]` is then a list of per-frame output arrays.
+
+        If `batch_inputs` is True, inputs with the same shape and dtype are stacked into one (N, C, H, W) batch (see
+        `batch_inputs_by_shape`) and `do_op` receives a list with one batch per group of inputs, which is a single batch
+        when all inputs share their caps. It returns one channels-first result batch per group, whose entries are
+        scattered back to the src pads with the same indices as the inputs they came from. This cannot be combined
+        with `preallocate_outputs`.
+
+        If `n_workers` is greater than 0, `do_chain` only maps the frames and enqueues them, and `do_op` runs on a pool
+        of that many worker threads, so the upstream streaming thread does not stall for the whole inference and
+        several frames can be in flight. Results are pushed downstream in arrival order, which is PTS order, and at most
+        `max_in_flight` frames (or batches) are queued or being processed before `do_chain` blocks.
+
+        If `n_processes` is greater than 0, `do_op` instead runs in a `ProcessWorkerPool` of that many worker processes,
+        so Python-heavy operations use more than one core. `do_chain` copies the frames into a shared memory ring of
+        `max_in_flight` slots and the results come back through another, reordered by sequence before being pushed with
+        the timestamps of their frames. A worker process that dies is replaced and the frames it held are dropped. The
+        op must be given as `do_op` and be picklable, eg. a module level function, and this cannot be combined with
+        `preallocate_outputs`, `batch_inputs` or `max_batch` above 1.
+
+        If `queue_policy` is set (see `QueuePolicy`), each input gets its own queue applying that policy and `do_chain`
+        only enqueues the buffer, so upstream is never held up by inference unless the policy is "block". A dispatcher
+        thread takes the queued buffers in arrival order and aligns them into frame sets as described below, which it
+        processes as above. Frames dropped by the policy are counted in `queue_stats`.
+
+        If `qos_mode` is "drop" or "skip", frames that are already later than `max_lateness_ms` when they are about to
+        be processed, either according to QoS events from downstream or against the pipeline clock, are dropped, or
+        with "skip" passed through without running `do_op` to each src pad whose caps equal those of the sink pad with
+        the same index (other src pads get nothing). Decisions are counted in `qos_stats`; see `check_buffer_qos`.
+
+        Inputs are aligned on their running times: each buffer arriving on `primary_input` (the first sink pad if
+        None) is matched with the buffer of each other input closest to it in time, within `sync_tolerance_ms` if set,
+        and `do_op` runs once per primary buffer. A primary buffer waits while another input lags behind it and is
+        dropped if no buffer within tolerance arrives; other inputs' buffers are released once superseded. Counts are
+        in `sync_stats`; see `InputSynchronizer`. Each input only holds its own slot, and no synchronizer lock is held
+        during `do_op`.
+
+        Inputs and outputs can be added and removed while the pipeline is playing, with `add_input`, `remove_input`,
+        `add_output` and `remove_output` or as "sink_%u" and "src_%u" request pads, without interrupting the other
+        streams. Each frame set carries the sink pads it was formed with and each frame's results go to the src pads
+        there were when it was processed, so no lock is held across `do_op` for this. An input reaching EOS leaves the
+        frame sets until it is flushed, and EOS is only sent downstream once every input has ended.
+
+        Frame counts, `do_op` and map/unmap times, queue depths, frames in flight and drops are reported into `metrics`,
+        a `MetricsRegistry` (the default registry if None), labelled with the element name; `metrics` returns the
+        element's current values. They are also posted on the bus every `metrics_interval_ms` and at EOS.
+        """
         super().__init__()
         self._lock = threading.Lock()
-
-        print(f"inputs = {inputs}")
-        # if inputs is None:
-        #     inputs = [
-        #         PadEntry("sink_0", "video/x-raw, format=BGR, width=256, height=256"),
-        #         PadEntry("sink_1", "video/x-raw, format=BGR, width=128, height=128"),
-        #     ]
-        # if outputs is None:
-        #     outputs = [
-        #         PadEntry("src_0", "video/x-raw, format=BGR, width=256, height=256"),
-        #         PadEntry("src_1", "video/x-raw, format=BGR, width=128, height=128"),
-        #     ]
-
-        self._array_type = array_type
-        self._frombuffer = np.frombuffer if array_type == "numpy" else torch.frombuffer
-        self._tobuffer = self._from_numpy if array_type == "numpy" else self._from_torch
+        # guards the bookkeeping of inputs that reached EOS; never held while calling out
+        self._pads_lock = threading.Lock()
+        self._eos_inputs = set()
+        self._retired_outputs = set()  # src pads being removed, which get no more pushes
+        self._batch_pads = None
+        self._removed_drops = 0
+
+        self._array_type = get_array_type(array_type).name
+        self._convert_yuv = convert_yuv
         self._do_op = do_op
+        self._preallocate_outputs = preallocate_outputs
+        self._output_pools = OutputPools()
+        self._layouts = LayoutCache()
+        self._batcher = FrameBatcher(
+            lambda items: self._dispatch(partial(self._process_batch, items)), max_batch, max_wait_ms
+        )
+        self._n_workers = n_workers
+        self._max_in_flight = max_in_flight
+        self._workers = None
+        self._n_processes = 0
+        self._processes = None
+        self._processes_stale = False
+        self._warmup_args = None
+        self._batch_inputs = False
+        self.set_batch_inputs(batch_inputs)
+        self.set_n_processes(n_processes)
+        self._push_lock = threading.Lock()
+        self._flow_return = Gst.FlowReturn.OK
+        self._queues = None
+        self._dispatcher = None
+        self._qos = QosController(qos_mode, int(max_lateness_ms * Gst.MSECOND))
+        self._segments = dict()
+        self._sync = InputSynchronizer(
+            None if sync_tolerance_ms is None else int(sync_tolerance_ms * Gst.MSECOND), primary_input
+        )
+        self._metrics = default_registry if metrics is None else metrics
+        self._metrics.add_collector(self._collect_metrics, labels=self._metrics_labels)
+        self._metrics_poster = MetricsPoster(self._metrics, metrics_interval_ms)
+
+        self.set_queue_policy(queue_policy)
+        for p in inputs or ():
+            self.add_input(p.name, p.format)
+        for p in outputs or ():
+            self.add_output(p.name, p.format)
+
+
+    def _new_pad(self, name, format, direction, presence):
+        caps = format if isinstance(format, Gst.Caps) else Gst.Caps.from_string(format)
+        if self.get_static_pad(name) is not None:
+            raise ValueError(f"{self.get_name()} already has a pad named {name}")
+        pad = Gst.Pad.new_from_template(Gst.PadTemplate.new(name, direction, presence, caps), name)
+        if direction == Gst.PadDirection.SINK:
+            pad.set_chain_function(self.do_chain)
+            pad.set_event_function_full(self.do_sink_event)
+        else:
+            pad.set_event_function_full(self.do_src_event)
+        return pad
+
+
+    def _find_pad(self, name, pads):
+        for pad in pads:
+            if pad.get_name() == name:
+                return pad
+        raise ValueError(f"{self.get_name()} has no pad named {name}; its pads are {[p.get_name() for p in pads]}")
+
+
+    def add_input(self, name, format, presence=Gst.PadPresence.ALWAYS):
+        """
+        Add a sink pad `name` with caps `format` (a caps string or `Gst.Caps`) and return it. This can be done while
+        the pipeline is playing: frame sets formed from then on include the new input, and with several inputs, the
+        primary input's frames wait for the new one's first buffer within the sync tolerance.
+        """
+        pad = self._new_pad(name, format, Gst.PadDirection.SINK, presence)
+        # a pad of the same name removed earlier may have left its layout and segment behind
+        self._layouts.remove(pad)
+        self._segments.pop(name, None)
+        self._sync.add(name)
+        if self._queues is not None:
+            self._queues.add(name)
+        self.add_pad(pad)
+        return pad
 
-        # Create pads
-        sinkpads = list()
-        srcpads = list()
-
-        if inputs is not None:
-            for p in inputs:
-                template = Gst.PadTemplate.new(
-                    p.name, Gst.PadDirection.SINK, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(p.format))
-                sinkpads.append(Gst.Pad.new_from_template(template, p.name))
-        if outputs is not None:
-            for p in outputs:
-                template = Gst.PadTemplate.new(
-                    p.name, Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(p.format))
-                srcpads.append(Gst.Pad.new_from_template(template, p.name))
 
-        # Set chain function for sink pads
-        for s in sinkpads:
-            s.set_chain_function(self.do_chain)
+    def remove_input(self, name):
+        """
+        Remove sink pad `name`, also while the pipeline is playing, without interrupting the other inputs. Its queued
+        and unmatched buffers are released, frame sets that only waited for it are processed, and frame sets already
+        formed with it are dropped. The upstream element feeding it should be unlinked or stopped first, otherwise
+        its pushes return FLUSHING and then NOT_LINKED.
+        """
+        pad = self._find_pad(name, self.sinkpads)
+        # new buffers on the pad are ignored from here on, and a chain call blocked on its full queue returns
+        if self._queues is not None:
+            self._queues.remove(name)
+        try:
+            self._sync.remove(name, self._submit_aligned)
+        except RuntimeError as e:
+            self._post_error(e)
+        # waits for the pad's streaming thread to leave do_chain
+        pad.set_active(False)
+        self.remove_pad(pad)
+        with self._pads_lock:
+            was_active = name not in self._eos_inputs
+            self._eos_inputs.discard(name)
+            remaining = [p.get_name() for p in self.sinkpads]
+            ended = was_active and remaining and all(n in self._eos_inputs for n in remaining)
+        if ended:
+            # the removed input was the last one still streaming
+            self._drain_at_eos()
+            for srcpad in self.srcpads:
+                srcpad.push_event(Gst.Event.new_eos())
+
+
+    def add_output(self, name, format, presence=Gst.PadPresence.ALWAYS):
+        """
+        Add a src pad `name` with caps `format` (a caps string or `Gst.Caps`) and return it. This can be done while
+        the pipeline is playing: frames processed from then on have an output for the new pad, which gets the inputs'
+        stream-start and segment events and its caps (see `_output_caps`) before its first buffer.
+        """
+        pad = self._new_pad(name, format, Gst.PadDirection.SRC, presence)
+        self.add_pad(pad)
+        self._announce_output(pad)
+        return pad
 
-        # Add pads
-        for s in sinkpads:
-            self.add_pad(s)
-        for s in srcpads:
-            self.add_pad(s)
 
-        self._buffers = [None for _ in self.sinkpads]
+    def remove_output(self, name):
+        """
+        Remove src pad `name`, also while the pipeline is playing. Each frame's results are pushed to the src pads
+        there were when its `do_op` call started, so no other output gets a result meant for the removed one.
+        """
+        pad = self._find_pad(name, self.srcpads)
+        with self._push_lock:
+            self._retired_outputs.add(pad)
+        self.remove_pad(pad)
+        pad.set_active(False)
+        self._output_pools.remove(pad)
+        self._layouts.remove(pad)
 
 
-    def add_input(self, name, format):
-        template = Gst.PadTemplate.new(name, Gst.PadDirection.SINK, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(format))
-        pad = Gst.Pad.new_from_template(template, name)
-        pad.set_chain_function(self.do_chain)
-        self.add_pad(pad)
+    def _announce_output(self, srcpad):
+        """
+        Store the events that a src pad added while streaming missed, to be sent ahead of its first buffer.
+        """
+        if not self.sinkpads:
+            return
+        stream_start = self.sinkpads[0].get_sticky_event(Gst.EventType.STREAM_START, 0)
+        if stream_start is None:
+            return  # not streaming yet; the pad gets its events with the others'
+        srcpad.store_sticky_event(stream_start)
+        caps = self._output_caps(srcpad)
+        if caps is not None:  # else they are announced when the input's caps arrive
+            self._layouts.update(srcpad, caps)
+            srcpad.store_sticky_event(Gst.Event.new_caps(caps))
+        segment = self.sinkpads[0].get_sticky_event(Gst.EventType.SEGMENT, 0)
+        if segment is not None:
+            srcpad.store_sticky_event(segment)
+
+
+    def do_request_new_pad(self, templ, name, caps):
+        """
+        Create a "sink_%u" or "src_%u" request pad, with the requested caps if given, eg. from `Gst.Element.request_pad`
+        or when linking in `Gst.parse_launch`. Request pads may be released while the pipeline is playing.
+        """
+        if name is None:
+            prefix = templ.name_template.split("%")[0]
+            name = next(f"{prefix}{i}" for i in itertools.count() if self.get_static_pad(f"{prefix}{i}") is None)
+        format = templ.get_caps() if caps is None else caps
+        if templ.direction == Gst.PadDirection.SINK:
+            return self.add_input(name, format, Gst.PadPresence.REQUEST)
+        return self.add_output(name, format, Gst.PadPresence.REQUEST)
 
 
-    def add_output(self, name, format):
-        template = Gst.PadTemplate.new(name, Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(format))
-        pad = Gst.Pad.new_from_template(template, name)
-        self.add_pad(pad)
-        self._buffers = [None for _ in self.sinkpads]
+    def do_release_pad(self, pad):
+        if pad.direction == Gst.PadDirection.SINK:
+            self.remove_input(pad.get_name())
+        else:
+            self.remove_output(pad.get_name())
 
 
-    def set_do_op(self, do_op):
-        self._do_op = do_op
+    def set_do_op(self, do_op, warmup_args=None):
+        """
+        Set the op run on each set of frames. Worker processes started with the previous op are drained and stopped by
+        the next frame, on its streaming thread, which then starts new ones with `do_op` and has each warm up on
+        `warmup_args` (a tuple of arguments for `do_op`) if given.
+        """
+        with self._lock:
+            self._do_op = do_op
+            self._warmup_args = warmup_args
+            self._processes_stale = self._processes is not None
+
+
+    def set_batch_inputs(self, batch_inputs):
+        if batch_inputs and self._preallocate_outputs:
+            raise ValueError("batch_inputs cannot be combined with preallocate_outputs")
+        if batch_inputs and self._n_processes > 0:
+            raise ValueError("batch_inputs cannot be combined with n_processes")
+        self._batch_inputs = batch_inputs
+
+
+    def set_n_processes(self, n_processes):
+        if n_processes > 0 and (self._preallocate_outputs or self._batch_inputs):
+            raise ValueError("n_processes cannot be combined with preallocate_outputs or batch_inputs")
+        self._n_processes = n_processes
+        self._close_processes()
+
+
+    def set_queue_policy(self, queue_policy):
+        queue_policy = parse_queue_policy(queue_policy)
+        if queue_policy is None:
+            self._stop_dispatcher()
+            self._queues = None
+        elif self._queues is None:
+            self._queues = InputQueues(queue_policy, [p.get_name() for p in self.sinkpads])
+        else:
+            self._queues.policy = queue_policy
+
+
+    @property
+    def queue_stats(self):
+        """
+        The `QueueStats` of each input queue by pad name, or an empty dict if no queue policy is set.
+        """
+        return dict() if self._queues is None else self._queues.stats
+
+
+    @property
+    def sync_stats(self):
+        """
+        The numbers of input sets matched, primary buffers missed and other buffers discarded by the alignment.
+        """
+        return self._sync.stats
+
+
+    @property
+    def metrics(self):
+        """
+        This element's current metric values, as returned by `MetricsRegistry.snapshot`.
+        """
+        return self._metrics.snapshot(element=self.get_name())
+
+
+    def _metrics_labels(self):
+        return dict(element=self.get_name())
+
+
+    def _collect_metrics(self):
+        element = self.get_name()
+        for name, stats in self.queue_stats.items():
+            yield QUEUE_DEPTH, dict(element=element, pad=name), stats.depth
+            yield DROPPED_FRAMES, dict(element=element, reason="queue", pad=name), stats.dropped
+        qos = self._qos.stats
+        yield DROPPED_FRAMES, dict(element=element, reason="qos-drop"), qos.dropped
+        yield DROPPED_FRAMES, dict(element=element, reason="qos-skip"), qos.skipped
+        yield DROPPED_FRAMES, dict(element=element, reason="sync-missed"), self._sync.stats.missed
+        yield DROPPED_FRAMES, dict(element=element, reason="pad-removed"), self._removed_drops
+        processes = self._processes
+        yield DROPPED_FRAMES, dict(element=element, reason="worker-lost"), 0 if processes is None else processes.lost
+        in_flight = self._batcher.pending + sum(p.in_flight for p in (self._workers, self._processes) if p is not None)
+        yield IN_FLIGHT, dict(element=element), in_flight
+
+
+    @property
+    def qos_stats(self):
+        """
+        The numbers of frames processed, dropped and skipped by the QoS checks.
+        """
+        return self._qos.stats
+
+
+    def do_get_property(self, prop):
+        if prop.name == "max-batch":
+            return self._batcher.max_batch
+        elif prop.name == "max-wait-ms":
+            return self._batcher.max_wait_ms
+        elif prop.name == "batch-inputs":
+            return self._batch_inputs
+        elif prop.name == "n-workers":
+            return self._n_workers
+        elif prop.name == "n-processes":
+            return self._n_processes
+        elif prop.name == "max-in-flight":
+            return self._max_in_flight
+        elif prop.name == "queue-policy":
+            return None if self._queues is None else self._queues.policy.kind
+        elif prop.name == "qos-mode":
+            return self._qos.mode
+        elif prop.name == "max-lateness-ms":
+            return self._qos.max_lateness / Gst.MSECOND
+        elif prop.name == "sync-tolerance-ms":
+            return -1.0 if self._sync.tolerance is None else self._sync.tolerance / Gst.MSECOND
+        elif prop.name == "primary-input":
+            return self._sync.primary
+        elif prop.name == "metrics-interval-ms":
+            return self._metrics_poster.interval_ms
+        else:
+            raise AttributeError(f"No such property {prop.name}")
+
+
+    def do_set_property(self, prop, value):
+        if prop.name == "max-batch":
+            self._batcher.max_batch = value
+        elif prop.name == "max-wait-ms":
+            self._batcher.max_wait_ms = value
+        elif prop.name == "batch-inputs":
+            self.set_batch_inputs(value)
+        elif prop.name in ("n-workers", "max-in-flight"):
+            if prop.name == "n-workers":
+                self._n_workers = value
+            else:
+                self._max_in_flight = value
+            if self._workers is not None:
+                self._workers.close()
+                self._workers = None
+            self._close_processes()
+        elif prop.name == "n-processes":
+            self.set_n_processes(value)
+        elif prop.name == "queue-policy":
+            self.set_queue_policy(value or None)
+        elif prop.name == "qos-mode":
+            self._qos.mode = value
+        elif prop.name == "max-lateness-ms":
+            self._qos.max_lateness = int(value * Gst.MSECOND)
+        elif prop.name == "sync-tolerance-ms":
+            self._sync.tolerance = None if value < 0 else int(value * Gst.MSECOND)
+        elif prop.name == "primary-input":
+            self._sync.primary = value
+        elif prop.name == "metrics-interval-ms":
+            self._metrics_poster.interval_ms = value
+        else:
+            raise AttributeError(f"No such property {prop.name}")
 
 
     def do_chain(self, pad, parent, buffer):
 
-        with self._lock:
-            print("=======================================")
-            print(f"do_chain called on {pad.get_name()} with thread id {threading.get_ident()}")
-            pad_index = self.sinkpads.index(pad) if pad in self.sinkpads else None
-            if pad_index is None:
-                print("Unexpected pad!")
+        if pad not in self.sinkpads:
+            return Gst.FlowReturn.ERROR
+        self._metrics.inc(FRAMES, element=self.get_name(), pad=pad.get_name())
+        self._metrics_poster.maybe_post(self)
+
+        # failures on the batcher's timer thread and the workers are reported from the streaming thread
+        for source in (self._batcher, self._workers, self._processes):
+            if source is not None and source.error is not None:
+                self._post_error(source.error)
                 return Gst.FlowReturn.ERROR
-            self._buffers[pad_index] = buffer
 
-            if all(self._buffers):
+        if self._queues is not None:
+            self._ensure_dispatcher()
+            # the running time is taken now, as the pad's segment may have changed by the time the buffer is dequeued
+            self._queues.put(pad.get_name(), (self._running_time(pad, buffer), pad, buffer), buffer.get_size())
+            return self._flow_return
 
-                frames = list()
-                for sinkpad, buffer in zip(self.sinkpads, self._buffers):
-                    # Extract data from buffer
-                    success, map_info = buffer.map(Gst.MapFlags.READ)
-                    if not success:
-                        print("Unexpected failure!")
-                        return Gst.FlowReturn.ERROR
+        try:
+            self._sync.push(pad.get_name(), self._running_time(pad, buffer), (pad, buffer), self._submit_aligned)
+        except RuntimeError as e:
+            self._post_error(e)
+            return Gst.FlowReturn.ERROR
 
-                    caps = sinkpad.get_current_caps().get_structure(0)
-                    height, width, channels = caps.get_value("height"), caps.get_value("width"), caps.get_value("channels")
-                    dtype = np.uint8 if self._array_type == "numpy" else torch.uint8
-                    frame = self._frombuffer(map_info.data, dtype=dtype).reshape((height, width, 3))
+        return self._flow_return
 
-                    frames.append(frame)
-                    buffer.unmap(map_info)
 
-                results = self.do_op(frames)
+    def _running_time(self, pad, buffer):
+        if buffer.pts == Gst.CLOCK_TIME_NONE:
+            return None
+        segment = self._segments.get(pad.get_name())
+        if segment is None:
+            return buffer.pts
+        running_time = segment.to_running_time(Gst.Format.TIME, buffer.pts)
+        return None if running_time == Gst.CLOCK_TIME_NONE else running_time
 
-                for b, p in zip(results, self.srcpads):
-                    dbuffer = Gst.Buffer.new_wrapped(self._tobuffer(b))
-                    p.push(dbuffer)
 
-            return Gst.FlowReturn.OK
+    def _submit_aligned(self, items):
+        """
+        Submit a set of buffers aligned by `InputSynchronizer`, with the primary input's timestamps.
+        """
+        primary = self._sync.primary_name
+        trigger = next((i for i, (pad, _) in enumerate(items) if pad.get_name() == primary), 0)
+        if not self._submit(items, trigger):
+            raise RuntimeError("Failed to map input buffers")
 
 
-    def do_op(self, sink_data):
+    def _submit(self, items, trigger=0):
+        """
+        Hand one buffer per input to the batcher, or map them and dispatch `do_op` on them, unless the QoS checks find
+        the buffer at index `trigger`, whose timestamps the outputs get, too late. `items` are (sink pad, buffer) pairs,
+        so a frame set keeps the inputs it was formed with if they change meanwhile; sets with an input that has since
+        been removed are dropped. Returns False if a buffer failed to map.
+        """
+        pads = [pad for pad, _ in items]
+        sinkpads = self.sinkpads
+        if any(pad not in sinkpads for pad in pads):
+            self._removed_drops += 1
+            return True
+        return self._submit_set(pads, [buffer for _, buffer in items], trigger)
+
+
+    def _submit_set(self, pads, buffers, trigger):
+        sinkpad = pads[trigger]
+        buffer = buffers[trigger]
+        decision = check_buffer_qos(self, self._qos, sinkpad, self._segments.get(sinkpad.get_name()), buffer)
+        if decision.action == "drop":
+            return True
+        if decision.action == "skip":
+            # frames already held by the batcher go first to keep the outputs in order
+            self._batcher.flush()
+            if self._n_processes > 0:
+                srcpads, outputs = self._forward_inputs(pads, buffers)[0]
+                self._ensure_processes().submit_done(outputs, (None, srcpads))
+            else:
+                self._dispatch(partial(self._forward_inputs, pads, buffers))
+            return True
+
+        timestamps = BufferTimestamps.from_buffer(buffer)
+        if self._n_processes > 0:
+            self._submit_to_processes(pads, buffers, timestamps)
+            return True
+        if self._batcher.max_batch > 1:
+            if pads != self._batch_pads:
+                # a batch must not mix frame sets with different inputs
+                self._batcher.flush()
+                self._batch_pads = pads
+            self._batcher.add(FrameSet(self._copy_frames(pads, buffers), timestamps))
+            return True
+        mapped = self._map_frames(pads, buffers)
+        if mapped is None:
+            return False
+        self._dispatch(partial(self._process_frames, mapped, timestamps))
+        return True
+
+
+    def _ensure_processes(self):
+        """
+        Get the worker process pool, restarting it if the op changed. Only called on the path submitting frame sets,
+        which runs one frame set at a time, so the pool is never replaced while a frame is being submitted to it.
+        """
+        with self._lock:
+            stale, self._processes_stale = self._processes_stale, False
+        if stale:
+            self._close_processes()
+        if self._processes is None:
+            if self._do_op is None:
+                raise RuntimeError("n_processes requires do_op to be given, as a picklable function")
+            if self._batcher.max_batch > 1:
+                raise RuntimeError("n_processes cannot be combined with max_batch above 1")
+            self._processes = ProcessWorkerPool(
+                self._do_op, self._emit_process_results, self._n_processes, self._max_in_flight,
+                array_type=self._array_type, name=f"{self.get_name()}-process", warmup_args=self._warmup_args,
+            )
+        return self._processes
+
+
+    def _close_processes(self):
+        processes, self._processes = self._processes, None
+        if processes is not None:
+            processes.close()
+
+
+    def _submit_to_processes(self, pads, buffers, timestamps):
+        """
+        Copy the frames of `buffers` into the worker processes' shared memory and queue `do_op` on them. The buffers
+        are only mapped for the copy, so they are released upstream before the op runs.
+        """
+        pool = self._ensure_processes()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            frames = list()
+            for sinkpad, buffer in zip(pads, buffers):
+                layout = self._layouts.get(sinkpad).for_buffer(buffer)
+                frame = stack.enter_context(map_buffer_to_numpy(buffer, Gst.MapFlags.READ, layout))
+                if self._convert_yuv and layout.is_yuv:
+                    frame = yuv_to_rgb(frame, layout.format)
+                frames.append(frame)
+            pool.submit(frames, (timestamps, list(self.srcpads)))
+        self._metrics.observe(MAP_SECONDS, time.perf_counter() - start, element=self.get_name(), op="copy")
+
+
+    def _emit_process_results(self, results, context):
+        """
+        Push the results of one frame set from the worker processes, which are views of their shared memory and are
+        copied into new buffers, or the input buffers forwarded by the QoS checks, which have no timestamps to set.
+        `context` holds the timestamps and the src pads there were when the frame set was submitted.
+        """
+        timestamps, srcpads = context
+        if timestamps is None:
+            self._push_outputs(results, srcpads)
+        else:
+            buffers = [None if r is None else array_to_buffer(r, timestamp_source=timestamps) for r in results]
+            self._push_outputs(buffers, srcpads)
+
+
+    def _ensure_dispatcher(self):
+        with self._lock:
+            if self._dispatcher is None:
+                self._queues.open()
+                self._dispatcher = threading.Thread(
+                    target=self._run_queues, name=f"{self.get_name()}-queues", daemon=True
+                )
+                self._dispatcher.start()
+
+
+    def _stop_dispatcher(self):
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if self._queues is not None:
+            self._queues.close()
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+
+
+    def _run_queues(self):
+        """
+        Take the queued buffers in arrival order and align them with `InputSynchronizer`, which processes each frame
+        set they complete, until the queues are closed.
+        """
+        while True:
+            taken = self._queues.get_next()
+            if taken is None:
+                return
+            name, (running_time, pad, buffer) = taken
+            try:
+                self._sync.push(name, running_time, (pad, buffer), self._submit_aligned)
+            except Exception as e:
+                self._post_error(e)
+                self._flow_return = Gst.FlowReturn.ERROR
+            finally:
+                self._queues.task_done()
+
+
+    def _map_frames(self, pads, buffers):
+        """
+        Map each of `buffers` for reading and get the frame views over them, without copying. Input buffers may share
+        their memory with other branches of the pipeline, so they are never mapped for writing, which could also force
+        GStreamer to copy them. Numpy frames are read-only views, and array types without read-only arrays, such as
+        Torch, get copies of them, so ops cannot modify shared input memory. Returns the frames, the (buffer, map_info)
+        pairs to unmap once the results have been wrapped, and the data pointers of the frames that `array_to_buffer`
+        may forward without copying; or None if a buffer failed to map.
+        """
+        start = time.perf_counter()
+        frames = list()
+        mapped = list()
+        owners = dict()
+        for sinkpad, in_buffer in zip(pads, buffers):
+            success, map_info = in_buffer.map(Gst.MapFlags.READ)
+            if not success:
+                for b, m in mapped:
+                    b.unmap(m)
+                return None
+            mapped.append((in_buffer, map_info))
+
+            layout = self._layouts.get(sinkpad).for_buffer(in_buffer)
+            frame = layout.view(map_info.data)
+            if self._convert_yuv and layout.is_yuv:
+                frame = yuv_to_rgb(frame, layout.format)
+            frame = self._to_array(frame)
+
+            frames.append(frame)
+            if not isinstance(frame, tuple):
+                owners[array_data_pointer(frame)] = in_buffer
+        self._metrics.observe(MAP_SECONDS, time.perf_counter() - start, element=self.get_name(), op="map")
+        return frames, mapped, owners
+
+
+    def _copy_frames(self, pads, buffers):
+        """
+        Copy the frame held in each of `buffers` out of its mapped memory, so it can outlive the buffer.
+        """
+        frames = list()
+        start = time.perf_counter()
+        for sinkpad, buffer in zip(pads, buffers):
+            layout = self._layouts.get(sinkpad).for_buffer(buffer)
+            with map_buffer_to_numpy(buffer, Gst.MapFlags.READ, layout) as frame:
+                if self._convert_yuv and layout.is_yuv:
+                    frame = yuv_to_rgb(frame, layout.format)
+                elif isinstance(frame, tuple):
+                    frame = tuple(np.array(p) for p in frame)
+                else:
+                    frame = np.array(frame)
+            frames.append(self._to_array(frame))
+        self._metrics.observe(MAP_SECONDS, time.perf_counter() - start, element=self.get_name(), op="copy")
+        return frames
+
+
+    def _process_frames(self, mapped, timestamps):
+        """
+        Run `do_op` on one set of mapped frames from `_map_frames` and return the src pads and output buffers as a one
+        item list, in the same form as `_process_batch`. The input buffers are unmapped before returning.
+        """
+        frames, mapped, owners = mapped
+        srcpads = list(self.srcpads)
+        try:
+            if self._preallocate_outputs:
+                with ExitStack() as stack:
+                    out_buffers, outputs = self._output_pools.map_outputs(srcpads, stack)
+                    self._run_op(frames, [self._to_array(o) for o in outputs])
+                for b in out_buffers:
+                    copy_buffer_timestamps(timestamps, b)
+            elif self._batch_inputs:
+                batches, groups = batch_inputs_by_shape(frames)
+                results = scatter_batches(self._run_op(batches), groups, len(frames))
+                out_buffers = [array_to_buffer(r, owners, timestamps) for r in results]
+            else:
+                results = self._run_op(frames)
+                out_buffers = [array_to_buffer(r, owners, timestamps) for r in results]
+        finally:
+            with self._metrics.time(MAP_SECONDS, element=self.get_name(), op="unmap"):
+                for in_buffer, map_info in mapped:
+                    in_buffer.unmap(map_info)
+
+        return [(srcpads, out_buffers)]
+
+
+    def _process_batch(self, items):
+        """
+        Run `do_op` on a batch of `FrameSet` items from the batcher and return the src pads and per-frame output buffers
+        of each frame in order.
+        """
+        count = len(items)
+        srcpads = list(self.srcpads)
+        sink_data = [stack_frames([item.frames[i] for item in items]) for i in range(len(items[0].frames))]
+
+        if self._preallocate_outputs:
+            with ExitStack() as stack:
+                out_buffers, outputs = list(), list()
+                for _ in items:
+                    frame_buffers, frame_outputs = self._output_pools.map_outputs(srcpads, stack)
+                    out_buffers.append(frame_buffers)
+                    outputs.append([self._to_array(o) for o in frame_outputs])
+                src_data = [[outputs[k][i] for k in range(count)] for i in range(len(srcpads))]
+                self._run_op(sink_data, src_data)
+            for item, frame_buffers in zip(items, out_buffers):
+                for b in frame_buffers:
+                    copy_buffer_timestamps(item.timestamps, b)
+        else:
+            if self._batch_inputs:
+                batches, groups = batch_inputs_by_shape(sink_data)
+                results = scatter_batches(self._run_op(batches), groups, len(sink_data), count)
+            else:
+                results = self._run_op(sink_data)
+            results = [unstack_result(r, count) for r in results]
+            out_buffers = [
+                [array_to_buffer(r[k], timestamp_source=item.timestamps) for r in results]
+                for k, item in enumerate(items)
+            ]
+
+        return [(srcpads, frame_buffers) for frame_buffers in out_buffers]
+
+
+    def _forward_inputs(self, pads, buffers):
+        """
+        Pass each input buffer through unchanged to the src pad with the same index if their caps are equal to those of
+        its sink pad in `pads`.
+        """
+        outputs = list()
+        srcpads = list(self.srcpads)
+        for i, srcpad in enumerate(srcpads):
+            caps = srcpad.get_current_caps()
+            in_caps = pads[i].get_current_caps() if i < len(buffers) else None
+            outputs.append(buffers[i] if caps is not None and in_caps is not None and caps.is_equal(in_caps) else None)
+        return [(srcpads, outputs)]
+
+
+    def _run_op(self, *args):
+        with self._metrics.time(OP_SECONDS, element=self.get_name()):
+            return self.do_op(*args)
+
+
+    def _dispatch(self, work):
+        """
+        Run `work`, which returns a list of (src pads, output buffers) pairs, one per frame, and push its results. With
+        `n_workers` set this only enqueues the work on the worker pool, which pushes results in submission order as
+        they complete.
+        """
+        if self._n_workers > 0:
+            if self._workers is None:
+                self._workers = OrderedWorkerPool(
+                    self._emit, self._n_workers, self._max_in_flight, name=f"{self.get_name()}-worker"
+                )
+            self._workers.submit(work)
+        else:
+            self._emit(work())
+
+
+    def _emit(self, results):
+        for srcpads, frame_buffers in results:
+            self._push_outputs(frame_buffers, srcpads)
+
+
+    def _post_error(self, error):
+        gerror = GLib.Error.new_literal(Gst.stream_error_quark(), str(error), Gst.StreamError.FAILED)
+        self.post_message(Gst.Message.new_error(self, gerror, repr(error)))
+
+
+    def _push_outputs(self, buffers, srcpads):
+        """
+        Push one buffer to each of `srcpads`, the src pads there were when the frame was processed, skipping those
+        removed since. Pushes are serialised since results may come from the batcher's or the workers' threads, and
+        any failure is recorded so it is returned upstream from the next chain call.
+        """
+        with self._push_lock:
+            for b, p in zip(buffers, srcpads):
+                if b is None or p in self._retired_outputs:
+                    continue
+                ret = p.push(b)
+                if ret == Gst.FlowReturn.OK:
+                    self._metrics.inc(OUTPUT_FRAMES, element=self.get_name(), pad=p.get_name())
+                elif ret != Gst.FlowReturn.NOT_LINKED:
+                    self._flow_return = ret
+
+
+    def _to_array(self, frame):
+        return to_array_type(frame, self._array_type)
+
+
+    def _output_caps(self, srcpad, event_pad=None, event_caps=None):
+        """
+        The caps to announce on `srcpad`: its template caps if they are fixed, otherwise the caps of the sink pad with
+        the same index (the last one if there are fewer inputs) restricted to the template, so outputs without caps of
+        their own pass their input's caps through. `event_caps` are the new caps of `event_pad`, which are not yet its
+        current caps while their event is handled. Returns None if the input has no caps yet or they do not fit.
+        """
+        caps = srcpad.get_pad_template_caps()
+        if caps.is_fixed():
+            return caps
+        sinkpads = self.sinkpads
+        if not sinkpads or srcpad not in self.srcpads:
+            return None
+        sinkpad = sinkpads[min(self.srcpads.index(srcpad), len(sinkpads) - 1)]
+        in_caps = event_caps if sinkpad == event_pad else sinkpad.get_current_caps()
+        if in_caps is None:
+            return None
+        caps = caps.intersect(in_caps)
+        return None if caps.is_empty() else caps.fixate()
+
+
+    def do_sink_event(self, pad, parent, event):
+        """
+        Cache the layout of each input when its caps are negotiated and announce each output's own caps downstream
+        (see `_output_caps`), rather than forwarding one input's caps to every src pad. Other events take the default
+        path.
+        """
+        if event.type == Gst.EventType.CAPS:
+            in_caps = event.parse_caps()
+            self._layouts.update(pad, in_caps)
+            for srcpad in self.srcpads:
+                caps = self._output_caps(srcpad, pad, in_caps)
+                current = srcpad.get_current_caps()
+                if caps is not None and (current is None or not current.is_equal(caps)):
+                    self._layouts.update(srcpad, caps)
+                    srcpad.push_event(Gst.Event.new_caps(caps))
+            return True
+        elif event.type == Gst.EventType.SEGMENT:
+            self._segments[pad.get_name()] = event.parse_segment()
+        elif event.type == Gst.EventType.EOS:
+            name = pad.get_name()
+            if self._queues is not None:
+                # every buffer of the input reaches the synchronizer before it is told the input ended
+                self._queues.wait_idle([name])
+            try:
+                self._sync.finish(name, self._submit_aligned)
+            except RuntimeError as e:
+                self._post_error(e)
+            with self._pads_lock:
+                self._eos_inputs.add(name)
+                ended = all(p.get_name() in self._eos_inputs for p in self.sinkpads)
+            if not ended:
+                # the other inputs keep streaming without this one, and EOS only goes downstream once they end too
+                self._sync.remove(name, self._submit_aligned)
+                if self._queues is not None:
+                    self._queues.remove(name)
+                return True
+            self._drain_at_eos()
+        elif event.type == Gst.EventType.FLUSH_START:
+            if self._queues is not None:
+                self._queues.clear()
+            self._sync.clear()
+            self._batcher.clear()
+        elif event.type == Gst.EventType.FLUSH_STOP:
+            self._restore_inputs([pad.get_name()])
+            self._flow_return = Gst.FlowReturn.OK
+            self._qos.reset()
+        return pad.event_default(parent, event)
+
+
+    def _drain_at_eos(self):
+        """
+        Process and push everything still held once the last input has ended, ahead of the EOS event.
+        """
+        self._batcher.flush()
+        for pool in (self._workers, self._processes):
+            if pool is not None:
+                pool.drain()
+        self._metrics_poster.maybe_post(self, force=True)
+
+
+    def _restore_inputs(self, names=None):
+        """
+        Let inputs that reached EOS (those in `names`, or all if None) rejoin the frame sets at their places, eg. after
+        a flushing seek.
+        """
+        with self._pads_lock:
+            restored = self._eos_inputs if names is None else self._eos_inputs.intersection(names)
+            self._eos_inputs = self._eos_inputs.difference(restored)
+            active = [p.get_name() for p in self.sinkpads if p.get_name() not in self._eos_inputs]
+        # added in pad order, so each one's index counts the inputs before it
+        for name in sorted(restored.intersection(active), key=active.index):
+            self._sync.add(name, active.index(name))
+            if self._queues is not None:
+                self._queues.add(name, active.index(name))
+
+
+    def do_src_event(self, pad, parent, event):
+        """
+        Track the lateness reported by QoS events and the pipeline latency for the QoS checks, then forward the events
+        upstream as usual.
+        """
+        if event.type == Gst.EventType.QOS:
+            _, proportion, diff, timestamp = event.parse_qos()
+            self._qos.update(proportion, diff, timestamp)
+        elif event.type == Gst.EventType.LATENCY:
+            self._qos.set_latency(event.parse_latency())
+        return pad.event_default(parent, event)
+
+
+    def do_change_state(self, transition):
+        if transition == Gst.StateChange.PAUSED_TO_READY:
+            # closing the queues first releases any chain call blocked on a full queue before the pads deactivate
+            self._stop_dispatcher()
+            self._batcher.close()
+            if self._workers is not None:
+                self._workers.close()
+                self._workers = None
+            self._close_processes()
+            self._flow_return = Gst.FlowReturn.OK
+            self._output_pools.close()
+            self._layouts.clear()
+            self._segments.clear()
+            self._sync.clear()
+            self._restore_inputs()
+            with self._push_lock:
+                self._retired_outputs.clear()
+            self._qos.reset()
+        ret = Gst.Element.do_change_state(self, transition)
+        if transition == Gst.StateChange.READY_TO_NULL:
+            # elements are shut down in NULL before being disposed, so don't keep their series in the registry
+            self._metrics.remove(element=self.get_name())
+        return ret
+
+
+    def do_op(self, sink_data, src_data=None):
         """
         When using do_op programatically, the user should set do_op in order to define the
         operation that gets performed on the buffers.
@@ -243,12 +1160,6 @@ class GstStreamRunnerBackend(Gst.Element):
         """
         if self._do_op is None:
             raise ValueError("do_op not set")
+        if src_data is not None:
+            return self._do_op(sink_data, src_data)
         return self._do_op(sink_data)
-
-
-    def _from_numpy(self, data):
-        return data.tobytes()
-
-
-    def _from_torch(self, data):
-        return data.numpy().tobytes()
@@ -0,0 +1,226 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+__all__ = [
+    "FrameSet",
+    "FrameBatcher",
+    "stack_frames",
+    "unstack_result",
+    "batch_inputs_by_shape",
+    "scatter_batches",
+]
+
+
+@dataclass
+class FrameSet:
+    """
+    The frames given to one `do_op` call, one per input, with the timestamps of the buffer that triggered the call.
+    """
+
+    frames: list
+    timestamps: object = None
+
+
+def stack_frames(frames):
+    """
+    Stack a list of frames (Numpy arrays, Torch tensors or tuples of per-plane arrays) along a new leading batch axis.
+    """
+    first = frames[0]
+    if isinstance(first, tuple):
+        return tuple(stack_frames([f[p] for f in frames]) for p in range(len(first)))
+    if isinstance(first, np.ndarray):
+        return np.stack(frames)
+
+    import torch
+
+    return torch.stack(frames)
+
+
+def unstack_result(result, count):
+    """
+    Split a batched result with leading batch axis `count` into a list of per-frame results. A result that is already a
+    list or tuple of per-frame items is returned as a list.
+    """
+    if isinstance(result, (list, tuple)):
+        items = list(result)
+    else:
+        items = [result[i] for i in range(result.shape[0])]
+    if len(items) != count:
+        raise ValueError(f"Expected a batch of {count} results but got {len(items)}.")
+    return items
+
+
+def _moveaxis(array, source, destination):
+    if isinstance(array, np.ndarray):
+        return np.moveaxis(array, source, destination)
+    return array.movedim(source, destination)
+
+
+def batch_inputs_by_shape(inputs):
+    """
+    Group inputs with identical shape and dtype and stack each group into one channels-first batch, so that a model
+    shared by several pads (eg. four camera feeds) runs once per group rather than once per input. Inputs are either
+    (H, W, C) frames, giving (N, C, H, W) batches, or (T, H, W, C) temporal batches, which are concatenated into
+    (N * T, C, H, W). Returns the list of batches and, for each batch, the indices of the inputs it holds.
+    """
+    groups = dict()
+    for i, x in enumerate(inputs):
+        if isinstance(x, tuple):
+            raise ValueError("Planar inputs cannot be batched across pads; convert them to RGB first.")
+        groups.setdefault((tuple(x.shape), str(x.dtype)), list()).append(i)
+
+    indices = list(groups.values())
+    batches = list()
+    for group in indices:
+        items = [inputs[i] for i in group]
+        if items[0].ndim == 3:
+            stacked = stack_frames(items)
+        elif isinstance(items[0], np.ndarray):
+            stacked = np.concatenate(items)
+        else:
+            import torch
+
+            stacked = torch.cat(items)
+        batches.append(_moveaxis(stacked, -1, -3))
+    return batches, indices
+
+
+def scatter_batches(results, indices, count, frames_per_input=None):
+    """
+    Invert `batch_inputs_by_shape` on the results of the model: split each channels-first result batch back into one
+    channels-last result per input and return them in input order. `frames_per_input` is the temporal batch size if the
+    inputs were temporal batches, in which case each per-input result keeps its leading (T,) axis.
+    """
+    if len(indices) == 1 and not isinstance(results, (list, tuple)):
+        results = [results]
+    if len(results) != len(indices):
+        raise ValueError(f"Expected one result batch for each of the {len(indices)} input groups, got {len(results)}.")
+
+    outputs = [None] * count
+    step = 1 if frames_per_input is None else frames_per_input
+    for result, group in zip(results, indices):
+        for j, i in enumerate(group):
+            part = result[j] if frames_per_input is None else result[j * step:(j + 1) * step]
+            outputs[i] = _moveaxis(part, -3, -1)
+    return outputs
+
+
+class FrameBatcher:
+    """
+    Accumulates consecutive `FrameSet` objects and hands them to `flush_fn` as a list, either once `max_batch` have been
+    collected or once the oldest pending item has waited `max_wait_ms`, whichever comes first. Full batches are flushed
+    on the thread calling `add`; deadline flushes happen on a background timer thread, so latency stays bounded even if
+    no more frames arrive. The first exception raised by `flush_fn` on the timer thread is kept in `error`, and the
+    thread carries on flushing later batches; `close` resets it.
+    """
+
+    def __init__(self, flush_fn, max_batch=1, max_wait_ms=0.0):
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch}")
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.error = None
+
+        self._cond = threading.Condition()
+        # taken before releasing `_cond` so that batches are flushed in the order they were formed
+        self._flush_lock = threading.Lock()
+        self._items = list()
+        self._deadline = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._items)
+
+    def add(self, item):
+        with self._cond:
+            self._items.append(item)
+            if len(self._items) < self.max_batch:
+                if self._deadline is None:
+                    self._deadline = time.monotonic() + self.max_wait_ms / 1000.0
+                    self._ensure_thread()
+                    self._cond.notify()
+                return
+            items = self._take()
+            self._flush_lock.acquire()
+        self._flush(items)
+
+    def flush(self):
+        """
+        Flush any pending items immediately on the calling thread, eg. at end of stream.
+        """
+        with self._cond:
+            items = self._take()
+            self._flush_lock.acquire()
+        self._flush(items)
+
+    def clear(self):
+        """
+        Discard any pending items, eg. when the pipeline is flushing.
+        """
+        with self._cond:
+            self._take()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._take()
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.error = None
+
+    def _flush(self, items):
+        try:
+            if items:
+                self.flush_fn(items)
+        finally:
+            self._flush_lock.release()
+
+    def _take(self):
+        items, self._items = self._items, list()
+        self._deadline = None
+        return items
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="FrameBatcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._deadline is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                items = self._take()
+                self._flush_lock.acquire()
+            try:
+                self._flush(items)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
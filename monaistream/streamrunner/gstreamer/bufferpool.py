@@ -0,0 +1,101 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from contextlib import ExitStack
+
+import gi
+gi.require_version("Gst", "1.0")
+gi.require_version("GstVideo", "1.0")
+from gi.repository import Gst, GstVideo
+
+from monaistream.streamrunner.gstreamer.utils import VideoLayout, map_buffer_to_numpy
+
+__all__ = ["OutputBufferPool", "OutputPools"]
+
+
+class OutputBufferPool:
+    """
+    Preallocated pool of output buffers for a single src pad. The pool is sized from the given fixed video caps and
+    buffers are recycled by GStreamer once downstream releases them, so the memory used for outputs stays flat.
+    """
+
+    def __init__(self, caps, min_buffers=2, max_buffers=0):
+        if not caps.is_fixed():
+            raise ValueError(f"Output caps `{caps.to_string()}` must be fixed to size a buffer pool.")
+
+        self.caps = caps
+        self.layout = VideoLayout.from_caps(caps)
+        self._pool = GstVideo.VideoBufferPool()
+
+        config = self._pool.get_config()
+        Gst.BufferPool.config_set_params(config, caps, self.layout.size, min_buffers, max_buffers)
+        if not self._pool.set_config(config):
+            raise ValueError(f"Failed to configure buffer pool for caps `{caps.to_string()}`.")
+        if not self._pool.set_active(True):
+            raise RuntimeError(f"Failed to activate buffer pool for caps `{caps.to_string()}`.")
+
+    def acquire(self):
+        """
+        Get a free buffer from the pool, blocking until downstream returns one if all are in use.
+        """
+        ret, buffer = self._pool.acquire_buffer(None)
+        if ret != Gst.FlowReturn.OK:
+            raise RuntimeError(f"Failed to acquire a buffer from the output pool: {ret}")
+        return buffer
+
+    def close(self):
+        self._pool.set_active(False)
+
+
+class OutputPools:
+    """
+    One `OutputBufferPool` per src pad, created lazily from the pad's caps and recreated when those caps change.
+    `map_outputs` acquires a buffer for each pad and yields them alongside their writable mapped arrays.
+    """
+
+    def __init__(self, min_buffers=2, max_buffers=0):
+        self.min_buffers = min_buffers
+        self.max_buffers = max_buffers
+        self._pools = dict()
+
+    def get(self, pad, caps=None):
+        if caps is None:
+            caps = pad.get_current_caps() or pad.get_pad_template_caps()
+        pool = self._pools.get(pad.get_name())
+        if pool is None or not pool.caps.is_equal(caps):
+            if pool is not None:
+                pool.close()
+            pool = OutputBufferPool(caps, self.min_buffers, self.max_buffers)
+            self._pools[pad.get_name()] = pool
+        return pool
+
+    def map_outputs(self, pads, stack: ExitStack, caps=None):
+        """
+        Acquire and map a buffer for each of `pads` for writing; the mappings are released when `stack` closes.
+        Returns the list of buffers and the list of arrays over their memory.
+        """
+        buffers, arrays = list(), list()
+        for i, pad in enumerate(pads):
+            pool = self.get(pad, None if caps is None else caps[i])
+            buffer = pool.acquire()
+            buffers.append(buffer)
+            arrays.append(stack.enter_context(map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, pool.layout)))
+        return buffers, arrays
+
+    def remove(self, pad):
+        pool = self._pools.pop(pad.get_name(), None)
+        if pool is not None:
+            pool.close()
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
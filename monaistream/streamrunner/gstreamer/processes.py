@@ -0,0 +1,579 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import threading
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.connection import wait
+from typing import Callable, Optional
+
+import numpy as np
+
+from monaistream.streamrunner.arrays import as_numpy, to_array_type
+
+__all__ = ["SharedFrameRing", "ProcessWorkerPool"]
+
+# offsets of the arrays packed into a slot are aligned to this many bytes
+_ALIGN = 64
+
+
+def _aligned(size):
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def packed_size(obj) -> int:
+    """
+    The number of slot bytes `SharedFrameRing.write` needs for `obj`, an array or nested list or tuple of arrays.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, (list, tuple)):
+        return sum(packed_size(o) for o in obj)
+    return _aligned(as_numpy(obj).nbytes)
+
+
+class SharedFrameRing:
+    """
+    `capacity` slots of `slot_bytes` each in one `multiprocessing.shared_memory.SharedMemory` block, through which
+    frames and results pass between processes without being pickled. The ring named `name` is attached to, otherwise a
+    new one is created; only the process that created it should `close` it with `unlink=True`.
+
+    `write` copies an array, or a nested list or tuple of arrays, into a slot and returns a small picklable descriptor
+    of the offsets, shapes and dtypes, which is all that has to be sent to the other process for `read` to get views of
+    the arrays there. Objects too large for a slot are carried inline in the descriptor instead, which is slower but
+    keeps a stream whose frames grow from stalling.
+    """
+
+    def __init__(self, capacity: int, slot_bytes: int, name: Optional[str] = None):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        if slot_bytes < 1:
+            raise ValueError(f"slot_bytes must be at least 1, got {slot_bytes}")
+        self.capacity = capacity
+        self.slot_bytes = _aligned(slot_bytes)
+        if name is None:
+            self._shm = SharedMemory(create=True, size=capacity * self.slot_bytes)
+        else:
+            self._shm = SharedMemory(name=name)
+        # every view is taken from this array, so while any is referenced the mapping cannot be closed under it
+        self._bytes = np.ndarray((capacity * self.slot_bytes,), np.uint8, buffer=self._shm.buf)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _slot_buffer(self, slot):
+        if not 0 <= slot < self.capacity:
+            raise ValueError(f"slot {slot} is out of range for a ring of {self.capacity} slots")
+        start = slot * self.slot_bytes
+        return self._bytes[start : start + self.slot_bytes]
+
+    def write(self, slot: int, obj):
+        """
+        Copy `obj` into `slot` and return its descriptor for `read`.
+        """
+        if packed_size(obj) > self.slot_bytes:
+            return ("inline", _copy(obj))
+        desc, _ = _pack(self._slot_buffer(slot), obj, 0)
+        return desc
+
+    def read(self, slot: int, desc):
+        """
+        Get the object described by `desc` from `slot`, as Numpy views of the shared memory which are only valid until
+        the slot is written again.
+        """
+        if desc is not None and desc[0] == "inline":
+            return desc[1]
+        return _unpack(self._slot_buffer(slot), desc)
+
+    def close(self, unlink: bool = False):
+        self._bytes = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # views given out by `read` are still referenced; the mapping goes when they do
+        if unlink:
+            self._shm.unlink()
+
+
+def _copy(obj):
+    if obj is None:
+        return None
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_copy(o) for o in obj)
+    return np.array(as_numpy(obj))
+
+
+def _pack(buf, obj, offset):
+    if obj is None:
+        return None, offset
+    if isinstance(obj, (list, tuple)):
+        descs = list()
+        for o in obj:
+            desc, offset = _pack(buf, o, offset)
+            descs.append(desc)
+        return ("seq", isinstance(obj, tuple), descs), offset
+    array = as_numpy(obj)
+    target = _view(buf, offset, array.shape, array.dtype)
+    np.copyto(target, array)
+    return ("array", offset, array.shape, array.dtype.str), offset + _aligned(array.nbytes)
+
+
+def _unpack(buf, desc):
+    if desc is None:
+        return None
+    if desc[0] == "seq":
+        _, is_tuple, descs = desc
+        items = [_unpack(buf, d) for d in descs]
+        return tuple(items) if is_tuple else items
+    _, offset, shape, dtype = desc
+    return _view(buf, offset, shape, np.dtype(dtype))
+
+
+def _view(buf, offset, shape, dtype):
+    count = int(np.prod(shape, dtype=np.int64))
+    return buf[offset : offset + count * dtype.itemsize].view(dtype).reshape(shape)
+
+
+class _Rings:
+    """
+    The input and output rings items are written to, from the time they are submitted until they are emitted. `users`
+    counts those items, so that rings replaced by larger ones are freed once the last item using them is done.
+    """
+
+    __slots__ = ("inputs", "outputs", "users")
+
+    def __init__(self, capacity, slot_bytes, result_slot_bytes):
+        self.inputs = SharedFrameRing(capacity, slot_bytes)
+        try:
+            self.outputs = SharedFrameRing(capacity, result_slot_bytes)
+        except Exception:
+            self.inputs.close(unlink=True)
+            raise
+        self.users = 0
+
+    @property
+    def spec(self):
+        """
+        What a worker needs to attach to the rings, sent with each task.
+        """
+        inputs, outputs = self.inputs, self.outputs
+        return inputs.capacity, inputs.name, inputs.slot_bytes, outputs.name, outputs.slot_bytes
+
+    def close(self):
+        self.inputs.close(unlink=True)
+        self.outputs.close(unlink=True)
+
+
+def _run_worker(do_op, array_type, tasks, results, results_lock, warmup_args=None):
+    """
+    Body of each worker process: run `do_op` once on `warmup_args` if given, then on the frames of each task's input
+    slot and write its results to the same slot of the output ring, until a None task arrives. Each task names the
+    rings it uses, which are attached to when they change, eg. after the pool grew its slots. Results are sent
+    synchronously on the `results` pipe, shared by all workers under `results_lock`, so none are lost if the process
+    dies afterwards.
+    """
+    spec, inputs, outputs = None, None, None
+    if warmup_args is not None:
+        try:
+            do_op(*warmup_args)
+        except Exception:
+            pass  # the op already warmed up on these in the parent; a real failure shows on the first frame
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            seq, slot, desc, task_spec = task
+            if task_spec != spec:
+                # tasks are taken in order, so none will use the previous rings any more
+                if inputs is not None:
+                    inputs.close()
+                    outputs.close()
+                capacity, inputs_name, slot_bytes, outputs_name, result_slot_bytes = spec = task_spec
+                inputs = SharedFrameRing(capacity, slot_bytes, inputs_name)
+                outputs = SharedFrameRing(capacity, result_slot_bytes, outputs_name)
+            try:
+                frames = [to_array_type(f, array_type) for f in inputs.read(slot, desc)]
+                result_desc, error = outputs.write(slot, do_op(frames)), None
+            except Exception as e:
+                result_desc, error = None, f"{e!r}\n{traceback.format_exc()}"
+            frames = None
+            with results_lock:
+                results.send((seq, slot, result_desc, error))
+    finally:
+        if inputs is not None:
+            inputs.close()
+            outputs.close()
+
+
+# completes an item that was lost with its worker process, which is then not emitted
+_LOST = object()
+
+
+class ProcessWorkerPool:
+    """
+    Runs `do_op` on frames in `n_processes` worker processes and passes its results to `emit_fn` in submission order,
+    so Python-heavy operations are not serialised by the GIL of one process. `do_op` is called as `do_op(frames)` with
+    the list of frames given to `submit`, converted to `array_type`, and returns a list of result arrays, as a
+    `GstStreamRunnerBackend` op does. With the default "spawn" `start_method` it must be picklable, eg. a module level
+    function or an instance of a module level class, and is sent to each process when it starts.
+
+    Frames and results pass through two `SharedFrameRing` of `max_in_flight` slots, so only sequence numbers, slot
+    indices and descriptors go through the control queues; each item's `context`, such as its timestamps, stays in this
+    process. Slot sizes are taken from the first frames submitted unless `slot_bytes` is given, and results get
+    `result_slot_bytes`, by default four times the slot size so float results of 8-bit frames fit. When frames or
+    results outgrow their slots, eg. after a resolution change, the following items get new rings with slots large
+    enough for them, and the old rings are freed once the items still using them are done. At most `max_in_flight`
+    items may be queued, running or waiting to be emitted; `submit` blocks beyond that.
+
+    Each item is given to the worker with the fewest items outstanding. If a worker process dies, the items given to
+    it are lost: they are not emitted, and counted in `lost`, and a new process takes its place, up to `max_restarts`
+    times over the pool's life. Beyond that the death is fatal and fails every later item.
+
+    If `warmup_args` are given, each worker process calls `do_op(*warmup_args)` once when it starts, so the first
+    frames do not pay for lazy initialisation, eg. after the op was swapped for a model warmed up in this process.
+
+    `emit_fn(results, context)` is called from the pool's collector thread with views of the shared memory, which are
+    only valid during the call. The first error, an exception of `do_op` (re-raised as RuntimeError carrying the
+    worker's traceback), of `emit_fn` or a fatal death of a worker process, is kept in `error` and the affected items
+    are not emitted.
+    """
+
+    def __init__(
+        self,
+        do_op: Callable,
+        emit_fn: Callable,
+        n_processes: int = 1,
+        max_in_flight: int = 2,
+        slot_bytes: Optional[int] = None,
+        result_slot_bytes: Optional[int] = None,
+        array_type: str = "numpy",
+        start_method: str = "spawn",
+        name: str = "ProcessWorkerPool",
+        warmup_args=None,
+        max_restarts: int = 3,
+    ):
+        if n_processes < 1:
+            raise ValueError(f"n_processes must be at least 1, got {n_processes}")
+        self.do_op = do_op
+        self.emit_fn = emit_fn
+        self.n_processes = n_processes
+        self.max_in_flight = max(max_in_flight, 1)
+        self.slot_bytes = slot_bytes
+        self.result_slot_bytes = result_slot_bytes
+        self.array_type = array_type
+        self.name = name
+        self.warmup_args = warmup_args
+        self.max_restarts = max_restarts
+        self.error = None
+        self.lost = 0
+        self.restarts = 0
+
+        self._context = multiprocessing.get_context(start_method)
+        self._cond = threading.Condition()
+        # taken before releasing `_cond` so that results are emitted in sequence order
+        self._emit_lock = threading.Lock()
+        self._pending = dict()  # seq -> (slot, context, rings, worker) of the items submitted
+        self._done = dict()  # seq -> (slot, context, rings, results, error, from_worker) of the items ready to emit
+        self._free = list()
+        self._next_submit = 0
+        self._next_emit = 0
+        self._emitted = 0
+        self._running = False
+        self._rings = None
+        self._result_bytes = 0  # the largest result that did not fit in its slot
+        self._results = None
+        self._results_writer = None
+        self._results_lock = None
+        self._lost = None
+        self._processes = list()
+        self._tasks = list()  # the task queue of each worker process
+        self._load = list()  # the number of items outstanding on each worker process
+        self._collector = None
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return self._next_submit - self._emitted
+
+    def submit(self, frames, context=None):
+        """
+        Copy `frames`, a list of arrays (or tuples of per-plane arrays), into a free slot and queue `do_op` on them.
+        Returns the item's sequence number.
+        """
+        frames = list(frames)
+        size = packed_size(frames)
+        with self._cond:
+            self._ensure_started(size)
+            seq, slot = self._reserve()
+            rings = self._grow_rings(size)
+            rings.users += 1
+            worker = min(range(len(self._load)), key=self._load.__getitem__)
+            self._load[worker] += 1
+            self._pending[seq] = (slot, context, rings, worker)
+            tasks = self._tasks[worker]
+            lost = self._lost
+        if lost is not None:
+            self._complete(seq, slot, None, lost)
+            return seq
+        try:
+            desc = rings.inputs.write(slot, frames)
+            tasks.put((seq, slot, desc, rings.spec))
+        except Exception as e:
+            self._complete(seq, slot, None, e)
+        return seq
+
+    def submit_done(self, results, context=None):
+        """
+        Queue `results` to be emitted as they are, in order with the items submitted before them, without running
+        `do_op`. Returns the item's sequence number.
+        """
+        with self._cond:
+            while self._next_submit - self._emitted >= self.max_in_flight:
+                self._cond.wait()
+            seq = self._next_submit
+            self._next_submit += 1
+            self._pending[seq] = (None, context, None, None)
+        self._complete(seq, None, results, None)
+        return seq
+
+    def drain(self, timeout=None):
+        """
+        Wait until everything submitted so far has been run and emitted. Returns False if `timeout` expired first.
+        """
+        with self._cond:
+            target = self._next_submit
+            return self._cond.wait_for(lambda: self._emitted >= target, timeout)
+
+    def close(self):
+        """
+        Drain outstanding work, stop the worker processes and free the shared memory; the pool starts again if more
+        work is submitted.
+        """
+        self.drain()
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            processes, self._processes = self._processes, list()
+            tasks, self._tasks = self._tasks, list()
+            collector, self._collector = self._collector, None
+
+        for queue in tasks:
+            queue.put(None)
+        for p in processes:
+            p.join(5.0)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        self._results_writer.send(None)
+        if collector is not threading.current_thread():
+            collector.join()
+
+        for queue in tasks:
+            queue.close()
+            queue.join_thread()
+        self._results.close()
+        self._results_writer.close()
+        self._rings.close()
+        self._rings = self._results = self._results_writer = self._results_lock = None
+        self._load = list()
+        self._result_bytes = 0
+        self._lost = None
+
+    def _ensure_started(self, size):
+        """
+        Create the rings and start the worker processes, if not running. Called with `_cond` held.
+        """
+        if self._running:
+            return
+        slot_bytes = max(self.slot_bytes or size, 1)
+        self._rings = _Rings(self.max_in_flight, slot_bytes, max(self.result_slot_bytes or 4 * slot_bytes, 1))
+        self._results, self._results_writer = self._context.Pipe(duplex=False)
+        self._results_lock = self._context.Lock()  # kept referenced while the workers start, which attach to it
+        self._free = list(range(self.max_in_flight))
+        self._processes, self._tasks, self._load = list(), list(), list()
+        try:
+            for i in range(self.n_processes):
+                self._start_worker(i)
+        except Exception as e:
+            for p in self._processes:
+                p.terminate()
+            self._rings.close()
+            raise RuntimeError(f"Failed to start the worker processes of {self.name}: {e}") from e
+        self._running = True
+        self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, index):
+        """
+        Start worker process `index` with a new task queue, in place of the one that was there if any.
+        """
+        tasks = self._context.Queue()
+        p = self._context.Process(
+            target=_run_worker,
+            args=(self.do_op, self.array_type, tasks, self._results_writer, self._results_lock, self.warmup_args),
+            name=f"{self.name}-{index}",
+            daemon=True,
+        )
+        p.start()
+        if index < len(self._processes):
+            self._processes[index], self._tasks[index], self._load[index] = p, tasks, 0
+        else:
+            self._processes.append(p)
+            self._tasks.append(tasks)
+            self._load.append(0)
+        return p
+
+    def _grow_rings(self, size):
+        """
+        Get the rings for an item of `size` bytes, replacing the current ones with larger rings if it or the largest
+        result seen would not fit. Called with `_cond` held.
+        """
+        rings = self._rings
+        if size <= rings.inputs.slot_bytes and self._result_bytes <= rings.outputs.slot_bytes:
+            return rings
+        self._rings = _Rings(
+            self.max_in_flight,
+            max(size, rings.inputs.slot_bytes),
+            max(self._result_bytes, rings.outputs.slot_bytes),
+        )
+        if rings.users == 0:
+            rings.close()
+        return self._rings
+
+    def _reserve(self):
+        """
+        Wait for room for another item and take a free slot for it. Called with `_cond` held.
+        """
+        while self._next_submit - self._emitted >= self.max_in_flight or not self._free:
+            self._cond.wait()
+        seq = self._next_submit
+        self._next_submit += 1
+        return seq, self._free.pop(0)
+
+    def _collect(self):
+        """
+        Receive results from the workers and emit them in order, and replace the worker processes that die.
+        """
+        with self._cond:
+            sentinels = {p.sentinel: (i, p) for i, p in enumerate(self._processes)}
+        while True:
+            ready = wait([self._results, *sentinels])
+            if self._results in ready:
+                message = self._results.recv()
+                if message is None:
+                    return
+                seq, slot, desc, error = message
+                if error is not None:
+                    error = RuntimeError(f"do_op failed in a worker process: {error}")
+                self._complete(seq, slot, desc, error, from_worker=True)
+                continue  # results sent before a worker died are received before its death is handled
+
+            for sentinel in ready:
+                sentinels.update(self._worker_died(*sentinels.pop(sentinel)))
+
+    def _worker_died(self, index, dead):
+        """
+        Handle the death of worker process `index`: drop the items given to it and start a new process in its place,
+        or fail every outstanding item if it has been restarted too often. Returns {sentinel: (index, process)} for the
+        new process.
+        """
+        dead.join()  # reap it to get its exit code
+        with self._cond:
+            if not self._running:
+                return dict()  # stopped by `close`
+            tasks = self._tasks[index]
+            lost = [
+                (seq, slot) for seq, (slot, _, _, worker) in self._pending.items()
+                if worker == index and seq not in self._done
+            ]
+            restart = self._lost is None and self.restarts < self.max_restarts
+            if restart:
+                self.restarts += 1
+                try:
+                    p = self._start_worker(index)
+                    self._load[index] = len(lost)  # until they are completed as lost below
+                except Exception as e:
+                    restart = False
+                    self._lost = RuntimeError(f"Failed to restart worker process {dead.name}: {e}")
+            elif self._lost is None:
+                self._lost = RuntimeError(f"Worker process {dead.name} exited with code {dead.exitcode}")
+        if not restart:
+            self._fail_outstanding()
+            return dict()
+        tasks.cancel_join_thread()  # tasks it never took are lost with it
+        tasks.close()
+        for seq, slot in lost:
+            self._complete(seq, slot, _LOST, None)
+        return {p.sentinel: (index, p)}
+
+    def _fail_outstanding(self):
+        """
+        Fail every item not yet completed once a worker has died for good: the task it was running never completes,
+        so nothing after it could be emitted.
+        """
+        with self._cond:
+            outstanding = [(seq, slot) for seq, (slot, *_) in self._pending.items() if seq not in self._done]
+        for seq, slot in outstanding:
+            self._complete(seq, slot, None, self._lost)
+
+    def _complete(self, seq, slot, results, error, from_worker=False):
+        """
+        Record the outcome of item `seq` and emit whatever is next in sequence.
+        """
+        with self._cond:
+            if seq in self._done or seq not in self._pending:
+                return  # already failed or lost because its worker died
+            _, context, rings, worker = self._pending[seq]
+            if worker is not None:
+                self._load[worker] -= 1
+            if from_worker and results is not None and results[0] == "inline":
+                # the results did not fit in their slot, so give the following items larger ones
+                self._result_bytes = max(self._result_bytes, packed_size(results[1]))
+            self._done[seq] = (slot, context, rings, results, error, from_worker)
+            ready = list()
+            while self._next_emit in self._done:
+                ready.append(self._done.pop(self._next_emit))
+                self._pending.pop(self._next_emit)
+                self._next_emit += 1
+            if not ready:
+                return
+            self._emit_lock.acquire()
+
+        try:
+            for slot, context, rings, results, error, from_worker in ready:
+                if results is _LOST:
+                    self.lost += 1
+                elif error is None:
+                    try:
+                        if from_worker:
+                            results = rings.outputs.read(slot, results)
+                        self.emit_fn(results, context)
+                    except Exception as e:
+                        error = e
+                    results = None
+                if error is not None and self.error is None:
+                    self.error = error
+        finally:
+            self._emit_lock.release()
+            with self._cond:
+                for slot, context, rings, *_ in ready:
+                    if slot is not None:
+                        self._free.append(slot)
+                    if rings is not None:
+                        rings.users -= 1
+                        if rings.users == 0 and rings is not self._rings:
+                            rings.close()
+                self._emitted += len(ready)
+                self._cond.notify_all()
@@ -0,0 +1,57 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caps and GObject property specifications of the runner elements. They are kept apart from the elements themselves
+so that the plugin registry can advertise the elements without importing their implementations.
+"""
+
+import gi
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, GObject
+
+from monaistream.streamrunner.gstreamer.qos import QOS_MODES
+
+__all__ = ["FORMATS", "RUNNER_PROPERTIES", "BUNDLE_PROPERTIES"]
+
+
+# planar NV12/I420 frames are given to do_op as a tuple of per-plane arrays, see VideoLayout.view
+FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR,GRAY8,GRAY16_LE,GRAY16_BE,NV12,I420}"
+
+# properties of the transform runners; the base transforms' own "qos" handling drops late frames before Python sees
+# them, so the runners do their own
+RUNNER_PROPERTIES = {
+    "qos-mode": (
+        str, "QoS mode", f"What to do with frames that are already late, one of {', '.join(QOS_MODES)}",
+        "off", GObject.ParamFlags.READWRITE,
+    ),
+    "max-lateness-ms": (
+        float, "Max lateness ms", "How late in milliseconds a frame may be and still be processed",
+        0.0, GLib.MAXDOUBLE, 0.0, GObject.ParamFlags.READWRITE,
+    ),
+    "metrics-interval-ms": (
+        float, "Metrics interval ms", "Interval between monaistream-metrics bus messages; 0 to only post at EOS",
+        0.0, GLib.MAXDOUBLE, 0.0, GObject.ParamFlags.READWRITE,
+    ),
+}
+
+BUNDLE_PROPERTIES = dict(
+    RUNNER_PROPERTIES,
+    **{
+        "bundle-path": (
+            str, "Bundle path", "Directory of the MONAI bundle to run", None, GObject.ParamFlags.READWRITE,
+        ),
+        "config-file": (
+            str, "Config file", "Config file relative to the bundle directory; configs/inference.json if unset",
+            None, GObject.ParamFlags.READWRITE,
+        ),
+    },
+)
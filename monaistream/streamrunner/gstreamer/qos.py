@@ -0,0 +1,120 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from dataclasses import dataclass
+
+__all__ = ["QOS_MODES", "QosStats", "QosDecision", "QosController"]
+
+
+# "drop" discards late frames, "skip" lets them through without running inference
+QOS_MODES = ("off", "drop", "skip")
+
+
+@dataclass
+class QosStats:
+    processed: int = 0
+    dropped: int = 0
+    skipped: int = 0
+
+
+@dataclass(frozen=True)
+class QosDecision:
+    """
+    What to do with one frame: `action` is "process", "drop" or "skip". For a late frame `jitter` is how late it is in
+    nanoseconds, and `from_clock` is True if the lateness was found against the clock rather than reported by a
+    downstream QoS event, in which case upstream has not been told about it yet.
+    """
+
+    action: str
+    jitter: int = 0
+    from_clock: bool = False
+
+
+class QosController:
+    """
+    Decides whether frames are too late to be worth running inference on. A frame is late if its running time is
+    before the earliest time downstream reported it will still accept (from QoS events, as `GstBaseTransform` does),
+    or if the clock is already past the time it should be rendered at, its running time plus duration plus the
+    pipeline latency. `max_lateness` (nanoseconds) is how late a frame may be and still be processed.
+    """
+
+    def __init__(self, mode="off", max_lateness=0):
+        self._lock = threading.Lock()
+        self._stats = QosStats()
+        self._earliest_time = None
+        self._proportion = 1.0
+        self._latency = 0
+        self.mode = mode
+        self.max_lateness = max_lateness
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        if mode not in QOS_MODES:
+            raise ValueError(f"unknown qos mode {mode}; must be one of {QOS_MODES}")
+        self._mode = mode
+
+    @property
+    def proportion(self):
+        return self._proportion
+
+    @property
+    def stats(self):
+        with self._lock:
+            return QosStats(**vars(self._stats))
+
+    def update(self, proportion, diff, timestamp):
+        """
+        Record a QoS event from downstream: the frame at running time `timestamp` was `diff` nanoseconds late.
+        """
+        with self._lock:
+            self._proportion = proportion
+            self._earliest_time = timestamp + diff
+
+    def set_latency(self, latency):
+        with self._lock:
+            self._latency = latency
+
+    def reset(self):
+        """
+        Forget reported lateness, eg. after a flush; the statistics are kept.
+        """
+        with self._lock:
+            self._earliest_time = None
+            self._proportion = 1.0
+
+    def decide(self, running_time, duration=None, now=None):
+        """
+        Decide what to do with the frame at `running_time` (None if unknown, which is always processed), given the
+        current running time of the clock `now` if there is one, and count the decision.
+        """
+        with self._lock:
+            jitter, from_clock = None, False
+            if self._mode != "off" and running_time is not None:
+                if self._earliest_time is not None and running_time + self.max_lateness < self._earliest_time:
+                    jitter = self._earliest_time - running_time
+                elif now is not None:
+                    deadline = running_time + (duration or 0) + self._latency + self.max_lateness
+                    if now > deadline:
+                        jitter, from_clock = now - deadline, True
+
+            if jitter is None:
+                self._stats.processed += 1
+                return QosDecision("process")
+            if self._mode == "drop":
+                self._stats.dropped += 1
+            else:
+                self._stats.skipped += 1
+            return QosDecision(self._mode, jitter, from_clock)
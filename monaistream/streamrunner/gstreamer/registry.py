@@ -0,0 +1,233 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The table of monaistream's GStreamer elements, from which they are registered with GStreamer in-process by
+`register_elements` or advertised to the registry through the gst-python plugin files in `monaistream/gstreamer/python`
+(see `lazy_element_factory`). Only what the registry needs is stated here, so listing the elements imports none of
+their implementations; an element's module is imported when the element is first instantiated.
+"""
+
+import importlib
+import threading
+from dataclasses import dataclass
+
+__all__ = [
+    "ElementEntry",
+    "ELEMENTS",
+    "element_names",
+    "get_element_type",
+    "register_elements",
+    "lazy_element_factory",
+]
+
+
+@dataclass(frozen=True)
+class ElementEntry:
+    """
+    An element's factory name, the module and class implementing it, its metadata (long name, classification,
+    description, author), its pad templates as (name template, "sink" or "src", "always" or "request") with the runner
+    video caps, and the name of its property table in `properties`.
+
+    `abstract` elements have no op of their own: it comes from a subclass's `do_op`, eg. made with
+    `create_registerable_plugin`, or is given to the constructor from Python, as `StreamRunner` does for the backend.
+    Created by factory name they could not process anything, so they are neither advertised to the plugin registry
+    nor registered by `register_elements` unless named explicitly.
+    """
+
+    name: str
+    module: str
+    class_name: str
+    metadata: tuple
+    templates: tuple = ()
+    properties: str = None
+    abstract: bool = False
+
+    @property
+    def advertised(self):
+        return len(self.templates) > 0 and not self.abstract
+
+
+_TRANSFORM_TEMPLATES = (("sink", "sink", "always"), ("src", "src", "always"))
+_AGGREGATOR_TEMPLATES = (("sink_%u", "sink", "request"), ("src", "src", "always"))
+_BACKEND_TEMPLATES = (("sink_%u", "sink", "request"), ("src_%u", "src", "request"))
+_PLUGIN_MODULE = "monaistream.streamrunner.gstreamer_plugin"
+
+ELEMENTS = {
+    e.name: e
+    for e in (
+        ElementEntry(
+            "gstinplacestreamrunner", _PLUGIN_MODULE, "GstInPlaceStreamRunner",
+            ("Gst In Place Stream Runner", "Transform", "Description", "Author"),
+            _TRANSFORM_TEMPLATES, "RUNNER_PROPERTIES", abstract=True,
+        ),
+        ElementEntry(
+            "gstadaptorstreamrunner", _PLUGIN_MODULE, "GstAdaptorStreamRunner",
+            ("Adaptor Stream Runner", "Transform", "Description", "Author"),
+            _TRANSFORM_TEMPLATES, "RUNNER_PROPERTIES", abstract=True,
+        ),
+        ElementEntry(
+            "gstbundlestreamrunner", _PLUGIN_MODULE, "GstBundleStreamRunner",
+            ("Bundle Stream Runner", "Transform", "Runs a MONAI bundle on each frame", "MONAI Consortium"),
+            _TRANSFORM_TEMPLATES, "BUNDLE_PROPERTIES",
+        ),
+        ElementEntry(
+            "gstmultiinputstreamrunner", _PLUGIN_MODULE, "GstMultiInputStreamRunner",
+            ("MultiInputStreamRunner", "Filter", "StreamRunner for handling multiple inputs", "MONAI"),
+            _AGGREGATOR_TEMPLATES, abstract=True,
+        ),
+        ElementEntry(
+            "gstmultiinputstreamrunner2", _PLUGIN_MODULE, "GstMultiInputStreamRunner2",
+            ("MultiInputStreamRunner2", "Filter", "StreamRunner for handling multiple inputs", "MONAI"),
+            _AGGREGATOR_TEMPLATES, abstract=True,
+        ),
+        ElementEntry(
+            "gstmultiinputstreamrunner3", _PLUGIN_MODULE, "GstMultiInputStreamRunner3",
+            ("MultiInputStreamRunner3", "Filter", "StreamRunner for handling multiple inputs", "MONAI"),
+            _AGGREGATOR_TEMPLATES, abstract=True,
+        ),
+        ElementEntry(
+            "gststreamrunnerbackend", "monaistream.streamrunner.gstreamer.backend", "GstStreamRunnerBackend",
+            ("GstStreamRunnerBackend", "Filter", "Overlay images", "Author"),
+            _BACKEND_TEMPLATES, abstract=True,
+        ),
+    )
+}
+
+_types = dict()
+_lazy_types = dict()
+_types_lock = threading.Lock()
+
+
+def element_names(advertised_only=False, concrete_only=False):
+    return tuple(
+        name for name, e in ELEMENTS.items()
+        if (e.advertised or not advertised_only) and (not e.abstract or not concrete_only)
+    )
+
+
+def _entry(name):
+    entry = ELEMENTS.get(name)
+    if entry is None:
+        raise ValueError(f"unknown element {name}; must be one of {element_names()}")
+    return entry
+
+
+def get_element_type(name):
+    """
+    Import the module implementing element `name` and return its class.
+    """
+    entry = _entry(name)
+    with _types_lock:
+        element_type = _types.get(name)
+        if element_type is None:
+            module = importlib.import_module(entry.module)
+            element_type = _types[name] = getattr(module, entry.class_name)
+    return element_type
+
+
+def register_elements(names=None, plugin=None):
+    """
+    Register the elements `names` (all elements that are not abstract if None) with GStreamer in this process,
+    importing their implementations, so they can be created by factory name or in `Gst.parse_launch` descriptions.
+    Elements already registered, eg. through the plugin files, are left as they are, so this can be called at every
+    start.
+    """
+    Gst = _gst()
+
+    registered = list()
+    for name in element_names(concrete_only=True) if names is None else names:
+        _entry(name)
+        if Gst.ElementFactory.find(name) is not None:
+            continue
+        if not Gst.Element.register(plugin, name, Gst.Rank.NONE, get_element_type(name)):
+            raise ValueError(f"Failed to register {name}; you may be missing gst-python plugins")
+        registered.append(name)
+    return tuple(registered)
+
+
+def lazy_element_factory(name):
+    """
+    Get the `__gstelementfactory__` tuple with which a gst-python plugin file advertises element `name`. The factory's
+    type is a bin with the element's pads and properties that only imports the implementation when it is instantiated,
+    then wraps an instance of it, so scanning the plugin or inspecting the element imports nothing of monaistream
+    beyond this module and `properties`.
+    """
+    Gst = _gst()
+
+    entry = _entry(name)
+    if not entry.advertised:
+        raise ValueError(f"element {name} is abstract or has no pad templates and can only be registered in-process")
+    with _types_lock:
+        lazy_type = _lazy_types.get(name)
+        if lazy_type is None:
+            lazy_type = _lazy_types[name] = _make_lazy_type(entry)
+    return name, Gst.Rank.NONE, lazy_type
+
+
+def _gst():
+    import gi
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    return Gst
+
+
+def _make_lazy_type(entry):
+    Gst = _gst()
+
+    from monaistream.streamrunner.gstreamer import properties
+
+    caps = Gst.Caps.from_string(f"video/x-raw,format={properties.FORMATS}")
+    directions = dict(sink=Gst.PadDirection.SINK, src=Gst.PadDirection.SRC)
+    presences = dict(always=Gst.PadPresence.ALWAYS, request=Gst.PadPresence.REQUEST)
+
+    class LazyElement(Gst.Bin):
+        __gtype_name__ = f"Lazy{entry.class_name}"
+        __gstmetadata__ = entry.metadata
+        __gsttemplates__ = tuple(
+            Gst.PadTemplate.new(name, directions[direction], presences[presence], caps)
+            for name, direction, presence in entry.templates
+        )
+        __gproperties__ = dict(getattr(properties, entry.properties)) if entry.properties else {}
+
+        def __init__(self):
+            super().__init__()
+            self.element = get_element_type(entry.name)()
+            self.add(self.element)
+            for pad in list(self.element.pads):
+                self._add_ghost_pad(pad)
+
+        def _add_ghost_pad(self, pad):
+            template = self.get_pad_template(pad.get_pad_template().name_template)
+            ghost = Gst.GhostPad.new_from_template(pad.get_name(), pad, template)
+            if self.get_state(0)[1] > Gst.State.READY:
+                ghost.set_active(True)
+            self.add_pad(ghost)
+            return ghost
+
+        def do_request_new_pad(self, template, name=None, caps=None):
+            pad = self.element.request_pad(self.element.get_pad_template(template.name_template), name, caps)
+            return None if pad is None else self._add_ghost_pad(pad)
+
+        def do_release_pad(self, pad):
+            target = pad.get_target()
+            self.remove_pad(pad)
+            self.element.release_request_pad(target)
+
+        def do_get_property(self, prop):
+            return self.element.get_property(prop.name)
+
+        def do_set_property(self, prop, value):
+            self.element.set_property(prop.name, value)
+
+    return LazyElement
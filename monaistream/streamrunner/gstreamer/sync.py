@@ -0,0 +1,235 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+__all__ = ["SyncStats", "InputSynchronizer"]
+
+
+_WAIT = object()
+_MISS = object()
+
+
+@dataclass
+class SyncStats:
+    matched: int = 0
+    missed: int = 0
+    discarded: int = 0
+
+
+class InputSynchronizer:
+    """
+    Forms sets of one item per input aligned on their timestamps (running times in nanoseconds). Each item arriving on
+    the primary input is matched with the item of each secondary input whose timestamp is closest to its own among those
+    received so far, provided it is within `tolerance` (None for any distance). A primary item waits while a secondary
+    input has nothing recent enough yet, and is dropped as missed if that input has moved past it without a match or if
+    more than `max_pending` primary items are waiting. Secondary items are released as soon as a later one has been
+    matched, and at most `max_slot` are kept per input, so old buffers are not held on to.
+
+    Each input has its own slot; the internal lock only guards the slot bookkeeping. Completed sets are handed to the
+    handler in primary order on the thread that completed them, outside that lock: each group of sets takes a ticket
+    while the lock is held and waits for its turn after releasing it, so inputs only wait on each other if both complete
+    sets at the same time, and the handler never runs while a lock is held.
+    """
+
+    def __init__(self, tolerance=None, primary=None, max_pending=4, max_slot=8):
+        self.tolerance = tolerance
+        self.primary = primary
+        self.max_pending = max(max_pending, 1)
+        self.max_slot = max(max_slot, 1)
+
+        self._lock = threading.Lock()
+        # tickets taken under `_lock` so that sets are handled in the order they were completed
+        self._turn = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._slots = dict()
+        self._finished = set()
+        self._pending = deque()
+        self._stats = SyncStats()
+
+    @property
+    def names(self):
+        with self._lock:
+            return tuple(self._slots.keys())
+
+    @property
+    def primary_name(self):
+        with self._lock:
+            return self._primary_name()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return SyncStats(**vars(self._stats))
+
+    def add(self, name, index=None):
+        """
+        Add input `name`, at position `index` of the sets (the end if None), eg. for an input rejoining after EOS.
+        """
+        with self._lock:
+            if name in self._slots:
+                return
+            slots = list(self._slots.items())
+            slots.insert(len(slots) if index is None else index, (name, deque()))
+            self._slots = dict(slots)
+
+    def remove(self, name, handler=None):
+        """
+        Remove input `name` and release its items, eg. when its pad is removed while streaming. If it was the primary
+        input, its waiting items are dropped as missed; otherwise the primary items that only waited for it complete
+        their sets, which are passed to `handler` if given. Returns the number of sets handled.
+        """
+        with self._lock:
+            if name not in self._slots:
+                return 0
+            if name == self._primary_name():
+                self._stats.missed += len(self._pending)
+                self._pending.clear()
+            self._slots.pop(name)
+            self._finished.discard(name)
+            sets = self._match() if handler is not None else None
+            if not sets:
+                return 0
+            ticket = self._take_ticket()
+        return self._handle(sets, handler, ticket)
+
+    def push(self, name, timestamp, item, handler):
+        """
+        Store `item` from input `name` and call `handler` with each set completed by it, a list of items in the order
+        the inputs were added. Items of inputs that are not (or no longer) added are ignored. Returns the number of
+        sets handled.
+        """
+        with self._lock:
+            if name not in self._slots:
+                return 0
+            if name == self._primary_name():
+                self._pending.append((timestamp, item))
+                if len(self._pending) > self.max_pending:
+                    self._pending.popleft()
+                    self._stats.missed += 1
+            else:
+                slot = self._slots[name]
+                slot.append((timestamp, item))
+                if len(slot) > self.max_slot:
+                    slot.popleft()
+                    self._stats.discarded += 1
+            sets = self._match()
+            if not sets:
+                return 0
+            ticket = self._take_ticket()
+        return self._handle(sets, handler, ticket)
+
+    def finish(self, name, handler):
+        """
+        Mark input `name` as ended, eg. at EOS, so primary items no longer wait for it, and handle the sets this
+        completes. Primary items still pending when the primary input ends are matched with what has been received.
+        """
+        with self._lock:
+            if name == self._primary_name():
+                sets = self._match(final=True)
+            else:
+                self._finished.add(name)
+                sets = self._match()
+            if not sets:
+                return 0
+            ticket = self._take_ticket()
+        return self._handle(sets, handler, ticket)
+
+    def clear(self):
+        """
+        Release every stored item and forget ended inputs, eg. when the pipeline is flushing or stopping.
+        """
+        with self._lock:
+            self._pending.clear()
+            self._finished.clear()
+            for slot in self._slots.values():
+                slot.clear()
+
+    def _take_ticket(self):
+        """
+        Called with `_lock` held, so tickets follow the order in which sets were completed.
+        """
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        return ticket
+
+    def _handle(self, sets, handler, ticket):
+        with self._turn:
+            self._turn.wait_for(lambda: self._serving == ticket)
+        try:
+            for items in sets:
+                handler(items)
+        finally:
+            with self._turn:
+                self._serving += 1
+                self._turn.notify_all()
+        return len(sets)
+
+    def _primary_name(self):
+        if self.primary in self._slots:
+            return self.primary
+        return next(iter(self._slots), None)
+
+    def _match(self, final=False):
+        primary = self._primary_name()
+        sets = list()
+        while self._pending:
+            timestamp, item = self._pending[0]
+            chosen = dict()
+            for name, slot in self._slots.items():
+                if name == primary:
+                    continue
+                match = self._find(slot, timestamp, final or name in self._finished)
+                if match is _WAIT:
+                    return sets
+                if match is _MISS:
+                    break
+                chosen[name] = match
+
+            self._pending.popleft()
+            if len(chosen) < len(self._slots) - 1:
+                self._stats.missed += 1
+                continue
+            self._stats.matched += 1
+            sets.append([item if name == primary else chosen[name] for name in self._slots])
+        return sets
+
+    def _find(self, slot, timestamp, final):
+        """
+        Get the item in `slot` matching `timestamp`, or `_WAIT` if one may still arrive, or `_MISS` if none will.
+        """
+        if not slot:
+            return _MISS if final else _WAIT
+        if timestamp is None or slot[-1][0] is None or self.tolerance is None and slot[-1][0] <= timestamp:
+            best = len(slot) - 1
+        else:
+            best = min(
+                (i for i, (t, _) in enumerate(slot) if t is not None), key=lambda i: abs(slot[i][0] - timestamp)
+            )
+
+        best_time = slot[best][0]
+        self._discard(slot, best)
+        if best_time is None or timestamp is None or self.tolerance is None:
+            return slot[0][1]
+        if abs(best_time - timestamp) <= self.tolerance:
+            return slot[0][1]
+        if best_time < timestamp:
+            # the input is behind: a closer item may still come unless it has ended
+            return _MISS if final else _WAIT
+        return _MISS
+
+    def _discard(self, slot, count):
+        for _ in range(count):
+            slot.popleft()
+        self._stats.discarded += count
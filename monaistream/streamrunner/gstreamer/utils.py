@@ -10,10 +10,12 @@
 # limitations under the License.
 
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+import time
 
 import gi
 gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
 from gi.repository import Gst, GLib, GObject
 
 
@@ -22,10 +24,26 @@ import numpy as np
 
 from gi.repository import Gst, GstVideo
 
-__all__ = ["BYTE_FORMATS", "get_dtype_from_bits", "map_buffer_to_numpy"]
+from monaistream.streamrunner.arrays import array_data_pointer, as_numpy
+from monaistream.streamrunner.gstreamer.yuv import YUV_TO_RGB_BT601, YUV_TO_RGB_BT601_FULL, yuv_to_rgb
 
+__all__ = [
+    "BYTE_FORMATS",
+    "VideoLayout",
+    "LayoutCache",
+    "get_dtype_from_bits",
+    "map_buffer_to_numpy",
+    "yuv_to_rgb",
+    "array_data_pointer",
+    "BufferTimestamps",
+    "copy_buffer_timestamps",
+    "array_to_buffer",
+    "check_buffer_qos",
+    "MetricsPoster",
+]
 
-BYTE_FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR,GRAY8,GRAY16_BE,GRAY16_LE}"
+
+BYTE_FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR,GRAY8,GRAY16_BE,GRAY16_LE,NV12,I420}"
 
 
 def parse_node_entry(entry):
@@ -42,6 +60,9 @@ def parse_node_entry(entry):
 
 def register(runner_type, runner_alias):
     RunnerType = GObject.type_register(runner_type)
+    factory = Gst.ElementFactory.find(runner_alias)
+    if factory is not None and factory.get_element_type() == RunnerType:
+        return
     if not Gst.Element.register(None, runner_alias, Gst.Rank.NONE, RunnerType):
         raise ValueError(f"Failed to register {runner_alias}; you may be missing gst-python plugins")
 
@@ -125,59 +146,292 @@ def get_dtype_from_bits(bits):
         raise ValueError(f"No obvious dtype for data items of size {bits}.")
 
 
-def get_components(cformat):
+@dataclass(frozen=True)
+class VideoLayout:
     """
-    Get the number of components for each pixel format, including padded components such as in RGBx.
+    Memory layout of a video frame for a set of negotiated caps, derived from `GstVideo.VideoInfo`. Plane offsets and
+    strides are the real ones (including row padding) rather than assuming tightly packed rows. Each plane is described
+    as a (height, width, channels) array, so packed formats have one plane and NV12/I420 have two/three with subsampled
+    chroma. The dtype carries the format's byte order, eg. big-endian for GRAY16_BE.
     """
-    if cformat in ("RGB","BGR"):
-        return 3
-    if cformat in ("RGBx","BGRx","xRGB","xBGR","RGBA","BGRA","ARGB","ABGR"):
-        return 4
-    if cformat in ("GRAY8","GRAY16_BE","GRAY16_LE"):
-        return 1
 
-    raise ValueError(f"Format `{cformat}` does not have a known number of components.") 
-    
+    format: str
+    width: int
+    height: int
+    dtype: np.dtype
+    offsets: tuple
+    strides: tuple
+    pixel_strides: tuple
+    plane_shapes: tuple
+    size: int
+    is_yuv: bool = False
+
+    @classmethod
+    def from_caps(cls, caps):
+        info = GstVideo.VideoInfo.new_from_caps(caps)
+        if info is None:
+            raise ValueError(f"Caps `{caps.to_string()}` do not describe a raw video format.")
+        finfo = info.finfo
+        n_planes = finfo.n_planes
+
+        dtype = np.dtype(get_dtype_from_bits(finfo.bits))
+        if dtype.itemsize > 1:
+            dtype = dtype.newbyteorder("<" if finfo.flags & GstVideo.VideoFormatFlags.LE else ">")
+
+        pixel_strides, plane_shapes = list(), list()
+        for p in range(n_planes):
+            c = [c for c in range(finfo.n_components) if finfo.plane[c] == p][0]
+            pixel_stride = finfo.pixel_stride[c]
+            # subsampled sizes round up, as GST_VIDEO_SUB_SCALE does
+            height = -((-info.height) >> finfo.h_sub[c])
+            width = -((-info.width) >> finfo.w_sub[c])
+            pixel_strides.append(pixel_stride)
+            plane_shapes.append((height, width, max(pixel_stride // dtype.itemsize, 1)))
+
+        return cls(
+            format=finfo.name,
+            width=info.width,
+            height=info.height,
+            dtype=dtype,
+            offsets=tuple(info.offset[:n_planes]),
+            strides=tuple(info.stride[:n_planes]),
+            pixel_strides=tuple(pixel_strides),
+            plane_shapes=tuple(plane_shapes),
+            size=info.size,
+            is_yuv=bool(finfo.flags & GstVideo.VideoFormatFlags.YUV),
+        )
 
-@contextmanager
-def map_buffer_to_numpy(buffer, flags, caps, dtype=None):
+    @property
+    def n_planes(self):
+        return len(self.plane_shapes)
+
+    @property
+    def shape(self):
+        return self.plane_shapes[0]
+
+    @property
+    def channels(self):
+        return self.plane_shapes[0][2]
+
+    def for_buffer(self, buffer):
+        """
+        Get the layout for a specific buffer, which differs from the negotiated one if upstream attached a
+        `GstVideo.VideoMeta` with its own plane offsets and strides (eg. decoders with padded allocations).
+        """
+        meta = GstVideo.buffer_get_video_meta(buffer)
+        if meta is None:
+            return self
+        offsets, strides = tuple(meta.offset[:self.n_planes]), tuple(meta.stride[:self.n_planes])
+        if offsets == self.offsets and strides == self.strides:
+            return self
+        return replace(self, offsets=offsets, strides=strides)
+
+    def view(self, data, dtype=None):
+        """
+        Get strided Numpy views of the frame held in `data`, a mapped buffer's memory, without copying. Single plane
+        formats give one (height, width, channels) array, planar formats give a tuple with one array per plane.
+        """
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        planes = tuple(
+            np.ndarray(shape, dtype=dtype, buffer=data, offset=offset, strides=(stride, pixel_stride, dtype.itemsize))
+            for shape, offset, stride, pixel_stride in zip(
+                self.plane_shapes, self.offsets, self.strides, self.pixel_strides
+            )
+        )
+        return planes[0] if len(planes) == 1 else planes
+
+
+class LayoutCache:
     """
-    Map the given buffer with the given flags and the capabilities from its associated pad. The dtype is inferred if not
-    given which may be inaccurate for certain formats. The context object is a Numpy array for the buffer which is
-    unmapped when the context exits. 
+    Per-pad cache of `VideoLayout` objects. Elements call `update` when a pad receives a CAPS event so that per-buffer
+    code never has to re-read and parse the current caps.
     """
-    cstruct = caps.get_structure(0)
-    height = cstruct.get_value("height")
-    width = cstruct.get_value("width")
-    cformat = cstruct.get_value("format")
 
-    fstruct = GstVideo.video_format_from_string(cformat)
-    ifstruct = GstVideo.video_format_get_info(fstruct)
+    def __init__(self):
+        self._layouts = dict()
 
-    if dtype is None:
-        dtype = get_dtype_from_bits(ifstruct.bits)
+    def update(self, pad, caps):
+        layout = VideoLayout.from_caps(caps)
+        self._layouts[pad.get_name()] = layout
+        return layout
 
-    dtype=np.dtype(dtype)
-    is_mapped, map_info = buffer.map(flags)
-    if not is_mapped:
-        raise ValueError(f"Buffer {buffer} failed to map with flags `{flags}`.")
+    def get(self, pad):
+        layout = self._layouts.get(pad.get_name())
+        if layout is None:
+            caps = pad.get_current_caps()
+            if caps is None:
+                raise ValueError(f"Pad {pad.get_name()} has no negotiated caps.")
+            layout = self.update(pad, caps)
+        return layout
 
-    shape = (height, width, get_components(cformat))
+    def remove(self, pad):
+        self._layouts.pop(pad.get_name(), None)
 
-    expected_size = np.product(shape) * dtype.itemsize
-    if expected_size != buffer.get_size():
-        raise ValueError(
-            f"Buffer size {buffer.get_size()} does not match expected size "
-            "{expected_size} for shape {shape} and format {cformat}."
-        )
+    def clear(self):
+        self._layouts.clear()
 
-    # TODO: byte order for gray formats
 
-    bufarray = np.ndarray(shape, dtype=dtype, buffer=map_info.data)
-    
+@contextmanager
+def map_buffer_to_numpy(buffer, flags, caps, dtype=None):
+    """
+    Map the given buffer with the given flags and the capabilities from its associated pad. `caps` may be a Gst.Caps
+    object or, preferably, a `VideoLayout` cached when the caps were negotiated. The dtype is inferred if not given
+    which may be inaccurate for certain formats. The context object is a strided Numpy array for the buffer which is
+    unmapped when the context exits, or a tuple of arrays (one per plane) for planar formats such as NV12 and I420.
+    """
+    layout = caps if isinstance(caps, VideoLayout) else VideoLayout.from_caps(caps)
+    layout = layout.for_buffer(buffer)
+
+    is_mapped, map_info = buffer.map(flags)
+    if not is_mapped:
+        raise ValueError(f"Buffer {buffer} failed to map with flags `{flags}`.")
+
     try:
-        yield bufarray
+        if map_info.size < layout.size:
+            raise ValueError(
+                f"Buffer size {map_info.size} is smaller than expected size "
+                f"{layout.size} for planes {layout.plane_shapes} and format {layout.format}."
+            )
+
+        yield layout.view(map_info.data, dtype)
     finally:
         buffer.unmap(map_info)
 
 
+@dataclass(frozen=True)
+class BufferTimestamps:
+    """
+    The timing fields of a Gst.Buffer, kept so results can be stamped after the input buffer itself has been released.
+    """
+
+    pts: int
+    dts: int
+    duration: int
+    offset: int
+    offset_end: int
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        return cls(buffer.pts, buffer.dts, buffer.duration, buffer.offset, buffer.offset_end)
+
+
+def copy_buffer_timestamps(src, dst):
+    """
+    Copy the PTS, DTS, duration and offsets of `src`, a buffer or `BufferTimestamps`, to buffer `dst`, which must be
+    writable.
+    """
+    dst.pts = src.pts
+    dst.dts = src.dts
+    dst.duration = src.duration
+    dst.offset = src.offset
+    dst.offset_end = src.offset_end
+    return dst
+
+
+def array_to_buffer(array, owners=None, timestamp_source=None):
+    """
+    Get a Gst.Buffer holding the contents of `array`, which is a Numpy array or any array `as_numpy` can view, such as
+    a Torch tensor; device arrays are copied to the host first.
+
+    `owners` is an optional mapping from data pointers to the Gst.Buffer whose mapped memory starts at that address.
+    If `array` is a contiguous view covering the whole of one of these buffers, that buffer is returned without copying
+    and it keeps its memory alive until downstream releases it. Otherwise a buffer is allocated and the array is copied
+    straight into its mapped memory with a single strided copy, avoiding the intermediate `bytes` object of
+    `Gst.Buffer.new_wrapped`, so eg. a (height, width, channels) permuted view of a channels-last tensor is written
+    directly without first being made contiguous.
+
+    If `timestamp_source` (a buffer or `BufferTimestamps`) is given, its timing fields are copied onto the returned
+    buffer.
+    """
+    array = as_numpy(array)
+
+    buffer = None
+    if owners:
+        owner = owners.get(array_data_pointer(array))
+        if owner is not None and array.flags.c_contiguous and array.nbytes == owner.get_size():
+            buffer = owner
+            if timestamp_source is not None and not buffer.is_writable():
+                buffer = buffer.copy()  # shallow: shares the underlying memory, only the metadata is new
+
+    if buffer is None:
+        buffer = Gst.Buffer.new_allocate(None, array.nbytes, None)
+        is_mapped, map_info = buffer.map(Gst.MapFlags.WRITE)
+        if not is_mapped:
+            raise ValueError(f"Buffer {buffer} failed to map for writing.")
+        try:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=map_info.data)[...] = array
+        finally:
+            buffer.unmap(map_info)
+
+    if timestamp_source is not None:
+        copy_buffer_timestamps(timestamp_source, buffer)
+
+    return buffer
+
+
+def _clock_time_or_none(t):
+    return None if t == Gst.CLOCK_TIME_NONE else t
+
+
+def check_buffer_qos(element, qos, sinkpad, segment, buffer):
+    """
+    Ask `qos`, a `QosController`, whether `buffer` arriving on `sinkpad` with `segment` is too late to process, and
+    return its `QosDecision`. A late frame is reported with a QoS message on the bus, as GStreamer's own elements do,
+    and if the lateness was only found against the clock a QoS event is also sent upstream, so that the source or
+    decoder can skip work on the next frames too.
+    """
+    running_time = None
+    if qos.mode != "off" and segment is not None and buffer.pts != Gst.CLOCK_TIME_NONE:
+        running_time = _clock_time_or_none(segment.to_running_time(Gst.Format.TIME, buffer.pts))
+    clock = element.get_clock()
+    now = clock.get_time() - element.get_base_time() if clock is not None and running_time is not None else None
+
+    decision = qos.decide(running_time, _clock_time_or_none(buffer.duration), now)
+    if decision.action == "process":
+        return decision
+
+    stats = qos.stats
+    message = Gst.Message.new_qos(
+        element, False, running_time, segment.to_stream_time(Gst.Format.TIME, buffer.pts), buffer.pts, buffer.duration
+    )
+    message.set_qos_values(decision.jitter, qos.proportion, 1000000)
+    message.set_qos_stats(Gst.Format.BUFFERS, stats.processed, stats.dropped + stats.skipped)
+    element.post_message(message)
+    if decision.from_clock:
+        sinkpad.push_event(Gst.Event.new_qos(Gst.QOSType.UNDERFLOW, qos.proportion, decision.jitter, running_time))
+    return decision
+
+
+class MetricsPoster:
+    """
+    Posts an element's metrics on the bus as a "monaistream-metrics" element message at most every `interval_ms`
+    (never if 0). The structure holds the element name, the Prometheus text of its series in "text", and one double
+    field per series named after the metric and its other label values, eg. "frames_total.sink_0"; histograms give
+    "<name>.count", "<name>.sum" and "<name>.p99" fields.
+    """
+
+    def __init__(self, registry, interval_ms=0.0):
+        self.registry = registry
+        self.interval_ms = interval_ms
+        self._last = None
+
+    def maybe_post(self, element, force=False):
+        now = time.monotonic()
+        if not force:
+            if self.interval_ms <= 0 or self._last is not None and now - self._last < self.interval_ms / 1e3:
+                return False
+        self._last = now
+
+        name = element.get_name()
+        structure = Gst.Structure.new_empty("monaistream-metrics")
+        structure.set_value("element", name)
+        structure.set_value("text", self.registry.to_prometheus(element=name))
+        for metric, _, labels, value in self.registry.samples(element=name):
+            field = ".".join([metric] + [str(v) for k, v in sorted(labels.items()) if k != "element"])
+            if hasattr(value, "buckets"):
+                structure.set_value(f"{field}.count", float(value.count))
+                structure.set_value(f"{field}.sum", float(value.sum))
+                structure.set_value(f"{field}.p99", float(value.quantile(0.99)))
+            else:
+                structure.set_value(field, float(value))
+        return element.post_message(Gst.Message.new_element(element, structure))
@@ -0,0 +1,134 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import deque
+
+__all__ = ["OrderedWorkerPool"]
+
+
+class OrderedWorkerPool:
+    """
+    Runs submitted work functions on `n_workers` threads and passes their results to `emit_fn` in submission order,
+    whatever order they complete in. At most `max_in_flight` items may be queued, running or waiting to be emitted;
+    `submit` blocks beyond that, which applies backpressure to the submitting (streaming) thread.
+
+    Torch and Numpy release the GIL for most of their work, so several workers overlap inference on consecutive frames.
+    The first exception raised by a work function is kept in `error` and that item is not emitted.
+    """
+
+    def __init__(self, emit_fn, n_workers=1, max_in_flight=2, name="OrderedWorkerPool"):
+        if n_workers < 1:
+            raise ValueError(f"n_workers must be at least 1, got {n_workers}")
+        self.emit_fn = emit_fn
+        self.n_workers = n_workers
+        self.max_in_flight = max(max_in_flight, 1)
+        self.name = name
+        self.error = None
+
+        self._cond = threading.Condition()
+        # taken before releasing `_cond` so that results are emitted in sequence order
+        self._emit_lock = threading.Lock()
+        self._queue = deque()
+        self._done = dict()
+        self._next_submit = 0
+        self._next_emit = 0
+        self._emitted = 0
+        self._threads = list()
+        self._running = False
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return self._next_submit - self._emitted
+
+    def submit(self, work):
+        """
+        Queue `work`, a function of no arguments, and return its sequence number.
+        """
+        with self._cond:
+            self._ensure_threads()
+            while self._next_submit - self._emitted >= self.max_in_flight:
+                self._cond.wait()
+            seq = self._next_submit
+            self._next_submit += 1
+            self._queue.append((seq, work))
+            self._cond.notify_all()
+        return seq
+
+    def drain(self, timeout=None):
+        """
+        Wait until everything submitted so far has been run and emitted. Returns False if `timeout` expired first.
+        """
+        with self._cond:
+            target = self._next_submit
+            return self._cond.wait_for(lambda: self._emitted >= target, timeout)
+
+    def close(self):
+        """
+        Drain outstanding work and stop the worker threads; the pool restarts them if more work is submitted.
+        """
+        self.drain()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            threads, self._threads = self._threads, list()
+        for t in threads:
+            if t is not threading.current_thread():
+                t.join()
+
+    def _ensure_threads(self):
+        if not self._running:
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True) for i in range(self.n_workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                seq, work = self._queue.popleft()
+
+            try:
+                result, error = work(), None
+            except Exception as e:
+                result, error = None, e
+
+            with self._cond:
+                self._done[seq] = (result, error)
+                ready = list()
+                while self._next_emit in self._done:
+                    ready.append(self._done.pop(self._next_emit))
+                    self._next_emit += 1
+                if not ready:
+                    continue
+                self._emit_lock.acquire()
+
+            try:
+                for result, error in ready:
+                    if error is None:
+                        try:
+                            self.emit_fn(result)
+                        except Exception as e:
+                            error = e
+                    if error is not None and self.error is None:
+                        self.error = error
+            finally:
+                self._emit_lock.release()
+                with self._cond:
+                    self._emitted += len(ready)
+                    self._cond.notify_all()
@@ -0,0 +1,65 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from monaistream.streamrunner.arrays import as_numpy
+
+__all__ = ["YUV_TO_RGB_BT601", "YUV_TO_RGB_BT601_FULL", "yuv_to_rgb"]
+
+
+# (Y, U, V) coefficients for the (R, G, B) channels, for limited ("studio swing") and full range ITU-R BT.601 YUV
+YUV_TO_RGB_BT601 = ((1.164, 0.0, 1.596), (1.164, -0.392, -0.813), (1.164, 2.017, 0.0))
+YUV_TO_RGB_BT601_FULL = ((1.0, 0.0, 1.402), (1.0, -0.344, -0.714), (1.0, 1.772, 0.0))
+
+
+def yuv_to_rgb(planes, format, out=None, channels_first=False, scale=1.0 / 255.0, full_range=False):
+    """
+    Convert the planes of an NV12 or I420 frame, as given by `VideoLayout.view`, to RGB floats multiplied by `scale`.
+    The result is written into `out` if given, which may be a float Numpy array or a CPU array of any registered array
+    type such as a Torch tensor, of shape (height, width, 3), or (3, height, width) if `channels_first`, such as a
+    model's preallocated input tensor, so no intermediate RGB frame is produced. Chroma is upsampled by pixel
+    replication, adding each chroma sample straight into the strided views of `out` for the four pixels it covers, so
+    the only temporary is one chroma-sized plane.
+    """
+    y = planes[0][..., 0]
+    if format == "NV12":
+        u, v = planes[1][..., 0], planes[1][..., 1]
+    elif format == "I420":
+        u, v = planes[1][..., 0], planes[2][..., 0]
+    else:
+        raise ValueError(f"Format `{format}` is not a supported YUV format; must be one of ('NV12', 'I420').")
+
+    height, width = y.shape
+    if out is None:
+        out = np.empty((3, height, width) if channels_first else (height, width, 3), dtype=np.float32)
+    out_array = as_numpy(out)
+    channels = [out_array[c] if channels_first else out_array[..., c] for c in range(3)]
+    dtype = out_array.dtype
+    chroma = np.empty(u.shape, dtype)
+
+    coefficients = YUV_TO_RGB_BT601_FULL if full_range else YUV_TO_RGB_BT601
+    for channel, (ky, ku, kv) in zip(channels, coefficients):
+        # scaling the coefficients instead of the result saves a pass, and the offsets are folded into one bias
+        np.multiply(y, dtype.type(ky * scale), out=channel, dtype=dtype)
+        bias = -128.0 * (ku + kv) - (0.0 if full_range else 16.0 * ky)
+        channel += dtype.type(bias * scale)
+        for c, k in ((u, ku), (v, kv)):
+            if k == 0.0:
+                continue
+            np.multiply(c, dtype.type(k * scale), out=chroma, dtype=dtype)
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    pixels = channel[dy::2, dx::2]
+                    pixels += chroma[: pixels.shape[0], : pixels.shape[1]]
+        np.clip(channel, 0.0, 255.0 * scale, out=channel)
+
+    return out
@@ -2,6 +2,8 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
 
+from monaistream.streamrunner.gstreamer.appbridge import AppBridgeBin
+
 
 def create_dynamic_pipeline_class2(pipeline_desc, on_new_sample_callback=None, on_data_callback=None):
     """
@@ -50,54 +52,55 @@ def create_dynamic_pipeline_class2(pipeline_desc, on_new_sample_callback=None, o
     return DynamicBin
 
 
-def create_dynamic_pipeline_class(pipeline_desc, on_new_sample_callback=None, on_data_callback=None):
-    """
-    Dynamically creates a Gst.Bin subclass that wraps a given pipeline descriptor.
+def create_dynamic_pipeline_class(
+    pipeline_desc,
+    on_new_sample_callback=None,
+    on_data_callback=None,
+    caps=None,
+    max_buffers=2,
+    drop=True,
+    on_samples_callback=None,
+):
     """
+    Dynamically creates an `AppBridgeBin` subclass that wraps a given pipeline descriptor, whose appsrc and appsink
+    are named "myappsrc" and "myappsink".
 
-    class_name = "DynamicPipelineBin"
+    `on_new_sample_callback`, if given, is connected to the appsink's `new-sample` signal and called with the appsink
+    once per sample, as before. Alternatively `on_samples_callback` reads in pull mode: it is called from the bin's
+    reader thread with each list of samples drained from the appsink. Only one of the two may be given.
 
-    def __init__(self):
-        super(self.__class__, self).__init__()
+    `push_data` pushes a list of frames to the appsrc through its `AppSrcFeeder`, which is created on the first call so
+    the appsrc's caps may be set any time before then, unless `on_data_callback` replaces it.
+    """
 
-        # Create an internal pipeline using Gst.parse_launch
-        pipeline = Gst.parse_launch(pipeline_desc)
+    if on_new_sample_callback is not None and on_samples_callback is not None:
+        raise ValueError("Only one of `on_new_sample_callback` and `on_samples_callback` may be given.")
 
-        # Extract appsrc and appsink
-        self.appsrc = pipeline.get_by_name("myappsrc")
-        self.appsink = pipeline.get_by_name("myappsink")
+    class_name = "DynamicPipelineBin"
 
-        if self.appsink:
+    def __init__(self):
+        AppBridgeBin.__init__(
+            self, pipeline_desc, caps=caps, max_buffers=max_buffers, drop=drop, on_samples=on_samples_callback
+        )
+        self.appsrc = self.get_by_name("myappsrc")
+        self.appsink = self.get_by_name("myappsink")
+        if self.appsink is not None and on_new_sample_callback is not None:
             self.appsink.set_property("emit-signals", True)
-            self.appsink.set_property("sync", False)
-
-            if on_new_sample_callback:
-                self.appsink.connect("new-sample", on_new_sample_callback)
-
-        if self.appsrc and on_data_callback:
+            self.appsink.connect("new-sample", on_new_sample_callback)
+        if on_data_callback is not None:
             self.push_data = on_data_callback
 
-        # Add all pipeline elements to the bin
-        for element in pipeline.children:
-            pipeline.remove(element)  # Remove from original pipeline before adding to bin
-            self.add(element)
-
-        # Ensure ghost pads match the bin's expected external connections
-        if self.appsrc:
-            src_pad = self.appsrc.get_static_pad("src")
-            if src_pad and not self.get_static_pad("sink"):
-                self.add_pad(Gst.GhostPad.new("sink", src_pad))
-
-        if self.appsink:
-            sink_pad = self.appsink.get_static_pad("sink")
-            if sink_pad and not self.get_static_pad("src"):
-                self.add_pad(Gst.GhostPad.new("src", sink_pad))
+    def push_data(self, frames, timestamps=None):
+        if self.feeder is None:
+            raise ValueError(f"Pipeline `{pipeline_desc}` has no appsrc named myappsrc to push data to.")
+        return self.feeder.push(frames, timestamps)
 
     DynamicBin = type(
         class_name,
-        (Gst.Bin,),
+        (AppBridgeBin,),
         {
             "__init__": __init__,
+            "push_data": push_data,
             "GST_PLUGIN_NAME": class_name.lower(),
         }
     )
@@ -1,17 +1,177 @@
 import inspect
 import threading
+import time
 
 import gi
 
 gi.require_version("Gst", "1.0")
 gi.require_version("GstBase", "1.0")
-from gi.repository import Gst, GstBase
+from gi.repository import Gst, GLib, GstBase
 
 import numpy as np
 
+from contextlib import ExitStack, contextmanager
+
+from monaistream.streamrunner.arrays import as_numpy
+from monaistream.streamrunner.gstreamer.bufferpool import OutputPools
+from monaistream.streamrunner.gstreamer.properties import BUNDLE_PROPERTIES, FORMATS, RUNNER_PROPERTIES
+from monaistream.streamrunner.gstreamer.qos import QosController
+from monaistream.streamrunner.gstreamer.utils import (
+    LayoutCache,
+    MetricsPoster,
+    VideoLayout,
+    array_to_buffer,
+    check_buffer_qos,
+    map_buffer_to_numpy,
+)
+from monaistream.streamrunner.metrics import (
+    DROPPED_FRAMES,
+    FRAMES,
+    MAP_SECONDS,
+    OP_SECONDS,
+    OUTPUT_FRAMES,
+    default_registry,
+)
+from monaistream.streamrunner.swap import SwappableOp
+
+
+
+# GST_BASE_TRANSFORM_FLOW_DROPPED, which is a macro and not available through introspection
+TRANSFORM_FLOW_DROPPED = Gst.FlowReturn.CUSTOM_SUCCESS
+
+
+def get_runner_property(runner, prop):
+    if prop.name == "qos-mode":
+        return runner._qos.mode
+    elif prop.name == "max-lateness-ms":
+        return runner._qos.max_lateness / Gst.MSECOND
+    elif prop.name == "metrics-interval-ms":
+        return runner._metrics_poster.interval_ms
+    raise AttributeError(f"No such property {prop.name}")
+
+
+def set_runner_property(runner, prop, value):
+    if prop.name == "qos-mode":
+        runner._qos.mode = value
+    elif prop.name == "max-lateness-ms":
+        runner._qos.max_lateness = int(value * Gst.MSECOND)
+    elif prop.name == "metrics-interval-ms":
+        runner._metrics_poster.interval_ms = value
+    else:
+        raise AttributeError(f"No such property {prop.name}")
+
+
+def transform_src_event(runner, event):
+    """
+    Record QoS and latency events for the runner's QoS checks before the default handling forwards them upstream.
+    """
+    if event.type == Gst.EventType.QOS:
+        _, proportion, diff, timestamp = event.parse_qos()
+        runner._qos.update(proportion, diff, timestamp)
+    elif event.type == Gst.EventType.LATENCY:
+        runner._qos.set_latency(event.parse_latency())
+    return GstBase.BaseTransform.do_src_event(runner, event)
+
+
+def transform_sink_event(runner, event):
+    if event.type == Gst.EventType.FLUSH_STOP:
+        runner._qos.reset()
+    elif event.type == Gst.EventType.EOS:
+        runner._metrics_poster.maybe_post(runner, force=True)
+    return GstBase.BaseTransform.do_sink_event(runner, event)
+
+
+def collect_qos_metrics(runner):
+    qos = runner._qos.stats
+    yield DROPPED_FRAMES, dict(element=runner.get_name(), reason="qos-drop"), qos.dropped
+    yield DROPPED_FRAMES, dict(element=runner.get_name(), reason="qos-skip"), qos.skipped
+
+
+@contextmanager
+def timed_map(runner, buffer, flags, layout):
+    """
+    `map_buffer_to_numpy`, observing the time taken to map and unmap `buffer` in the metrics.
+    """
+    name = runner.get_name()
+    start = time.perf_counter()
+    with map_buffer_to_numpy(buffer, flags, layout) as data:
+        default_registry.observe(MAP_SECONDS, time.perf_counter() - start, element=name, op="map")
+        try:
+            yield data
+        finally:
+            start = time.perf_counter()
+    default_registry.observe(MAP_SECONDS, time.perf_counter() - start, element=name, op="unmap")
 
 
-FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR}"
+def map_input(runner, pad, buffer):
+    """
+    Map `buffer`, which arrived on the aggregator's sink `pad`, for reading, counting it as a frame of that pad and
+    observing the time taken in the metrics. Returns the result of `buffer.map`.
+    """
+    name = runner.get_name()
+    default_registry.inc(FRAMES, element=name, pad=pad.get_name())
+    start = time.perf_counter()
+    result = buffer.map(Gst.MapFlags.READ)
+    default_registry.observe(MAP_SECONDS, time.perf_counter() - start, element=name, op="map")
+    return result
+
+
+def unmap_inputs(runner, mapped):
+    """
+    Unmap the (buffer, map_info) pairs of `mapped`, observing the time taken in the metrics.
+    """
+    start = time.perf_counter()
+    for buffer, map_info in mapped:
+        buffer.unmap(map_info)
+    default_registry.observe(MAP_SECONDS, time.perf_counter() - start, element=runner.get_name(), op="unmap")
+
+
+def count_output(runner, ret):
+    """
+    Count an output frame of the aggregator if pushing it returned `ret` OK, and return `ret`.
+    """
+    if ret == Gst.FlowReturn.OK:
+        default_registry.inc(OUTPUT_FRAMES, element=runner.get_name(), pad=runner.srcpad.get_name())
+    return ret
+
+
+def change_runner_state(runner, base, transition):
+    """
+    Chain up to `base.do_change_state`, then forget the runner's metric series once it has gone to NULL, which is
+    where elements are shut down before being disposed, so the default registry does not keep series of dead elements.
+    """
+    ret = base.do_change_state(runner, transition)
+    if transition == Gst.StateChange.READY_TO_NULL:
+        default_registry.remove(element=runner.get_name())
+    return ret
+
+
+def copy_frame(src, dst):
+    if isinstance(src, tuple):
+        for s, d in zip(src, dst):
+            np.copyto(d, s)
+    else:
+        np.copyto(dst, src)
+
+
+
+def aggregate_output(runner, images):
+    """
+    Run `runner.do_op` on the collected input images and return the output buffer to push. If the runner sets
+    `preallocate_outputs`, the output buffer comes from the src pad's pool and is passed to `do_op` as a writable mapped
+    array, otherwise the array returned by `do_op` is copied once into a new buffer.
+    """
+    name = runner.get_name()
+    if runner.preallocate_outputs:
+        with ExitStack() as stack:
+            (output_buffer,), (output,) = runner._output_pools.map_outputs((runner.srcpad,), stack)
+            with default_registry.time(OP_SECONDS, element=name):
+                runner.do_op(images, output)
+        return output_buffer
+
+    with default_registry.time(OP_SECONDS, element=name):
+        result = runner.do_op(images)
+    return array_to_buffer(result)
 
 
 
@@ -85,27 +245,62 @@ class GstInPlaceStreamRunner(GstBase.BaseTransform):
         ),
     )
 
-    __gstproperties__ = {}
+    __gproperties__ = dict(RUNNER_PROPERTIES)
+
+    def __init__(self):
+        super().__init__()
+        self._layout = None
+        # with qos-mode "skip" late buffers pass through unmodified
+        self._qos = QosController()
+        self._metrics_poster = MetricsPoster(default_registry)
+        default_registry.add_collector(self._collect_metrics, labels=self._metrics_labels)
+
+    def do_get_property(self, prop):
+        return get_runner_property(self, prop)
+
+    def do_set_property(self, prop, value):
+        set_runner_property(self, prop, value)
+
+    def do_src_event(self, event):
+        return transform_src_event(self, event)
+
+    def do_sink_event(self, event):
+        return transform_sink_event(self, event)
+
+    @property
+    def qos_stats(self):
+        return self._qos.stats
+
+    def _collect_metrics(self):
+        return collect_qos_metrics(self)
+
+    def _metrics_labels(self):
+        return dict(element=self.get_name())
 
     def do_op(self, data):
         raise NotImplementedError()
 
-    def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
-        print("do_transform_ip")
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        self._layout = VideoLayout.from_caps(outcaps)
+        return True
 
-        cstruct = self.srcpad.get_current_caps().get_structure(0)
-        height = cstruct.get_value("height")
-        width = cstruct.get_value("width")
-        format = cstruct.get_value("format")
+    def do_change_state(self, transition):
+        return change_runner_state(self, GstBase.BaseTransform, transition)
 
-        is_mapped, map_info = buffer.map(Gst.MapFlags.WRITE)
+    def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
+        default_registry.inc(FRAMES, element=self.get_name(), pad="sink")
+        self._metrics_poster.maybe_post(self)
 
-        if is_mapped:
-            data = np.ndarray((height, width, len(format)), dtype=np.uint8, buffer=map_info.data)
-            data = self.do_op(data)
-            buffer.unmap(map_info)
-        else:
-            raise RuntimeError("Mapping failed")
+        decision = check_buffer_qos(self, self._qos, self.sinkpad, self.segment, buffer)
+        if decision.action == "drop":
+            return TRANSFORM_FLOW_DROPPED
+        if decision.action == "skip":
+            return Gst.FlowReturn.OK
+
+        with timed_map(self, buffer, Gst.MapFlags.WRITE, self._layout) as data:
+            with default_registry.time(OP_SECONDS, element=self.get_name()):
+                self.do_op(data)
+        default_registry.inc(OUTPUT_FRAMES, element=self.get_name(), pad="src")
 
         return Gst.FlowReturn.OK
 
@@ -182,10 +377,18 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
     )
 
 
+    __gproperties__ = dict(RUNNER_PROPERTIES)
+
     def __init__(self, width=None, height=None):
         super().__init__()
         self.width = width
         self.height = height
+        self._in_layout = None
+        self._out_layout = None
+        # with qos-mode "skip" late buffers are copied to the output unmodified if the caps allow, else dropped
+        self._qos = QosController()
+        self._metrics_poster = MetricsPoster(default_registry)
+        default_registry.add_collector(self._collect_metrics, labels=self._metrics_labels)
 
 
     def do_op(self, data):
@@ -198,7 +401,7 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
         elif prop.name == "height":
             return self.height
         else:
-            raise AttributeError(f"No such property {prop.name}")
+            return get_runner_property(self, prop)
 
 
     def do_set_property(self, prop, value):
@@ -207,41 +410,151 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
         elif prop.name == "height":
             self.height = value
         else:
-            raise AttributeError(f"No such property {prop.name}")
+            set_runner_property(self, prop, value)
+
+
+    def do_src_event(self, event):
+        return transform_src_event(self, event)
+
+
+    def do_sink_event(self, event):
+        return transform_sink_event(self, event)
+
+
+    @property
+    def qos_stats(self):
+        return self._qos.stats
+
+
+    def _collect_metrics(self):
+        return collect_qos_metrics(self)
+
+
+    def _metrics_labels(self):
+        return dict(element=self.get_name())
+
+
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        self._in_layout = VideoLayout.from_caps(incaps)
+        self._out_layout = VideoLayout.from_caps(outcaps)
+        Gst.debug(f"{self.get_name()}: from {self._in_layout.shape} {self._in_layout.format} "
+                  f"to {self._out_layout.shape} {self._out_layout.format}")
+        return True
+
+
+    def do_change_state(self, transition):
+        return change_runner_state(self, GstBase.BaseTransform, transition)
 
 
     def do_transform(self, in_buffer: Gst.Buffer, out_buffer: Gst.Buffer) -> Gst.FlowReturn:
+        default_registry.inc(FRAMES, element=self.get_name(), pad="sink")
+        self._metrics_poster.maybe_post(self)
+
+        decision = check_buffer_qos(self, self._qos, self.sinkpad, self.segment, in_buffer)
+        if decision.action == "drop" or (decision.action == "skip" and self._in_layout != self._out_layout):
+            return TRANSFORM_FLOW_DROPPED
+
+        with timed_map(self, in_buffer, Gst.MapFlags.READ, self._in_layout) as in_data:
+            with timed_map(self, out_buffer, Gst.MapFlags.WRITE, self._out_layout) as out_data:
+                if decision.action == "skip":
+                    copy_frame(in_data, out_data)
+                else:
+                    with default_registry.time(OP_SECONDS, element=self.get_name()):
+                        self.do_op(in_data, out_data)
+        default_registry.inc(OUTPUT_FRAMES, element=self.get_name(), pad="src")
 
-        in_cstruct = self.sinkpad.get_current_caps().get_structure(0)
-        in_height = in_cstruct.get_value("height")
-        in_width = in_cstruct.get_value("width")
-        in_format = in_cstruct.get_value("format")
+        return Gst.FlowReturn.OK
 
-        out_cstruct = self.srcpad.get_current_caps().get_structure(0)
-        out_height = out_cstruct.get_value("height")
-        out_width = out_cstruct.get_value("width")
-        out_format = out_cstruct.get_value("format")
 
-        print(f"from ({in_height, in_width, in_format}) to ({out_height, out_width, out_format})")
 
-        snk_is_mapped, snk_map_info = in_buffer.map(Gst.MapFlags.READ)
-        src_is_mapped, src_map_info = out_buffer.map(Gst.MapFlags.WRITE)
+class GstBundleStreamRunner(GstAdaptorStreamRunner):
+    """
+    Runs a MONAI bundle on each frame, eg.
+
+        gst-launch-1.0 videotestsrc ! video/x-raw,format=RGB \\
+            ! gstbundlestreamrunner bundle-path=tests/test_bundles/blur ! videoconvert ! autovideosink
+
+    with the plugin files on GST_PLUGIN_PATH (see `registry`). The bundle is loaded by `BundleRunner` when the element
+    starts, which reuses the components already loaded in this process, so restarting the pipeline does not rebuild
+    the network. The bundle's result must have the shape and dtype of the output caps' frames.
+
+    Setting `bundle-path` or `config-file` while the element is running loads the new bundle in the background, warms
+    it up on the next frame and switches to it between frames (see `SwappableOp`), without stopping the pipeline.
+    """
 
-        if snk_is_mapped and src_is_mapped:
-            in_data = np.ndarray((in_height, in_width, len(in_format)), dtype=np.uint8, buffer=snk_map_info.data)
-            out_data = np.ndarray((out_height, out_width, len(out_format)), dtype=np.uint8, buffer=src_map_info.data)
-            self.do_op(in_data, out_data)
-            in_buffer.unmap(snk_map_info)
-            out_buffer.unmap(src_map_info)
+    GST_PLUGIN_NAME = "gstbundlestreamrunner"
+
+    __gstmetadata__ = ("Bundle Stream Runner", "Transform", "Runs a MONAI bundle on each frame", "MONAI Consortium")
+
+    __gproperties__ = dict(BUNDLE_PROPERTIES)
+
+    def __init__(self):
+        super().__init__()
+        self.bundle_path = None
+        self.config_file = None
+        self._bundle = SwappableOp()
+
+
+    def do_get_property(self, prop):
+        if prop.name == "bundle-path":
+            return self.bundle_path
+        elif prop.name == "config-file":
+            return self.config_file
+        return super().do_get_property(prop)
+
+
+    def do_set_property(self, prop, value):
+        if prop.name == "bundle-path":
+            self.bundle_path = value
+        elif prop.name == "config-file":
+            self.config_file = value
         else:
-            raise RuntimeError("Mapping failed: source mapping status={src_is_mapped}; sink mapping status={sink_is_mapped}")
+            super().do_set_property(prop, value)
+            return
+        if self._bundle.op is not None and self.bundle_path is not None:
+            # a load started by an earlier property is cancelled by this one, so only the latest settings are applied
+            bundle_path, config_file = self.bundle_path, self.config_file
+            future = self._bundle.load(lambda: self._load_bundle(bundle_path, config_file))
+            future.add_done_callback(lambda f: self._bundle_swapped(f, bundle_path))
 
-        return Gst.FlowReturn.OK
+
+    def _load_bundle(self, bundle_path, config_file):
+        # imported here so that the other runners do not need MONAI
+        from monaistream.streamrunner.bundle import DEFAULT_CONFIG_FILE, BundleRunner
+
+        return BundleRunner(bundle_path, config_file or DEFAULT_CONFIG_FILE)
+
+
+    def _bundle_swapped(self, future, bundle_path):
+        if not future.cancelled() and future.exception() is not None:
+            Gst.error(f"{self.get_name()}: failed to load bundle {bundle_path}: {future.exception()}")
+
+
+    def do_start(self):
+        if self.bundle_path is None:
+            Gst.error(f"{self.get_name()}: bundle-path is not set")
+            return False
+        try:
+            if self._bundle.op is None:
+                self._bundle.swap(self._load_bundle(self.bundle_path, self.config_file))
+        except Exception as e:
+            Gst.error(f"{self.get_name()}: failed to load bundle {self.bundle_path}: {e}")
+            return False
+        return True
+
+
+    def do_op(self, src_data, snk_data):
+        result = as_numpy(self._bundle([src_data])[0])
+        if result.shape != snk_data.shape:
+            raise ValueError(f"bundle result shape {result.shape} does not match output frame shape {snk_data.shape}")
+        np.copyto(snk_data, result)
 
 
 
 class GstMultiInputStreamRunner(GstBase.Aggregator):
 
+    GST_PLUGIN_NAME = "gstmultiinputstreamrunner"
+
     __gstmetadata__ = ('MultiInputStreamRunner', 'Filter', 'StreamRunner for handling multiple inputs', 'MONAI')
 
     __gsttemplates__ = (
@@ -254,12 +567,34 @@ class GstMultiInputStreamRunner(GstBase.Aggregator):
     )
 
 
+    # when True, do_op is called as do_op(images, output) with a writable output array from the src pad's pool
+    preallocate_outputs = False
+
     def __init__(self):
         super().__init__()
 
         # TODO: support input and output buffer formats properties on the pipeline string
 
         self.input_count = 2
+        self._output_pools = OutputPools()
+        self._layouts = LayoutCache()
+        self._mapped = list()
+
+
+    def do_stop(self):
+        self._output_pools.close()
+        self._layouts.clear()
+        return True
+
+
+    def do_change_state(self, transition):
+        return change_runner_state(self, GstBase.Aggregator, transition)
+
+
+    def do_sink_event(self, aggpad, event):
+        if event.type == Gst.EventType.CAPS:
+            self._layouts.update(aggpad, event.parse_caps())
+        return GstBase.Aggregator.do_sink_event(self, aggpad, event)
 
 
     def do_op(self, data):
@@ -268,39 +603,39 @@ class GstMultiInputStreamRunner(GstBase.Aggregator):
 
     def collect_images(self, agg, pad, images):
 
-        width = pad.get_current_caps().get_structure(0).get_int("width")[1]
-        height = pad.get_current_caps().get_structure(0).get_int("height")[1]
-
         buf = pad.pop_buffer()
-        success, map_info = buf.map(Gst.MapFlags.READ)
+        success, map_info = map_input(self, pad, buf)
 
-        img = np.frombuffer(map_info.data, dtype=np.uint8).reshape((width, height, 3))
+        img = self._layouts.get(pad).for_buffer(buf).view(map_info.data)
         images.append(img)
-
-        buf.unmap(map_info)
+        self._mapped.append((buf, map_info))
 
         return True
 
 
     def do_aggregate(self, timeout):
         images = list()
-        self.foreach_sink_pad(self.collect_images, images)
-
-        # Perform the overlay operation (placing overlay image at top-left corner)
-        # main_image[:128, :128] = overlay_image  # Replace top-left region with overlay
-        result = self.do_op(images)
+        self._mapped = list()
+        try:
+            self.foreach_sink_pad(self.collect_images, images)
 
-        # Create a new buffer for output
-        output_buffer = Gst.Buffer.new_wrapped(result.tobytes())
+            # Perform the overlay operation (placing overlay image at top-left corner)
+            # main_image[:128, :128] = overlay_image  # Replace top-left region with overlay
+            output_buffer = aggregate_output(self, images)
+        finally:
+            unmap_inputs(self, self._mapped)
+            self._mapped = list()
 
         # Push the output buffer
-        self.srcpad.push(output_buffer)
+        count_output(self, self.srcpad.push(output_buffer))
         return Gst.FlowReturn.OK
 
 
 
 class GstMultiInputStreamRunner2(GstBase.Aggregator):
 
+    GST_PLUGIN_NAME = "gstmultiinputstreamrunner2"
+
     __gstmetadata__ = ('MultiInputStreamRunner2', 'Filter', 'StreamRunner for handling multiple inputs', 'MONAI')
 
     __gsttemplates__ = (
@@ -313,9 +648,30 @@ class GstMultiInputStreamRunner2(GstBase.Aggregator):
     )
 
 
+    # when True, do_op is called as do_op(images, output) with a writable output array from the src pad's pool
+    preallocate_outputs = False
+
     def __init__(self):
         super(GstMultiInputStreamRunner2, self).__init__()
         self.input_pads = []  # Store requested pads
+        self._output_pools = OutputPools()
+        self._layouts = LayoutCache()
+
+
+    def do_stop(self):
+        self._output_pools.close()
+        self._layouts.clear()
+        return True
+
+
+    def do_change_state(self, transition):
+        return change_runner_state(self, GstBase.Aggregator, transition)
+
+
+    def do_sink_event(self, aggpad, event):
+        if event.type == Gst.EventType.CAPS:
+            self._layouts.update(aggpad, event.parse_caps())
+        return GstBase.Aggregator.do_sink_event(self, aggpad, event)
 
 
     def do_request_new_pad(self, templ, name, caps=None):
@@ -345,35 +701,31 @@ class GstMultiInputStreamRunner2(GstBase.Aggregator):
             if not buffer:
                 return Gst.FlowReturn.ERROR
 
-            success, map_info = buffer.map(Gst.MapFlags.READ)
+            success, map_info = map_input(self, pad, buffer)
             if not success:
                 return Gst.FlowReturn.ERROR
 
             buffers.append(buffer)
             map_infos.append(map_info)
 
-            width = pad.get_current_caps().get_structure(0).get_int("width")[1]
-            height = pad.get_current_caps().get_structure(0).get_int("height")[1]
-            np_input = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
+            np_input = self._layouts.get(pad).for_buffer(buffer).view(map_info.data)
             images.append(np_input)
 
         # Perform operation on images
-        result = self.do_op(images)
-
-        for buffer, map_info in zip(buffers, map_infos):
-            buffer.unmap(map_info)
-
-        # Create a new buffer
-        output_buffer = Gst.Buffer.new_allocate(None, result.nbytes, None)
-        output_buffer.fill(0, result.tobytes())
+        try:
+            output_buffer = aggregate_output(self, images)
+        finally:
+            unmap_inputs(self, zip(buffers, map_infos))
 
         # Push the buffer to the src pad
-        return self.finish_buffer(output_buffer)
+        return count_output(self, self.finish_buffer(output_buffer))
 
 
 
 class GstMultiInputStreamRunner3(GstBase.Aggregator):
 
+    GST_PLUGIN_NAME = "gstmultiinputstreamrunner3"
+
     __gstmetadata__ = ('MultiInputStreamRunner3', 'Filter', 'StreamRunner for handling multiple inputs', 'MONAI')
 
     __gsttemplates__ = (
@@ -386,9 +738,30 @@ class GstMultiInputStreamRunner3(GstBase.Aggregator):
     )
 
 
+    # when True, do_op is called as do_op(images, output) with a writable output array from the src pad's pool
+    preallocate_outputs = False
+
     def __init__(self):
         super(GstMultiInputStreamRunner3, self).__init__()
         self.input_pads = []  # Store requested pads
+        self._output_pools = OutputPools()
+        self._layouts = LayoutCache()
+
+
+    def do_stop(self):
+        self._output_pools.close()
+        self._layouts.clear()
+        return True
+
+
+    def do_change_state(self, transition):
+        return change_runner_state(self, GstBase.Aggregator, transition)
+
+
+    def do_sink_event(self, aggpad, event):
+        if event.type == Gst.EventType.CAPS:
+            self._layouts.update(aggpad, event.parse_caps())
+        return GstBase.Aggregator.do_sink_event(self, aggpad, event)
 
 
     def do_start(self):
@@ -421,29 +794,24 @@ class GstMultiInputStreamRunner3(GstBase.Aggregator):
             if not buffer:
                 return Gst.FlowReturn.ERROR
 
-            success, map_info = buffer.map(Gst.MapFlags.READ)
+            success, map_info = map_input(self, pad, buffer)
             if not success:
                 return Gst.FlowReturn.ERROR
 
             buffers.append(buffer)
             map_infos.append(map_info)
 
-            width = pad.get_current_caps().get_structure(0).get_int("width")[1]
-            height = pad.get_current_caps().get_structure(0).get_int("height")[1]
-            np_input = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
+            np_input = self._layouts.get(pad).for_buffer(buffer).view(map_info.data)
             images.append(np_input)
 
         # Perform operation on images
-        result = self.do_op(images)
-
-        for buffer, map_info in zip(buffers, map_infos):
-            buffer.unmap(map_info)
-
-        # Create a new buffer
-        output_buffer = Gst.Buffer.new_allocate(None, result.nbytes, None)
-        output_buffer.fill(0, result.tobytes())
+        try:
+            output_buffer = aggregate_output(self, images)
+        finally:
+            unmap_inputs(self, zip(buffers, map_infos))
 
         # Push the buffer to the src pad
+        return count_output(self, self.finish_buffer(output_buffer))
 
 
 
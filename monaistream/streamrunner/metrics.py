@@ -0,0 +1,280 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__all__ = [
+    "FRAMES",
+    "OUTPUT_FRAMES",
+    "DROPPED_FRAMES",
+    "OP_SECONDS",
+    "MAP_SECONDS",
+    "QUEUE_DEPTH",
+    "IN_FLIGHT",
+    "DEFAULT_BUCKETS",
+    "HistogramValue",
+    "MetricsRegistry",
+    "default_registry",
+    "serve_metrics",
+]
+
+
+FRAMES = "frames_total"
+OUTPUT_FRAMES = "output_frames_total"
+DROPPED_FRAMES = "dropped_frames_total"
+OP_SECONDS = "do_op_seconds"
+MAP_SECONDS = "map_seconds"
+QUEUE_DEPTH = "queue_depth"
+IN_FLIGHT = "in_flight"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_FAMILIES = (
+    (FRAMES, "counter", "Frames received, by element and sink pad"),
+    (OUTPUT_FRAMES, "counter", "Frames pushed, by element and src pad"),
+    (DROPPED_FRAMES, "counter", "Frames dropped or not processed, by element and reason"),
+    (OP_SECONDS, "histogram", "Time spent in do_op per call"),
+    (MAP_SECONDS, "histogram", "Time spent mapping and unmapping buffers per frame, by op"),
+    (QUEUE_DEPTH, "gauge", "Frames waiting in each input queue"),
+    (IN_FLIGHT, "gauge", "Frames batched or being processed by worker threads"),
+)
+
+
+class HistogramValue:
+    """
+    Cumulative bucket counts, sum and count of the observations of one histogram series.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """
+        Estimate quantile `q` as the upper bound of the first bucket holding it, or inf past the last bucket.
+        """
+        target = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return float("inf")
+
+    def copy(self):
+        value = HistogramValue(self.buckets)
+        value.counts = list(self.counts)
+        value.sum, value.count = self.sum, self.count
+        return value
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of labelled counters, gauges and histograms that the runner elements report into, exported with
+    `snapshot` in-process or with `to_prometheus` in the Prometheus text format. Values that elements already track
+    elsewhere, such as queue depths and drop counters, are read at export time from collectors added with
+    `add_collector`, which are held weakly so they do not keep their element alive.
+    """
+
+    def __init__(self, prefix="monaistream", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._families = dict()
+        self._values = dict()
+        self._collectors = list()
+        for name, kind, help in _FAMILIES:
+            self.describe(name, kind, help)
+
+    def describe(self, name, kind, help=""):
+        if kind not in ("counter", "gauge", "histogram"):
+            raise ValueError(f"unknown metric kind {kind}")
+        with self._lock:
+            self._families.setdefault(name, (kind, help))
+            self._values.setdefault(name, dict())
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[name][_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            values = self._values[name]
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = HistogramValue(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """
+        Observe the time spent in the block, in seconds, in histogram `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector, labels=None):
+        """
+        Add a function returning (name, labels, value) samples of described metrics, evaluated on each export, which
+        may happen on any thread, eg. a bus handler, so collectors must not take locks held while posting messages.
+
+        `labels`, if given, is a function returning the labels that all of the collector's samples have, eg. the name
+        of the element they report for. Exports filtered on other values of these labels skip the collector without
+        calling it, so `labels` should be cheap and take no locks.
+        """
+        with self._lock:
+            self._collectors.append((_weak(collector), None if labels is None else _weak(labels)))
+
+    def remove_collector(self, collector):
+        """
+        Stop evaluating `collector`, eg. when the element it reports for is closed. Unknown collectors are ignored.
+        """
+        with self._lock:
+            self._collectors = [(c, l) for c, l in self._collectors if c() is not None and c() != collector]
+
+    def remove(self, **labels):
+        """
+        Forget every series whose labels include `labels`, eg. those of an element that has been removed.
+        """
+        match = set(_label_key(labels))
+        with self._lock:
+            for values in self._values.values():
+                for key in [k for k in values if match.issubset(k)]:
+                    del values[key]
+
+    def samples(self, **labels):
+        """
+        Get a list of (name, kind, labels, value) for every series whose labels include `labels`. Histogram values are
+        copied `HistogramValue` objects.
+        """
+        match = set(_label_key(labels))
+        with self._lock:
+            collectors = [(c(), None if l is None else l()) for c, l in self._collectors]
+            self._collectors = [r for r, (c, _) in zip(self._collectors, collectors) if c is not None]
+            samples = [
+                (name, self._families[name][0], dict(key), v.copy() if isinstance(v, HistogramValue) else v)
+                for name, values in self._values.items()
+                for key, v in values.items()
+                if match.issubset(key)
+            ]
+        for collector, own_labels in collectors:
+            if collector is None:
+                continue
+            if own_labels is not None:
+                own = dict(_label_key(own_labels()))
+                if any(k in own and own[k] != v for k, v in match):
+                    continue
+            for name, sample_labels, value in collector():
+                if match.issubset(_label_key(sample_labels)):
+                    samples.append((name, self._families[name][0], dict(sample_labels), value))
+        return samples
+
+    def snapshot(self, **labels):
+        """
+        Get the current values as a dict of metric name to a list of (labels, value) pairs.
+        """
+        result = dict()
+        for name, _, sample_labels, value in self.samples(**labels):
+            result.setdefault(name, list()).append((sample_labels, value))
+        return result
+
+    def to_prometheus(self, **labels):
+        lines = list()
+        by_name = self.snapshot(**labels)
+        for name, (kind, help) in self._families.items():
+            if name not in by_name:
+                continue
+            full_name = f"{self.prefix}_{name}" if self.prefix else name
+            lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for sample_labels, value in by_name[name]:
+                if kind != "histogram":
+                    lines.append(f"{full_name}{_format_labels(sample_labels)} {value}")
+                    continue
+                for bound, count in zip(value.buckets, value.counts):
+                    lines.append(f"{full_name}_bucket{_format_labels(sample_labels, le=repr(bound))} {count}")
+                lines.append(f"{full_name}_bucket{_format_labels(sample_labels, le='+Inf')} {value.count}")
+                lines.append(f"{full_name}_sum{_format_labels(sample_labels)} {value.sum}")
+                lines.append(f"{full_name}_count{_format_labels(sample_labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _weak(fn):
+    # bound methods are held weakly, so registering an element's collector does not keep the element alive
+    return weakref.WeakMethod(fn) if hasattr(fn, "__self__") else (lambda: fn)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+default_registry = MetricsRegistry()
+
+
+def serve_metrics(port=9464, addr="127.0.0.1", registry=None):
+    """
+    Serve the Prometheus text exposition of `registry` (the default registry if None) at http://addr:port/metrics on
+    a daemon thread, and return the server; call its `shutdown` method to stop it.
+    """
+    registry = default_registry if registry is None else registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
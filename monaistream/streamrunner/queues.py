@@ -0,0 +1,247 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+__all__ = ["QUEUE_POLICIES", "QueuePolicy", "QueueStats", "InputQueues", "parse_queue_policy"]
+
+
+QUEUE_POLICIES = ("block", "drop-oldest", "drop-newest", "keep-latest", "bounded-bytes")
+
+
+@dataclass(frozen=True)
+class QueuePolicy:
+    """
+    What happens to a new item arriving at a full input queue:
+     - "block": the producer waits until there is room for it, so the source is throttled to the inference rate
+     - "drop-oldest": the oldest queued item is dropped to make room
+     - "drop-newest": the new item is dropped
+     - "keep-latest": only the newest item is kept, so latency never builds up (what live video needs)
+     - "bounded-bytes": the oldest items are dropped until the queued items fit within `max_bytes`
+    """
+
+    kind: str = "block"
+    max_items: int = 2
+    max_bytes: int = 0
+
+    def __post_init__(self):
+        if self.kind not in QUEUE_POLICIES:
+            raise ValueError(f"unknown queue policy {self.kind}; must be one of {QUEUE_POLICIES}")
+        if self.kind == "bounded-bytes" and self.max_bytes <= 0:
+            raise ValueError("the bounded-bytes queue policy requires max_bytes > 0")
+        if self.kind != "bounded-bytes" and self.max_items < 1:
+            raise ValueError(f"max_items must be at least 1, got {self.max_items}")
+
+
+def parse_queue_policy(policy):
+    """
+    Get a `QueuePolicy` from a policy name, a dict of `QueuePolicy` arguments or a `QueuePolicy`. None means no queuing,
+    ie. inputs are processed on the thread they arrive on.
+    """
+    if policy is None or isinstance(policy, QueuePolicy):
+        return policy
+    if isinstance(policy, str):
+        return QueuePolicy(kind=policy)
+    if isinstance(policy, dict):
+        return QueuePolicy(**policy)
+    raise TypeError(f"queue policy must be a name, dict or QueuePolicy, got {type(policy).__name__}")
+
+
+@dataclass
+class QueueStats:
+    received: int = 0
+    dropped_oldest: int = 0
+    dropped_newest: int = 0
+    depth: int = 0
+    bytes: int = 0
+
+    @property
+    def dropped(self):
+        return self.dropped_oldest + self.dropped_newest
+
+
+class InputQueues:
+    """
+    One bounded queue per named input, all applying the same `QueuePolicy`, between the threads on which inputs arrive
+    and a consumer that takes one item from every queue at a time with `get_set`, or one item at a time in arrival
+    order with `get_next`.
+    """
+
+    def __init__(self, policy, names=()):
+        self.policy = parse_queue_policy(policy)
+        self._cond = threading.Condition()
+        self._queues = dict()
+        self._stats = dict()
+        self._closed = False
+        self._busy = False
+        self._arrivals = 0  # sequence number of the next item put, so `get_next` takes items in arrival order
+        for name in names:
+            self.add(name)
+
+    @property
+    def names(self):
+        with self._cond:
+            return tuple(self._queues.keys())
+
+    @property
+    def stats(self):
+        """
+        A snapshot of the counters of each queue, by name.
+        """
+        with self._cond:
+            return {name: QueueStats(**vars(s)) for name, s in self._stats.items()}
+
+    def add(self, name, index=None):
+        """
+        Add queue `name`, at position `index` of the sets (the end if None).
+        """
+        with self._cond:
+            if name not in self._queues:
+                queues = list(self._queues.items())
+                queues.insert(len(queues) if index is None else index, (name, deque()))
+                self._queues = dict(queues)
+                self._stats[name] = QueueStats()
+            self._cond.notify_all()
+
+    def remove(self, name):
+        """
+        Remove queue `name`, discarding its items. A producer blocked on it is released and its item discarded too.
+        """
+        with self._cond:
+            queue = self._queues.pop(name, None)
+            self._stats.pop(name, None)
+            if queue is not None:
+                queue.clear()
+            self._cond.notify_all()
+
+    def put(self, name, item, nbytes=0):
+        """
+        Add `item` to queue `name` according to the policy. Returns False if the item was dropped, the queues closed or
+        queue `name` removed.
+        """
+        with self._cond:
+            queue, stats = self._queues.get(name), self._stats.get(name)
+            if queue is None:
+                return False
+            stats.received += 1
+            kind = self.policy.kind
+
+            if kind == "block":
+                self._cond.wait_for(
+                    lambda: self._closed or self._queues.get(name) is not queue or len(queue) < self.policy.max_items
+                )
+                if self._closed or self._queues.get(name) is not queue:
+                    return False
+            elif kind == "drop-newest":
+                if len(queue) >= self.policy.max_items:
+                    stats.dropped_newest += 1
+                    return False
+            else:
+                limit = 1 if kind == "keep-latest" else self.policy.max_items
+                while queue and (
+                    stats.bytes + nbytes > self.policy.max_bytes if kind == "bounded-bytes" else len(queue) >= limit
+                ):
+                    _, dropped_bytes, _ = queue.popleft()
+                    stats.bytes -= dropped_bytes
+                    stats.dropped_oldest += 1
+
+            queue.append((item, nbytes, self._arrivals))
+            self._arrivals += 1
+            stats.bytes += nbytes
+            stats.depth = len(queue)
+            self._cond.notify_all()
+            return True
+
+    def get_set(self, names=None, timeout=None):
+        """
+        Wait until every queue (or each of `names`) holds an item and pop one from each, in order. Returns None if the
+        queues were closed or `timeout` expired. Call `task_done` once the set has been processed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._has_set(names), timeout) or self._closed:
+                return None
+            items = list()
+            for name in self._queues if names is None else names:
+                item, nbytes, _ = self._queues[name].popleft()
+                stats = self._stats[name]
+                stats.bytes -= nbytes
+                stats.depth = len(self._queues[name])
+                items.append(item)
+            self._busy = True
+            self._cond.notify_all()
+            return items
+
+    def get_next(self, timeout=None):
+        """
+        Wait until any queue holds an item and pop the earliest one to arrive of all queues, returning it with its
+        queue's name as a (name, item) pair. Returns None if the queues were closed or `timeout` expired. Call
+        `task_done` once the item has been processed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or any(self._queues.values()), timeout) or self._closed:
+                return None
+            name = min((n for n, q in self._queues.items() if q), key=lambda n: self._queues[n][0][2])
+            item, nbytes, _ = self._queues[name].popleft()
+            stats = self._stats[name]
+            stats.bytes -= nbytes
+            stats.depth = len(self._queues[name])
+            self._busy = True
+            self._cond.notify_all()
+            return name, item
+
+    def task_done(self):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+    def wait_idle(self, names=None, timeout=None):
+        """
+        Wait until no complete set is left to take and the last one taken has been processed. With a single name, this
+        waits until that queue is empty, as needed by a consumer using `get_next`.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._closed or not (self._busy or self._has_set(names)), timeout)
+
+    def clear(self):
+        """
+        Discard all queued items without counting them as drops, eg. when the pipeline is flushing.
+        """
+        with self._cond:
+            for name, queue in self._queues.items():
+                queue.clear()
+                self._stats[name].bytes = 0
+                self._stats[name].depth = 0
+            self._cond.notify_all()
+
+    def close(self):
+        """
+        Discard queued items and release any waiting producer or consumer; `open` makes the queues usable again.
+        """
+        self.clear()
+        with self._cond:
+            self._closed = True
+            self._busy = False
+            self._cond.notify_all()
+
+    def open(self):
+        with self._cond:
+            self._closed = False
+
+    def _has_set(self, names):
+        queues = self._queues.values() if names is None else (self._queues.get(n) for n in names)
+        has_any = False
+        for q in queues:
+            if not q:
+                return False
+            has_any = True
+        return has_any
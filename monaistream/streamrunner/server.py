@@ -0,0 +1,393 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from monaistream.streamrunner.gstreamer.batching import stack_frames, unstack_result
+
+__all__ = [
+    "SCHEDULING_POLICIES",
+    "StreamStats",
+    "StreamSlot",
+    "InferenceServer",
+    "register_server",
+    "unregister_server",
+    "get_server",
+    "server_names",
+]
+
+
+SCHEDULING_POLICIES = ("weighted-round-robin", "deadline")
+
+_SERVERS = dict()
+_SERVERS_LOCK = threading.Lock()
+
+
+@dataclass
+class StreamStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    pending: int = 0
+    latency: float = 0.0  # mean seconds from submission to result
+
+
+class _Request:
+    __slots__ = ("slot", "frames", "future", "arrival", "deadline", "seq")
+
+    def __init__(self, slot, frames, seq):
+        self.slot = slot
+        self.frames = frames
+        self.future = Future()
+        self.arrival = time.monotonic()
+        self.deadline = float("inf") if slot.deadline is None else self.arrival + slot.deadline
+        self.seq = seq
+
+
+class StreamSlot:
+    """
+    One stream's attachment to an `InferenceServer`, created by `InferenceServer.attach`. Calling it with a list of
+    frames submits them to the server and returns the result, so it can be given as a runner's `do_op` in place of
+    that runner's own model. `state` is a dict kept for the stream across calls and given to the model with each of the
+    stream's requests, eg. for a tracker or a recurrent network's hidden state. `close` detaches the stream, so a
+    runner releasing its op when it is swapped out or closed frees its place on the server.
+    """
+
+    def __init__(self, server, name, weight=1.0, deadline_ms=None):
+        if weight <= 0:
+            raise ValueError(f"weight must be greater than 0, got {weight}")
+        self.server = server
+        self.name = name
+        self.weight = weight
+        self.deadline = None if deadline_ms is None else deadline_ms / 1000.0
+        self.state = dict()
+        self._pending = deque()
+        self._in_flight = 0  # requests taken by a worker and not yet done
+        self._credit = 0.0
+        self._stats = StreamStats()
+        self._total_latency = 0.0
+
+    @property
+    def stats(self):
+        return self.server.stats[self.name]
+
+    def submit(self, frames) -> Future:
+        return self.server.submit(self, frames)
+
+    def __call__(self, frames):
+        return self.server.infer(self, frames)
+
+    def detach(self):
+        self.server.detach(self.name)
+
+    close = detach
+
+
+class InferenceServer:
+    """
+    In-process model server holding one instance of `model` for many pipelines, so that N streams share one copy of
+    the model's weights and `n_workers` inference threads instead of running N of each. Streams attach by name with
+    `attach`, and each `StreamSlot` submits its frames as requests that the server gathers into batches across streams.
+
+    A batch is formed once `max_batch` requests are pending or the oldest has waited `max_wait_ms`, and `policy` picks
+    its requests: "weighted-round-robin" takes them from the streams with pending requests in proportion to their
+    weights (smoothly interleaved, so a stream with weight 2 gets two requests for every one of a stream with weight 1
+    when both are busy), and "deadline" takes the requests whose deadlines (submission time plus the stream's
+    `deadline_ms`) are earliest, streams without a deadline going last. Each stream's requests are always served in the
+    order they were submitted: a stream's requests are not taken into a batch while an earlier batch holding some of
+    them is still running on another worker, so neither its results nor its `state` are updated out of order.
+
+    The model is called as `model(batch, states)`, where `batch` is the list of the requests' frames (each a list of
+    per-input arrays, as a runner's `do_op` gets) and `states` the `state` dicts of the requests' streams, and returns
+    a list with one result per request. With `collate`, requests whose frames have the same shapes and dtypes are
+    instead stacked per input along a new leading axis, as `stack_frames` does, and the model returns one batched
+    result per output, which is split back into per-request results.
+    """
+
+    def __init__(
+        self,
+        model: Callable,
+        max_batch: int = 8,
+        max_wait_ms: float = 0.0,
+        policy: str = "weighted-round-robin",
+        collate: bool = False,
+        n_workers: int = 1,
+        timeout: Optional[float] = None,
+        name: str = "InferenceServer",
+    ):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"unknown scheduling policy {policy}; must be one of {SCHEDULING_POLICIES}")
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch}")
+        if n_workers < 1:
+            raise ValueError(f"n_workers must be at least 1, got {n_workers}")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.policy = policy
+        self.collate = collate
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.name = name
+        self._slots = dict()
+        self._n_pending = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = list()
+        self._running = False
+
+    def attach(self, stream: str, weight: float = 1.0, deadline_ms: Optional[float] = None) -> StreamSlot:
+        """
+        Attach stream `stream`, which is served with `weight` or by `deadline_ms` depending on the policy, and return
+        its `StreamSlot`.
+        """
+        with self._cond:
+            if stream in self._slots:
+                raise ValueError(f"stream {stream} is already attached to {self.name}")
+            slot = self._slots[stream] = StreamSlot(self, stream, weight, deadline_ms)
+        return slot
+
+    def detach(self, stream: str):
+        """
+        Detach stream `stream`; its requests still pending fail with a RuntimeError. Detaching an unknown stream, eg.
+        one already detached, does nothing.
+        """
+        with self._cond:
+            slot = self._slots.pop(stream, None)
+            if slot is None:
+                return
+            requests = list(slot._pending)
+            slot._pending.clear()
+            self._n_pending -= len(requests)
+        for r in requests:
+            r.future.set_exception(RuntimeError(f"stream {stream} was detached from {self.name}"))
+
+    @property
+    def streams(self):
+        with self._cond:
+            return tuple(self._slots)
+
+    @property
+    def stats(self):
+        """
+        The `StreamStats` of each attached stream, by name.
+        """
+        with self._cond:
+            return {
+                name: StreamStats(
+                    s._stats.submitted,
+                    s._stats.completed,
+                    s._stats.failed,
+                    len(s._pending),
+                    s._total_latency / s._stats.completed if s._stats.completed else 0.0,
+                )
+                for name, s in self._slots.items()
+            }
+
+    def submit(self, slot: StreamSlot, frames) -> Future:
+        """
+        Queue `frames` as a request of `slot`'s stream and return the `Future` of its result.
+        """
+        with self._cond:
+            if self._slots.get(slot.name) is not slot:
+                raise RuntimeError(f"stream {slot.name} is not attached to {self.name}")
+            self._ensure_threads()
+            request = _Request(slot, frames, next(self._seq))
+            slot._pending.append(request)
+            slot._stats.submitted += 1
+            self._n_pending += 1
+            self._cond.notify_all()
+        return request.future
+
+    def infer(self, slot: StreamSlot, frames):
+        """
+        Submit `frames` as a request of `slot`'s stream and wait for at most `timeout` seconds for its result. A request
+        that timed out before a worker took it is withdrawn, so the model does not run on frames nobody waits for.
+        """
+        future = self.submit(slot, frames)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            with self._cond:
+                request = next((r for r in slot._pending if r.future is future), None)
+                if request is not None:
+                    slot._pending.remove(request)
+                    slot._stats.failed += 1
+                    self._n_pending -= 1
+                    future.cancel()
+            raise
+
+    def close(self):
+        """
+        Serve the pending requests and stop the worker threads; the server restarts them if more requests come.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            threads, self._threads = self._threads, list()
+        for t in threads:
+            if t is not threading.current_thread():
+                t.join()
+
+    def _ensure_threads(self):
+        if not self._running:
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True) for i in range(self.n_workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def _ready(self):
+        """
+        The streams with requests pending and none running, whose requests can be taken into a batch.
+        """
+        return [s for s in self._slots.values() if s._pending and not s._in_flight]
+
+    def _oldest_arrival(self):
+        return min(s._pending[0].arrival for s in self._ready())
+
+    def _take_batch(self):
+        """
+        Wait for the next batch and take its requests, or return None once stopped with nothing pending. Called with
+        `_cond` held.
+        """
+        while True:
+            # once stopped, keep serving until the requests held back behind running ones are done too
+            self._cond.wait_for(lambda: self._ready() or (not self._running and self._n_pending == 0))
+            if not self._ready():
+                return None
+            if self.max_wait_ms > 0:
+                deadline = self._oldest_arrival() + self.max_wait_ms / 1000.0
+                while self._running and 0 < self._n_pending < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            requests = self._select(self.max_batch)
+            if requests:  # else the streams were detached or taken by another worker while waiting for the batch
+                self._n_pending -= len(requests)
+                for r in requests:
+                    r.slot._in_flight += 1
+                return requests
+
+    def _select(self, count):
+        requests = list()
+        ready = self._ready()
+        while len(requests) < count:
+            busy = [s for s in ready if s._pending]
+            if not busy:
+                break
+            if self.policy == "deadline":
+                chosen = min(busy, key=lambda s: (s._pending[0].deadline, s._pending[0].seq))
+            else:
+                # smooth weighted round-robin: each busy stream earns its weight, the richest is served and pays the sum
+                for s in busy:
+                    s._credit += s.weight
+                chosen = max(busy, key=lambda s: s._credit)
+                chosen._credit -= sum(s.weight for s in busy)
+            request = chosen._pending.popleft()
+            if request.future.set_running_or_notify_cancel():
+                requests.append(request)
+            else:
+                self._n_pending -= 1  # cancelled by its submitter
+        return requests
+
+    def _run(self):
+        while True:
+            with self._cond:
+                requests = self._take_batch()
+            if requests is None:
+                return
+            try:
+                results, error = self._run_model(requests), None
+            except Exception as e:
+                results, error = None, e
+
+            now = time.monotonic()
+            with self._cond:
+                for r in requests:
+                    r.slot._in_flight -= 1
+                    if error is None:
+                        r.slot._stats.completed += 1
+                        r.slot._total_latency += now - r.arrival
+                    else:
+                        r.slot._stats.failed += 1
+                self._cond.notify_all()  # their streams' next requests can be taken now
+            for i, r in enumerate(requests):
+                if error is None:
+                    r.future.set_result(results[i])
+                else:
+                    r.future.set_exception(error)
+
+    def _run_model(self, requests):
+        if not self.collate:
+            results = self.model([r.frames for r in requests], [r.slot.state for r in requests])
+            if len(results) != len(requests):
+                raise ValueError(f"Expected {len(requests)} results from the model but got {len(results)}.")
+            return list(results)
+
+        groups = dict()
+        for i, r in enumerate(requests):
+            groups.setdefault(_signature(r.frames), list()).append(i)
+        results = [None] * len(requests)
+        for indices in groups.values():
+            group = [requests[i] for i in indices]
+            batch = [stack_frames([r.frames[k] for r in group]) for k in range(len(group[0].frames))]
+            outputs = [unstack_result(o, len(group)) for o in self.model(batch, [r.slot.state for r in group])]
+            for j, i in enumerate(indices):
+                results[i] = [o[j] for o in outputs]
+        return results
+
+
+def _signature(frames):
+    """
+    The shapes and dtypes of a request's frames, which requests must share to be stacked together.
+    """
+    return tuple(
+        tuple((tuple(p.shape), str(p.dtype)) for p in f) if isinstance(f, tuple) else (tuple(f.shape), str(f.dtype))
+        for f in frames
+    )
+
+
+def register_server(name: str, server: InferenceServer):
+    """
+    Make `server` available to runners by `name`, eg. StreamRunner(server=name).
+    """
+    with _SERVERS_LOCK:
+        if name in _SERVERS and _SERVERS[name] is not server:
+            raise ValueError(f"an inference server named {name} is already registered")
+        _SERVERS[name] = server
+
+
+def unregister_server(name: str):
+    with _SERVERS_LOCK:
+        return _SERVERS.pop(name, None)
+
+
+def get_server(name: str) -> InferenceServer:
+    with _SERVERS_LOCK:
+        server = _SERVERS.get(name)
+    if server is None:
+        raise ValueError(f"unknown inference server {name}; registered servers are {server_names()}")
+    return server
+
+
+def server_names():
+    with _SERVERS_LOCK:
+        return tuple(_SERVERS)
@@ -1,20 +1,27 @@
 from dataclasses import dataclass
 
 from monaistream.streamrunner.gstreamer.backend import GstStreamRunnerBackend
+from monaistream.streamrunner.metrics import serve_metrics
+from monaistream.streamrunner.queues import parse_queue_policy
+from monaistream.streamrunner.swap import SwappableOp, _release_op
 
 
 
-def parse_queue_policy(policy):
-    # TODO: support queuing policies
-    return lambda q: q
+def _unload_op(op):
+    # ops swapped out for another are unloaded, so eg. a bundle's cached components are dropped once unused
+    unload = getattr(op, "unload", None)
+    if callable(unload):
+        unload()
+    else:
+        _release_op(op)
 
 
 
-def parse_backend(backend, array_type):
+def parse_backend(backend, array_type, **backend_options):
     supported_backends = ("gstreamer",)
     if isinstance(backend, str):
         if backend == "gstreamer":
-            return GstStreamRunnerBackend(array_type=array_type)
+            return GstStreamRunnerBackend(array_type=array_type, **backend_options)
         else:
             raise ValueError(f"unknown backend {backend}; must be one of {supported_backends}")
     return GstStreamRunnerBackend()
@@ -39,15 +46,46 @@ class StreamRunner:
                  queue_policy=None,
                  backend="gstreamer",
                  array_type="numpy",
-                 do_op=None
+                 do_op=None,
+                 bundle=None,
+                 server=None,
+                 **backend_options
     ):
-        # TODO: support passing in a queue policy / queue backend
+        """
+        `bundle` runs a MONAI bundle as the op instead of `do_op`: a bundle directory path, whose inference config is
+        loaded once and cached for the process, or a `BundleRunner`.
+
+        `server` runs the op on a shared `InferenceServer` instead, which batches the requests of all the runners
+        attached to it: the name it was registered with (see `register_server`) or the server itself, to which this
+        runner attaches as a new stream with weight 1, or a `StreamSlot` already attached with its own weight or
+        deadline. The stream is detached when the runner is closed or its op swapped out.
+
+        `queue_policy` is a `QueuePolicy`, a policy name such as "keep-latest" or a dict of `QueuePolicy` arguments,
+        and sets how frames are queued on each input between their arrival and `do_op`; see `InputQueues`. With the
+        default None, `do_op` runs on the thread the completing input arrives on.
+
+        `backend_options` are passed on to the backend, eg. `preallocate_outputs`, `max_batch` and `max_wait_ms` for
+        `GstStreamRunnerBackend`.
+        """
         # TODO: support selecting / passing in a backend
         # TODO: passing in inputs / outputs on init
         self._queue = parse_queue_policy(queue_policy)
-        self._backend = parse_backend(backend, array_type)
-        print("backend:", self._backend)
-        self._backend.set_do_op(do_op)
+        self._backend = parse_backend(backend, array_type, queue_policy=self._queue, **backend_options)
+        if sum(op is not None for op in (do_op, bundle, server)) > 1:
+            raise ValueError("only one of do_op, bundle and server may be given")
+        if bundle is not None:
+            from monaistream.streamrunner.bundle import BundleRunner
+
+            do_op = bundle if isinstance(bundle, BundleRunner) else BundleRunner(bundle)
+        if server is not None:
+            from monaistream.streamrunner.server import StreamSlot, get_server
+
+            if not isinstance(server, StreamSlot):
+                server = get_server(server) if isinstance(server, str) else server
+                server = server.attach(f"{self._backend.get_name()}-{id(self)}")
+            do_op = server
+        self._op = SwappableOp(do_op, release=_unload_op)
+        self._backend.set_do_op(None if do_op is None else self._op)
 
         if input_configs is not None:
             for c in input_configs:
@@ -72,6 +110,55 @@ class StreamRunner:
         return self._remove_input_or_output(name, False)
 
 
+    def swap_op(self, do_op=None, bundle=None, warmup=True, warmup_args=None):
+        """
+        Replace the op without stopping the pipeline: `do_op`, or a `BundleRunner` for `bundle` (a bundle path or a
+        function of no arguments returning the new op), is built on a background thread, warmed up on a copy of the
+        next frames and switched to between two frames, while the current op keeps processing the stream. The old op
+        is released once the frames already being processed by it are done; see `SwappableOp`. Returns a `Future` of
+        the old op, which holds the exception instead if loading or warming up the new op failed, and is cancelled if
+        another swap was started before this one completed.
+        """
+        if (do_op is None) == (bundle is None):
+            raise ValueError("exactly one of do_op and bundle must be given")
+        if bundle is None:
+            factory = lambda: do_op
+        elif callable(bundle):
+            factory = bundle
+        else:
+            from monaistream.streamrunner.bundle import BundleRunner
+
+            factory = lambda: BundleRunner(bundle)
+
+        future = self._op.load(factory, warmup, warmup_args)
+        future.add_done_callback(self._op_swapped)
+        return future
+
+
+    def _op_swapped(self, future):
+        # the backend restarts anything holding its own copy of the op, such as worker processes, warmed up the same way
+        if not future.cancelled() and future.exception() is None:
+            self._backend.set_do_op(self._op, self._op.warmup_args)
+
+
+    def close(self):
+        """
+        Release the op once the frames being processed by it are done, eg. detaching this runner from its inference
+        server. Unlike an op swapped out, it is closed rather than unloaded, so a bundle's components stay cached for
+        a runner created again for the same bundle.
+        """
+        self._backend.set_do_op(None)
+        self._op.swap(None, release=_release_op)
+
+
+    @property
+    def op(self):
+        """
+        The op currently processing frames.
+        """
+        return self._op.op
+
+
     @property
     def input_names(self):
         return tuple(i.get_name() for i in self._backend.sinkpads)
@@ -87,6 +174,29 @@ class StreamRunner:
         return self._backend
 
 
+    @property
+    def metrics(self):
+        """
+        The backend's current metric values: frame counts, drops, `do_op` and map/unmap times, queue depths.
+        """
+        return self._backend.metrics
+
+
+    def serve_metrics(self, port=9464, addr="127.0.0.1"):
+        """
+        Serve the metrics of all runners in the Prometheus text format at http://addr:port/metrics; see `serve_metrics`.
+        """
+        return serve_metrics(port, addr, self._backend._metrics)
+
+
+    @property
+    def queue_stats(self):
+        """
+        The received and dropped frame counters and current depth of each input queue, by input name.
+        """
+        return self._backend.queue_stats
+
+
     def register(self, name, permanent=False):
         raise NotImplementedError()
 
@@ -100,19 +210,18 @@ class StreamRunner:
 
 
     def _add_input_or_output(self, name, format, is_input):
-        # TODO: this should only be possible to do in certain StreamRunner states
-        # TODO: name clash policy
+        # inputs and outputs may be added while the pipeline is playing; a name clash raises ValueError
         check_input_format(format)
         if is_input:
-            self._backend.add_input(name, format)
-        else:
-            self._backend.add_output(name, format)
-
+            return self._backend.add_input(name, format)
+        return self._backend.add_output(name, format)
 
-    def _remove_input_or_output(self, name, collection):
-        # TODO: this should only be possible to do in certain StreamRunner states
-        del collection[name]
 
-        raise NotImplementedError()
+    def _remove_input_or_output(self, name, is_input):
+        # the other streams keep running; an unknown name raises ValueError
+        if is_input:
+            self._backend.remove_input(name)
+        else:
+            self._backend.remove_output(name)
 
 
@@ -0,0 +1,180 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+__all__ = ["SwappableOp"]
+
+
+class _Generation:
+    __slots__ = ("op", "in_flight", "retired", "release")
+
+    def __init__(self, op):
+        self.op = op
+        self.in_flight = 0
+        self.retired = False
+        self.release = None  # overrides `SwappableOp.release` for this op
+
+
+def _release_op(op):
+    close = getattr(op, "close", None)
+    if callable(close):
+        close()
+
+
+def _copy_args(args):
+    """
+    Copy the arrays of a call's arguments, which may be views of buffers that are released after the call.
+    """
+    if isinstance(args, (list, tuple)):
+        return type(args)(_copy_args(a) for a in args)
+    for method in ("clone", "copy"):  # Torch tensors, then Numpy arrays
+        copy = getattr(args, method, None)
+        if callable(copy):
+            return copy()
+    return args
+
+
+class SwappableOp:
+    """
+    A runner's `do_op` whose underlying op can be replaced while frames are streaming. Each call runs the op that was
+    current when it started, and `swap` makes a new op current atomically between calls, so no frame is dropped or
+    sees a half-loaded model. The replaced op is released, by calling `release(op)` (its `close` method, if it has
+    one, by default), only once the calls already running on it have returned.
+
+    `load` builds the new op in a background thread from a factory, such as one loading a bundle, and warms it up on a
+    copy of the next frames the stream delivers (or on `warmup_args`), so the first frames after the switch do not pay
+    for lazy initialisation such as CUDA kernel selection. The stream keeps running on the current op meanwhile. Only
+    the latest load is applied: a load overtaken by a later one before swapping is cancelled and its op released. The
+    arguments of the last warm-up are kept in `warmup_args`, so copies of the op elsewhere, such as in worker processes,
+    can be warmed up on them too.
+
+    Pickling a `SwappableOp` pickles its current op, so worker processes get the op current when they start.
+    """
+
+    def __init__(self, op: Optional[Callable] = None, release: Callable = _release_op):
+        self.release = release
+        self._current = _Generation(op)
+        self._retired = list()
+        self._sample = None  # set while a load waits for a frame to warm up on
+        self._loads = 0
+        self.warmup_args = None
+        self._cond = threading.Condition()
+
+    def __reduce__(self):
+        return SwappableOp, (self.op,)
+
+    @property
+    def op(self):
+        with self._cond:
+            return self._current.op
+
+    def __call__(self, *args):
+        with self._cond:
+            generation = self._current
+            generation.in_flight += 1
+            if self._sample is not None and not self._sample.done():
+                self._sample.set_result(_copy_args(args))
+        try:
+            if generation.op is None:
+                raise ValueError("do_op not set")
+            return generation.op(*args)
+        finally:
+            with self._cond:
+                generation.in_flight -= 1
+                drained = generation.retired and generation.in_flight == 0
+            if drained:
+                self._release(generation)
+
+    def swap(self, op: Callable, release: Optional[Callable] = None):
+        """
+        Make `op` the op run by the following calls and return the previous one, which is released once drained, by
+        `release(op)` if given instead of `self.release`.
+        """
+        with self._cond:
+            old, self._current = self._current, _Generation(op)
+            old.retired = True
+            old.release = release
+            drained = old.in_flight == 0
+            if not drained:
+                self._retired.append(old)
+        if drained:
+            self._release(old)
+        return old.op
+
+    def _release(self, generation):
+        with self._cond:
+            if generation in self._retired:
+                self._retired.remove(generation)
+            self._cond.notify_all()
+        release = self.release if generation.release is None else generation.release
+        if generation.op is not None and release is not None:
+            release(generation.op)
+
+    def drain(self, timeout: Optional[float] = None):
+        """
+        Wait until every replaced op has been released. Returns False if `timeout` expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._retired, timeout)
+
+    def load(self, factory: Callable, warmup: bool = True, warmup_args=None, warmup_timeout: float = 5.0) -> Future:
+        """
+        Call `factory()` on a background thread to build a new op, warm it up with one call and swap it in. If `warmup`
+        is True the call is made with `warmup_args`, a tuple of arguments for the op, or else a copy of the arguments of
+        the next call to arrive within `warmup_timeout` seconds (no warm-up is done if none does). Returns a `Future`
+        of the replaced op; if building or warming up the new op fails, the current op stays and the future holds the
+        exception, and if another load is started before this one swaps, the future is cancelled.
+        """
+        future = Future()
+        with self._cond:
+            self._loads += 1
+            load = self._loads
+        args = (factory, warmup, warmup_args, warmup_timeout, future, load)
+        threading.Thread(target=self._load, args=args, name="op-loader", daemon=True).start()
+        return future
+
+    def _load(self, factory, warmup, warmup_args, warmup_timeout, future, load):
+        sample = None
+        try:
+            if warmup and warmup_args is None:
+                sample = Future()
+                with self._cond:
+                    self._sample = sample
+            op = factory()
+            if warmup:
+                if warmup_args is None:
+                    try:
+                        warmup_args = sample.result(warmup_timeout)
+                    except FutureTimeoutError:
+                        warmup_args = None
+                if warmup_args is not None:
+                    op(*warmup_args)
+            with self._cond:
+                latest = load == self._loads
+                if latest:
+                    self.warmup_args = warmup_args
+            if not latest:
+                future.cancel()
+                if self.release is not None:
+                    self.release(op)
+                return
+            future.set_result(self.swap(op))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            if sample is not None:
+                with self._cond:
+                    if self._sample is sample:
+                        self._sample = None
@@ -9,22 +9,188 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from queue import Queue
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from queue import Empty, Full
+from threading import Condition
+from typing import Any, NamedTuple, Optional
+
+from monai.data import decollate_batch
 from monai.transforms import Transform
 from monai.utils.enums import CommonKeys
 
+from monaistream.streamrunner.metrics import DROPPED_FRAMES, QUEUE_DEPTH, default_registry
+
+__all__ = ["SINK_POLICIES", "SinkResult", "SinkStats", "StreamSinkTransform"]
+
+
+# what happens to new results arriving at a full sink, named as the runners' queue policies
+SINK_POLICIES = ("block", "drop-oldest", "drop-newest", "keep-latest")
+
+_instances = itertools.count()
+
+
+class SinkResult(NamedTuple):
+    result: Any
+    frame_id: Any = None
+    timestamp: Any = None
+
+
+@dataclass
+class SinkStats:
+    received: int = 0
+    dropped: int = 0
+    depth: int = 0
+    max_depth: int = 0
+
 
 class StreamSinkTransform(Transform):
-    def __init__(self, result_key: str = CommonKeys.PRED, buffer_size: int = 0, timeout: float = 1.0):
+    """
+    Final postprocessing transform of a streaming engine, which collects `data[result_key]` for a consumer on another
+    thread to read with `get_result` or `get_results`.
+
+    With `decollate`, the result is a batch that is split with `decollate_batch` into one result per frame, so a
+    batched evaluator's consumer still gets frames one at a time. Each result is tagged with the frame id and timestamp
+    found under `id_key` and `timestamp_key` in the data, or its `result_key` meta dict, which are indexed per frame
+    when decollating; `tagged=True` returns them with the results as `SinkResult` tuples.
+
+    At most `buffer_size` results are held, if greater than 0, and `policy` decides what happens to new results
+    arriving when the sink is full: "block" waits for room for at most `timeout` seconds then raises `queue.Full`,
+    stalling the engine, "drop-oldest" discards the oldest held result, "drop-newest" discards the new one, and
+    "keep-latest" only ever holds the newest result so a slow consumer never falls behind. With "block" the results of
+    one call are added together once there is room for all of them (or the sink is empty, for a batch larger than
+    `buffer_size`), so a timeout never leaves part of a batch behind. The backlog and the number of dropped results are
+    in `stats`, and are reported into `metrics` (the default registry if None) labelled with `name`, which must be
+    unique among the sinks reporting into it and defaults to one numbered per instance; `close` stops reporting them.
+    """
+
+    def __init__(
+        self,
+        result_key: str = CommonKeys.PRED,
+        buffer_size: int = 0,
+        timeout: float = 1.0,
+        policy: str = "block",
+        decollate: bool = False,
+        id_key: Optional[str] = None,
+        timestamp_key: Optional[str] = None,
+        metrics=None,
+        name: Optional[str] = None,
+    ):
         super().__init__()
+        if policy not in SINK_POLICIES:
+            raise ValueError(f"unknown sink policy {policy}; must be one of {SINK_POLICIES}")
         self.result_key = result_key
         self.buffer_size = buffer_size
         self.timeout = timeout
-        self.queue: Queue = Queue(self.buffer_size)
+        self.policy = policy
+        self.decollate = decollate
+        self.id_key = id_key
+        self.timestamp_key = timestamp_key
+        self.name = f"{type(self).__name__}{next(_instances)}" if name is None else name
+        self._results = deque()
+        self._stats = SinkStats()
+        self._cond = Condition()
+        self._metrics = default_registry if metrics is None else metrics
+        self._metrics.add_collector(self._collect_metrics, labels=self._metrics_labels)
+
+    @property
+    def stats(self):
+        """
+        A copy of the numbers of results received and dropped and the current and largest backlog.
+        """
+        with self._cond:
+            return SinkStats(self._stats.received, self._stats.dropped, len(self._results), self._stats.max_depth)
+
+    def close(self):
+        """
+        Stop reporting this sink's metrics.
+        """
+        self._metrics.remove_collector(self._collect_metrics)
+
+    @property
+    def backlog(self):
+        with self._cond:
+            return len(self._results)
+
+    def _metrics_labels(self):
+        return dict(element=self.name)
+
+    def _collect_metrics(self):
+        stats = self.stats
+        yield QUEUE_DEPTH, dict(element=self.name, pad="sink"), stats.depth
+        yield DROPPED_FRAMES, dict(element=self.name, reason="sink"), stats.dropped
+
+    def _tag(self, data, key):
+        if key is None:
+            return None
+        if key in data:
+            return data[key]
+        meta = data.get(f"{self.result_key}_meta_dict")
+        return None if meta is None else meta.get(key)
+
+    def _split(self, data):
+        result = data[self.result_key]
+        frame_id = self._tag(data, self.id_key)
+        timestamp = self._tag(data, self.timestamp_key)
+        if not self.decollate:
+            return [SinkResult(result, frame_id, timestamp)]
+        results = decollate_batch(result, detach=False)
+        # tags are detached so tensors of ids and timestamps become plain numbers
+        ids = [None] * len(results) if frame_id is None else decollate_batch(frame_id)
+        timestamps = [None] * len(results) if timestamp is None else decollate_batch(timestamp)
+        return [SinkResult(*r) for r in zip(results, ids, timestamps)]
 
     def __call__(self, data):
-        self.queue.put(data[self.result_key], timeout=self.timeout)
+        results = self._split(data)
+        with self._cond:
+            if self.policy == "block" and self.buffer_size > 0:
+                room = max(0, self.buffer_size - len(results))
+                if not self._cond.wait_for(lambda: len(self._results) <= room, self.timeout):
+                    raise Full()
+            for r in results:
+                self._add(r)
         return data
 
-    def get_result(self):
-        return self.queue.get(timeout=self.timeout)
+    def _add(self, result):
+        """
+        Add one result, applying the overflow policy. Called with `_cond` held, after waiting for room for "block".
+        """
+        self._stats.received += 1
+        if self.policy == "keep-latest":
+            self._stats.dropped += len(self._results)
+            self._results.clear()
+        elif 0 < self.buffer_size <= len(self._results):
+            if self.policy == "drop-newest":
+                self._stats.dropped += 1
+                return
+            if self.policy == "drop-oldest":
+                self._results.popleft()
+                self._stats.dropped += 1
+        self._results.append(result)
+        self._stats.max_depth = max(self._stats.max_depth, len(self._results))
+        self._cond.notify_all()
+
+    def get_result(self, tagged: bool = False):
+        """
+        Wait for at most `timeout` seconds for the next result and return it, raising `queue.Empty` if there is none.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._results, self.timeout):
+                raise Empty()
+            result = self._results.popleft()
+            self._cond.notify_all()
+        return result if tagged else result.result
+
+    def get_results(self, max_n: Optional[int] = None, timeout: float = 0.0, tagged: bool = False):
+        """
+        Take up to `max_n` results (all held results if None) at once, waiting for at most `timeout` seconds for the
+        first. Returns an empty list if there were none.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._results, timeout)
+            count = len(self._results) if max_n is None else min(max_n, len(self._results))
+            results = [self._results.popleft() for _ in range(count)]
+            if results:
+                self._cond.notify_all()
+        return results if tagged else [r.result for r in results]
@@ -1,11 +1,15 @@
+import threading
 import unittest
+from queue import Empty
 
+from ignite.engine import Events
 from ignite.engine.engine import Engine
 
 import monai
 from monai.engines import Workflow
 
 from monaistream.streamrunner.adaptors import IgniteEngineAdaptor
+from monaistream.transforms.gstreamer.streaming_sink_transform import StreamSinkTransform
 
 
 class TestIgniteEngineAdaptor(unittest.TestCase):
@@ -48,9 +52,69 @@ class TestIgniteEngineAdaptor(unittest.TestCase):
         ie = IgniteEngineAdaptor(e, dl)
         for i in range(10):
             result = ie(i)
-            outputs.append(result.output)
+            outputs.append(result)
 
         self.assertSequenceEqual(outputs, [i for i in range(10)])
 
+    def test_persistent_engine_adaptor(self):
+        runs = list()
+
+        e = Engine(lambda engine, batch: batch * 2)
+        e.add_event_handler(Events.STARTED, lambda: runs.append(e.state.iteration))
+        ie = IgniteEngineAdaptor(e, persistent=True, timeout=5.0)
+
+        outputs = [ie(i) for i in range(10)]
+        self.assertTrue(ie.running)
+        ie.stop()
+
+        self.assertSequenceEqual(outputs, [i * 2 for i in range(10)])
+        self.assertEqual(runs, [0])
+        self.assertEqual(e.state.iteration, 10)
+        self.assertFalse(ie.running)
+
+        # a stopped adaptor starts a new run when called again
+        self.assertEqual(ie(21), 42)
+        ie.stop()
+        self.assertEqual(len(runs), 2)
+
+    def test_persistent_engine_error(self):
+        def fail(engine, batch):
+            raise ValueError("bad frame")
+
+        ie = IgniteEngineAdaptor(Engine(fail), persistent=True, timeout=5.0)
+        with self.assertRaises(RuntimeError) as raised:
+            ie(0)
+        self.assertIsInstance(raised.exception.__cause__, ValueError)
+        ie.stop()
+
+    def test_late_result_is_discarded(self):
+        release = threading.Event()
+
+        def process(engine, batch):
+            if batch == 0:
+                release.wait(5.0)
+            return batch * 2
+
+        ie = IgniteEngineAdaptor(Engine(process), persistent=True, timeout=0.2)
+        with self.assertRaises(Empty):
+            ie(0)
+        release.set()
+        ie.timeout = 5.0
+        self.assertEqual(ie(1), 2)  # not the late result of the first call
+        self.assertEqual(ie(2), 4)
+        ie.stop()
+
+    def test_dropped_sink_result(self):
+        sink = StreamSinkTransform(result_key="pred", name="test_dropped_sink_result")
+        # negative frames never reach the sink, as if its policy had dropped them
+        e = Engine(lambda engine, batch: sink({"pred": batch}) if batch >= 0 else None)
+        ie = IgniteEngineAdaptor(e, persistent=True, sink=sink, timeout=5.0)
+        self.assertEqual(ie(1), 1)
+        with self.assertRaises(RuntimeError):
+            ie(-1)
+        self.assertEqual(ie(2), 2)
+        ie.stop()
+
+
 if __name__ == "__main__":
     unittest.main()
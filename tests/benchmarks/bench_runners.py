@@ -0,0 +1,263 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Headless micro-benchmarks of the runner elements. Each case runs `videotestsrc num-buffers=N ! runner ! fakesink`
+(one source per input for the multi-input runners) with an identity `do_op`, so it measures the cost of the runner
+itself: throughput, per-frame latency from the runner's first sink pad to its first src pad, and peak RSS. Every case
+runs in its own process so that peak RSS is per case and a crashing runner does not end the sweep.
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_runners --num-buffers 300 --output baseline.json
+    python -m tests.benchmarks.bench_runners --num-buffers 300 --output new.json --baseline baseline.json
+
+With `--baseline` the exit status is 1 if any case regressed by more than `--threshold`.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from tests.benchmarks.results import compare, format_comparison, load_results, save_results, summarise
+
+RUNNERS = ("inplace", "adaptor", "backend", "aggregator", "aggregator2", "aggregator3")
+MULTI_INPUT_RUNNERS = ("backend", "aggregator", "aggregator2", "aggregator3")
+RESULT_MARKER = "BENCHMARK_RESULT "
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def create_runner(case):
+    """
+    Create the runner element of `case`, with an identity `do_op` that only converts its inputs to the array type.
+    """
+    from gi.repository import Gst
+
+    from monaistream.streamrunner.arrays import to_array_type
+    from monaistream.streamrunner.gstreamer.utils import PadEntry, register
+
+    array_type = case["array_type"]
+    runner = case["runner"]
+
+    if runner == "backend":
+        from monaistream.streamrunner.gstreamer.backend import GstStreamRunnerBackend
+
+        caps = video_caps(case)
+        return GstStreamRunnerBackend(
+            inputs=[PadEntry(f"sink_{i}", caps) for i in range(case["inputs"])],
+            outputs=[PadEntry(f"src_{i}", caps) for i in range(case["inputs"])],
+            do_op=lambda data: data,
+            array_type=array_type,
+        )
+
+    from monaistream.streamrunner import gstreamer_plugin
+
+    if runner == "inplace":
+
+        class BenchRunner(gstreamer_plugin.GstInPlaceStreamRunner):
+            def do_op(self, data):
+                to_array_type(data, array_type)
+
+    elif runner == "adaptor":
+
+        class BenchRunner(gstreamer_plugin.GstAdaptorStreamRunner):
+            def do_op(self, in_data, out_data):
+                to_array_type(in_data, array_type)
+                gstreamer_plugin.copy_frame(in_data, out_data)
+
+    else:
+        base = {
+            "aggregator": gstreamer_plugin.GstMultiInputStreamRunner,
+            "aggregator2": gstreamer_plugin.GstMultiInputStreamRunner2,
+            "aggregator3": gstreamer_plugin.GstMultiInputStreamRunner3,
+        }[runner]
+
+        class BenchRunner(base):
+            def do_op(self, images):
+                to_array_type(images[0], array_type)
+                return images[0]
+
+    alias = f"bench{runner}"
+    register(BenchRunner, alias)
+    element = Gst.ElementFactory.make(alias, "runner")
+    if element is None:
+        raise RuntimeError(f"Failed to create {alias}")
+    return element
+
+
+def video_caps(case):
+    return f"video/x-raw,format={case['format']},width={case['width']},height={case['height']},framerate=30/1"
+
+
+def run_case(case, num_buffers, timeout):
+    """
+    Run one case in this process and return its result record.
+    """
+    import gi
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    Gst.init(None)
+
+    pipeline = Gst.Pipeline.new("bench")
+    runner = create_runner(case)
+    pipeline.add(runner)
+
+    caps = video_caps(case)
+    for i in range(case["inputs"]):
+        source = Gst.parse_bin_from_description(f"videotestsrc num-buffers={num_buffers} ! {caps}", True)
+        pipeline.add(source)
+        if not source.link(runner):
+            raise RuntimeError(f"Failed to link input {i}")
+
+    # the aggregators take their output caps from downstream
+    sink_description = "fakesink sync=false"
+    if case["runner"] in ("aggregator", "aggregator2", "aggregator3"):
+        sink_description = f"capsfilter caps={caps} ! {sink_description}"
+    for srcpad in runner.srcpads:
+        sink = Gst.parse_bin_from_description(sink_description, True)
+        pipeline.add(sink)
+        if srcpad.link(sink.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link output {srcpad.get_name()}")
+
+    arrivals = dict()
+    latencies = list()
+    times = dict(first_in=None, last_out=None, frames=0)
+
+    def on_input(pad, info):
+        now = time.perf_counter()
+        arrivals.setdefault(info.get_buffer().pts, now)
+        if times["first_in"] is None:
+            times["first_in"] = now
+        return Gst.PadProbeReturn.OK
+
+    def on_output(pad, info):
+        now = time.perf_counter()
+        start = arrivals.pop(info.get_buffer().pts, None)
+        if start is not None:
+            latencies.append(now - start)
+        times["last_out"] = now
+        times["frames"] += 1
+        return Gst.PadProbeReturn.OK
+
+    runner.sinkpads[0].add_probe(Gst.PadProbeType.BUFFER, on_input)
+    runner.srcpads[0].add_probe(Gst.PadProbeType.BUFFER, on_output)
+
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(
+        int(timeout * Gst.SECOND), Gst.MessageType.EOS | Gst.MessageType.ERROR
+    )
+    pipeline.set_state(Gst.State.NULL)
+
+    if message is None:
+        raise RuntimeError(f"Timed out after {timeout}s")
+    if message.type == Gst.MessageType.ERROR:
+        error, debug = message.parse_error()
+        raise RuntimeError(f"{error.message} ({debug})")
+
+    if times["frames"] == 0:
+        raise RuntimeError("No frames were output")
+    elapsed = times["last_out"] - times["first_in"]
+    return summarise(case, times["frames"], elapsed, latencies, peak_rss_kb())
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 1024.0 if sys.platform == "darwin" else float(peak)
+
+
+def run_case_subprocess(case, num_buffers, timeout):
+    command = [
+        sys.executable, "-m", "tests.benchmarks.bench_runners",
+        "--run-case", json.dumps(case), "--num-buffers", str(num_buffers), "--timeout", str(timeout),
+    ]
+    try:
+        proc = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, timeout=timeout + 30)
+    except subprocess.TimeoutExpired:
+        return dict(case, error="timed out")
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    stderr = proc.stderr.strip().splitlines()
+    return dict(case, error=stderr[-1] if stderr else f"exited with status {proc.returncode}")
+
+
+def sweep(runners, resolutions, formats, input_counts, array_types):
+    for runner, (width, height), format, inputs, array_type in itertools.product(
+        runners, resolutions, formats, input_counts, array_types
+    ):
+        if inputs > 1 and runner not in MULTI_INPUT_RUNNERS:
+            continue
+        if inputs < 2 and runner.startswith("aggregator"):
+            continue
+        yield dict(runner=runner, width=width, height=height, format=format, inputs=inputs, array_type=array_type)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", default=",".join(RUNNERS))
+    parser.add_argument("--resolutions", default="640x480,1920x1080")
+    parser.add_argument("--formats", default="RGB,RGBA,NV12")
+    parser.add_argument("--inputs", default="1,2")
+    parser.add_argument("--array-types", default="numpy,torch")
+    parser.add_argument("--num-buffers", type=int, default=300)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per case")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.run_case is not None:
+        result = run_case(json.loads(args.run_case), args.num_buffers, args.timeout)
+        print(RESULT_MARKER + json.dumps(result), flush=True)
+        return 0
+
+    results = list()
+    for case in sweep(
+        args.runners.split(","),
+        [tuple(int(v) for v in r.split("x")) for r in args.resolutions.split(",")],
+        args.formats.split(","),
+        [int(n) for n in args.inputs.split(",")],
+        args.array_types.split(","),
+    ):
+        result = run_case_subprocess(case, args.num_buffers, args.timeout)
+        results.append(result)
+        if result.get("error"):
+            print(f"{case}: FAILED {result['error']}")
+        else:
+            p99 = result["latency_ms"]["p99"]
+            print(f"{case}: {result['fps']:.1f} fps, p99 {p99 or 0.0:.2f} ms, {result['peak_rss_mb']:.0f} MiB")
+
+    save_results(results, args.output)
+    print(f"wrote {len(results)} results to {args.output}")
+
+    if args.baseline is not None:
+        rows = compare(results, load_results(args.baseline), args.threshold)
+        print(format_comparison(rows))
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Summaries of benchmark runs and comparison against a baseline, kept free of GStreamer so they can be used and tested
+anywhere.
+"""
+
+import json
+import platform
+import sys
+
+CASE_KEYS = ("runner", "width", "height", "format", "inputs", "array_type")
+
+
+def percentile(values, q):
+    """
+    Linearly interpolated percentile `q` (0-100) of `values`, or None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def summarise(case, frames, elapsed, latencies, peak_rss_kb):
+    """
+    Build the result record of one case: throughput in frames per second, per-frame latency percentiles in
+    milliseconds and the peak resident set size of the process running it in MiB.
+    """
+    latencies_ms = [t * 1e3 for t in latencies]
+    return dict(
+        case,
+        frames=frames,
+        elapsed_s=elapsed,
+        fps=frames / elapsed if elapsed > 0 else None,
+        latency_ms={f"p{q}": percentile(latencies_ms, q) for q in (50, 90, 99)},
+        peak_rss_mb=peak_rss_kb / 1024.0,
+    )
+
+
+def case_key(result):
+    return tuple(result.get(k) for k in CASE_KEYS)
+
+
+def save_results(results, path):
+    report = dict(python=sys.version.split()[0], platform=platform.platform(), results=results)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare each result with the baseline result of the same case. A case regresses if its fps dropped, or its p99
+    latency or peak RSS grew, by more than `threshold` (a fraction). Returns a list of per-case rows with the relative
+    changes and the names of the regressed metrics; cases missing from either side or that failed are not compared.
+    """
+    base = {case_key(r): r for r in baseline if not r.get("error")}
+    rows = list()
+    for result in results:
+        old = base.get(case_key(result))
+        if old is None or result.get("error"):
+            continue
+        changes = dict(
+            fps=_change(result.get("fps"), old.get("fps")),
+            p99_ms=_change(result["latency_ms"].get("p99"), old["latency_ms"].get("p99")),
+            peak_rss_mb=_change(result.get("peak_rss_mb"), old.get("peak_rss_mb")),
+        )
+        regressed = [
+            name
+            for name, change in changes.items()
+            if change is not None and (change < -threshold if name == "fps" else change > threshold)
+        ]
+        rows.append(dict(case=dict(zip(CASE_KEYS, case_key(result))), changes=changes, regressed=regressed))
+    return rows
+
+
+def _change(new, old):
+    if new is None or not old:
+        return None
+    return (new - old) / old
+
+
+def format_comparison(rows):
+    lines = list()
+    for row in rows:
+        case = row["case"]
+        name = (
+            f"{case['runner']} {case['width']}x{case['height']} {case['format']} x{case['inputs']} {case['array_type']}"
+        )
+        changes = ", ".join(f"{k} {v:+.1%}" for k, v in row["changes"].items() if v is not None)
+        flag = f"  REGRESSED: {', '.join(row['regressed'])}" if row["regressed"] else ""
+        lines.append(f"{name}: {changes}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,39 @@
+import unittest
+
+from tests.benchmarks.results import compare, percentile, summarise
+
+
+def result(fps, p99, rss=100.0, **case):
+    case = dict(dict(runner="backend", width=640, height=480, format="RGB", inputs=1, array_type="numpy"), **case)
+    return dict(case, fps=fps, latency_ms={"p50": p99 / 2, "p90": p99, "p99": p99}, peak_rss_mb=rss)
+
+
+class TestBenchmarkResults(unittest.TestCase):
+
+    def test_summarise(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertIsNone(percentile([], 99))
+
+        summary = summarise(dict(runner="inplace"), 100, 2.0, [0.001] * 99 + [0.011], 2048)
+        self.assertEqual(summary["fps"], 50.0)
+        self.assertAlmostEqual(summary["latency_ms"]["p50"], 1.0)
+        self.assertGreater(summary["latency_ms"]["p99"], 1.0)
+        self.assertEqual(summary["peak_rss_mb"], 2.0)
+
+    def test_compare(self):
+        baseline = [result(100.0, 10.0), result(50.0, 20.0, runner="inplace")]
+        results = [
+            result(85.0, 10.5),
+            result(52.0, 19.0, runner="inplace"),
+            result(10.0, 1.0, runner="adaptor"),
+        ]
+        rows = compare(results, baseline, threshold=0.1)
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["regressed"], ["fps"])
+        self.assertAlmostEqual(rows[0]["changes"]["fps"], -0.15)
+        self.assertEqual(rows[1]["regressed"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
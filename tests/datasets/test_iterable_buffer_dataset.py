@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+from queue import Full
+
+import numpy as np
+
+from monaistream.datasets.gstreamer.iterable_buffer_dataset import IterableBufferDataset
+
+STOP = IterableBufferDataset.STOP
+
+
+class TestIterableBufferDataset(unittest.TestCase):
+
+    def test_items_until_stop(self):
+        ds = IterableBufferDataset(lambda x: x * 2)
+        for i in range(3):
+            ds.add_item(i)
+        ds.add_item(STOP)
+        self.assertSequenceEqual(list(ds), [0, 2, 4])
+        self.assertFalse(ds.is_running)
+
+    def test_array_items(self):
+        ds = IterableBufferDataset(lambda x: x)
+        frames = [np.full((2, 2), i) for i in range(2)]
+        for f in frames:
+            ds.add_item(f)
+        ds.add_item(STOP)
+        self.assertSequenceEqual([f[0, 0] for f in ds], [0, 1])
+
+    def test_consumer_waits_for_producer(self):
+        ds = IterableBufferDataset(lambda x: x)
+
+        def produce():
+            for i in range(5):
+                time.sleep(0.01)
+                ds.add_item(i)
+            ds.add_item(STOP)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        self.assertSequenceEqual(list(ds), list(range(5)))
+        producer.join()
+
+    def test_stop_wakes_consumer(self):
+        ds = IterableBufferDataset(lambda x: x)
+        result = list()
+        consumer = threading.Thread(target=lambda: result.extend(ds))
+        consumer.start()
+        time.sleep(0.05)
+        ds.stop()
+        consumer.join(1.0)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(result, [])
+
+    def test_batches(self):
+        ds = IterableBufferDataset(lambda x: x, batch_size=3, max_wait=0.0)
+        for i in range(7):
+            ds.add_item(i)
+        ds.add_item(STOP)
+        self.assertSequenceEqual(list(ds), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_batch_deadline(self):
+        ds = IterableBufferDataset(lambda x: x, batch_size=4, max_wait=0.05)
+        batches = list()
+        consumer = threading.Thread(target=lambda: batches.extend(ds))
+        consumer.start()
+
+        ds.add_item(0)
+        ds.add_item(1)
+        time.sleep(0.2)  # the first batch is yielded short once the deadline passes
+        ds.add_item(2)
+        ds.add_item(STOP)
+        consumer.join(1.0)
+
+        self.assertSequenceEqual(batches, [[0, 1], [2]])
+
+    def test_overflow_drop_oldest(self):
+        ds = IterableBufferDataset(lambda x: x, buffer_size=2, overflow="drop-oldest")
+        for i in range(5):
+            self.assertTrue(ds.add_item(i))
+        ds.add_item(STOP)
+        self.assertSequenceEqual(list(ds), [3, 4])
+        self.assertEqual(ds.dropped, 3)
+
+    def test_overflow_drop_newest(self):
+        ds = IterableBufferDataset(lambda x: x, buffer_size=2, overflow="drop-newest")
+        self.assertSequenceEqual([ds.add_item(i) for i in range(4)], [True, True, False, False])
+        ds.add_item(STOP)
+        self.assertSequenceEqual(list(ds), [0, 1])
+        self.assertEqual(ds.dropped, 2)
+
+    def test_overflow_block(self):
+        ds = IterableBufferDataset(lambda x: x, buffer_size=1)
+        ds.add_item(0)
+        with self.assertRaises(Full):
+            ds.add_item(1, timeout=0.01)
+
+        consumed = list()
+        consumer = threading.Thread(target=lambda: consumed.extend(ds))
+        consumer.start()
+        ds.add_item(1)  # waits until the consumer has taken 0
+        ds.add_item(STOP)
+        consumer.join(1.0)
+        self.assertSequenceEqual(consumed, [0, 1])
+
+    def test_clear(self):
+        ds = IterableBufferDataset(lambda x: x)
+        ds.add_item(0)
+        ds.add_item(STOP)
+        ds.clear()
+        ds.add_item(1)
+        ds.add_item(STOP)
+        self.assertSequenceEqual(list(ds), [1])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            IterableBufferDataset(lambda x: x, overflow="drop-everything")
+        with self.assertRaises(ValueError):
+            IterableBufferDataset(lambda x: x, batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
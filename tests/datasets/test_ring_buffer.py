@@ -0,0 +1,113 @@
+import threading
+import unittest
+from queue import Full
+
+import numpy as np
+import torch
+
+from monaistream.datasets.gstreamer.iterable_buffer_dataset import IterableBufferDataset
+from monaistream.datasets.gstreamer.ring_buffer import FrameRingBuffer
+
+STOP = IterableBufferDataset.STOP
+
+
+def frame(value, shape=(2, 3)):
+    return np.full(shape, value, np.uint8)
+
+
+class TestFrameRingBuffer(unittest.TestCase):
+
+    def test_slots_round_robin(self):
+        ring = FrameRingBuffer(3, (2, 3))
+        self.assertEqual([ring.write(frame(i)) for i in range(3)], [0, 1, 2])
+        self.assertIsNone(ring.try_acquire())
+        with self.assertRaises(Full):
+            ring.acquire(timeout=0.01)
+
+        ring.release([1])
+        self.assertEqual(ring.free_slots, 1)
+        self.assertEqual(ring.acquire(), 1)
+        ring.release([0, 1, 2])
+        self.assertEqual(ring.acquire(), 2)  # continues after the last slot handed out
+
+    def test_views_share_storage(self):
+        ring = FrameRingBuffer(4, (2, 3), array_type="torch")
+        for i in range(3):
+            ring.write(torch.full((2, 3), i, dtype=torch.uint8))
+        batch = ring.view(0, 3)
+        self.assertIsInstance(batch, torch.Tensor)
+        self.assertEqual(batch.data_ptr(), ring.storage.data_ptr())
+        self.assertEqual(batch[:, 0, 0].tolist(), [0, 1, 2])
+        with self.assertRaises(ValueError):
+            ring.view(3, 2)
+
+    def test_invalid_writes(self):
+        ring = FrameRingBuffer(2, (2, 3))
+        with self.assertRaises(ValueError):
+            ring.write(frame(0, (3, 2)))
+        self.assertEqual(ring.free_slots, 2)
+        self.assertEqual(ring.write(frame(0)), 1)
+        with self.assertRaises(ValueError):
+            ring.release([0])
+
+
+class TestRingBufferDataset(unittest.TestCase):
+
+    def test_batches_are_views(self):
+        ring = FrameRingBuffer(8, (2, 3))
+        ds = IterableBufferDataset(lambda x: x, batch_size=3, storage=ring)
+        for i in range(5):
+            ds.add_item(frame(i))
+        ds.add_item(STOP)
+
+        pointers, values, free = list(), list(), list()
+        for batch in ds:
+            pointers.append(batch.__array_interface__["data"][0])
+            values.append(batch[:, 0, 0].tolist())
+            free.append(ring.free_slots)
+
+        self.assertEqual(values, [[0, 1, 2], [3, 4]])
+        self.assertEqual(free, [3, 6])  # each batch's slots are released when the next is taken
+        self.assertEqual(pointers[0], ring.storage.__array_interface__["data"][0])
+        self.assertEqual(ring.free_slots, 8)
+
+    def test_batches_stop_at_the_end_of_the_ring(self):
+        ring = FrameRingBuffer(4, (2, 3))
+        ring.release([ring.acquire(), ring.acquire(), ring.acquire()])  # the next slot handed out is the last one
+        ds = IterableBufferDataset(lambda x: x.copy(), batch_size=4, storage=ring)
+        for i in range(3):
+            ds.add_item(frame(i))
+        ds.add_item(STOP)
+        self.assertEqual([b[:, 0, 0].tolist() for b in ds], [[0], [1, 2]])
+
+    def test_producer_waits_for_released_slots(self):
+        ring = FrameRingBuffer(2, (2, 3))
+        ds = IterableBufferDataset(lambda x: int(x[0, 0]), storage=ring)
+        consumed = list()
+        consumer = threading.Thread(target=lambda: consumed.extend(ds))
+        consumer.start()
+        for i in range(6):
+            ds.add_item(frame(i))
+        ds.add_item(STOP)
+        consumer.join(1.0)
+        self.assertEqual(consumed, list(range(6)))
+
+    def test_drop_oldest_reuses_slots(self):
+        ring = FrameRingBuffer(2, (2, 3))
+        ds = IterableBufferDataset(lambda x: int(x[0, 0]), storage=ring, overflow="drop-oldest")
+        for i in range(5):
+            ds.add_item(frame(i))
+        ds.add_item(STOP)
+        self.assertEqual(list(ds), [3, 4])
+        self.assertEqual(ds.dropped, 3)
+
+    def test_clear_releases_slots(self):
+        ring = FrameRingBuffer(2, (2, 3))
+        ds = IterableBufferDataset(lambda x: x, storage=ring, overflow="drop-newest")
+        self.assertEqual([ds.add_item(frame(i)) for i in range(3)], [True, True, False])
+        ds.clear()
+        self.assertEqual(ring.free_slots, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
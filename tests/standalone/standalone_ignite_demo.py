@@ -28,7 +28,7 @@ class DummyModel:
 
 if __name__ == "__main__":
     engine = Engine(DummyModel())
-    adaptor = IgniteEngineAdaptor(engine)
+    adaptor = IgniteEngineAdaptor(engine, persistent=True)
 
     input_configs = [
         PadEntry("sink_0", "video/x-raw,format=BGR,width=256,height=256"),
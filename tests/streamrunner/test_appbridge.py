@@ -0,0 +1,112 @@
+import threading
+import unittest
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestAppBridgeBin(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+
+        Gst.init(None)
+        self.Gst = Gst
+
+    def test_feeder_created_when_caps_known(self):
+        from monaistream.streamrunner.gstreamer.appbridge import AppBridgeBin
+
+        # building the bin does not need the appsrc's caps yet
+        bridge = AppBridgeBin("appsrc name=myappsrc ! fakesink")
+        with self.assertRaises(ValueError):
+            bridge.feeder
+        bridge.get_by_name("myappsrc").set_property(
+            "caps", self.Gst.Caps.from_string("video/x-raw,format=RGB,width=8,height=8,framerate=10/1")
+        )
+        self.assertIs(bridge.feeder, bridge.feeder)
+        self.assertEqual(bridge.feeder.duration, self.Gst.SECOND // 10)
+
+    def test_reader_restarts_after_flushing_seek(self):
+        from monaistream.streamrunner.gstreamer.appbridge import AppBridgeBin
+
+        Gst = self.Gst
+        received = list()
+        more = threading.Event()
+
+        def on_samples(samples):
+            received.extend(samples)
+            more.set()
+
+        bridge = AppBridgeBin(
+            "videotestsrc ! video/x-raw,format=RGB,width=8,height=8,framerate=30/1 ! appsink name=myappsink",
+            on_samples=on_samples,
+        )
+        pipeline = Gst.Pipeline()
+        pipeline.add(bridge)
+        bus = pipeline.get_bus()
+
+        def play_first_frames():
+            # a flushing seek to the first 100ms, which ends in EOS
+            flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+            self.assertTrue(
+                pipeline.seek(1.0, Gst.Format.TIME, flags, Gst.SeekType.SET, 0, Gst.SeekType.SET, 100 * Gst.MSECOND)
+            )
+            pipeline.set_state(Gst.State.PLAYING)
+            message = bus.timed_pop_filtered(5 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+            self.assertEqual(message.type, Gst.MessageType.EOS)
+            self.assertTrue(more.wait(5.0))
+
+        try:
+            pipeline.set_state(Gst.State.PAUSED)
+            pipeline.get_state(5 * Gst.SECOND)
+            play_first_frames()
+
+            count = len(received)
+            more.clear()
+            play_first_frames()  # the reader thread ended at EOS and must read the restarted stream
+            self.assertGreater(len(received), count)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+
+@SkipIfNoModule("gi")
+class TestDynamicPipelineClass(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+
+        Gst.init(None)
+        self.Gst = Gst
+
+    def test_appsrc_without_caps(self):
+        from monaistream.streamrunner.gstreamer_noplugin import create_dynamic_pipeline_class
+
+        # the feeder is only built when data is first pushed, so construction does not need the caps
+        bridge = create_dynamic_pipeline_class("appsrc name=myappsrc ! fakesink")()
+        self.assertEqual(bridge.appsrc.get_name(), "myappsrc")
+        self.assertIsNone(bridge.appsink)
+        with self.assertRaises(ValueError):
+            bridge.push_data([])
+
+        bridge.appsrc.set_property("caps", self.Gst.Caps.from_string("video/x-raw,format=GRAY8,width=4,height=4"))
+        self.assertIs(bridge.feeder.appsrc, bridge.appsrc)
+
+    def test_new_sample_callback_connected_to_signal(self):
+        from monaistream.streamrunner.gstreamer_noplugin import create_dynamic_pipeline_class
+
+        bridge = create_dynamic_pipeline_class("videotestsrc ! appsink name=myappsink", lambda appsink: None)()
+        self.assertTrue(bridge.appsink.get_property("emit-signals"))
+        self.assertIsNone(bridge.on_samples)
+
+        with self.assertRaises(ValueError):
+            create_dynamic_pipeline_class("fakesrc", lambda appsink: None, on_samples_callback=lambda samples: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import torch
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestArrayToBuffer(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+
+        Gst.init(None)
+        self.Gst = Gst
+
+    def read(self, buffer, shape, dtype=np.uint8):
+        is_mapped, map_info = buffer.map(self.Gst.MapFlags.READ)
+        self.assertTrue(is_mapped)
+        try:
+            return np.ndarray(shape, dtype=dtype, buffer=map_info.data).copy()
+        finally:
+            buffer.unmap(map_info)
+
+    def owned_frame(self, shape):
+        """Allocate a buffer and return it with a writable array over its mapped memory and the mapping to unmap."""
+        buffer = self.Gst.Buffer.new_allocate(None, int(np.prod(shape)), None)
+        is_mapped, map_info = buffer.map(self.Gst.MapFlags.READ | self.Gst.MapFlags.WRITE)
+        self.assertTrue(is_mapped)
+        self.addCleanup(buffer.unmap, map_info)
+        return buffer, np.ndarray(shape, dtype=np.uint8, buffer=map_info.data)
+
+    def test_copies_non_contiguous_array(self):
+        from monaistream.streamrunner.gstreamer.utils import array_to_buffer
+
+        # a (height, width, channels) permuted view of a channels-first tensor
+        tensor = torch.arange(3 * 4 * 5, dtype=torch.uint8).reshape(3, 4, 5)
+        buffer = array_to_buffer(tensor.permute(1, 2, 0))
+        self.assertEqual(buffer.get_size(), tensor.numel())
+        np.testing.assert_array_equal(self.read(buffer, (4, 5, 3)), tensor.permute(1, 2, 0).numpy())
+
+    def test_forwards_owner_buffer(self):
+        from monaistream.streamrunner.arrays import array_data_pointer
+        from monaistream.streamrunner.gstreamer.utils import array_to_buffer
+
+        owner, frame = self.owned_frame((4, 5, 3))
+        frame[...] = 7
+        owners = {array_data_pointer(frame): owner}
+
+        self.assertIs(array_to_buffer(frame, owners), owner)
+        # views which do not cover the whole owner buffer are copied into a new buffer
+        for view in (frame[:2], frame[:, ::2]):
+            with self.subTest(shape=view.shape):
+                buffer = array_to_buffer(view, owners)
+                self.assertIsNot(buffer, owner)
+                np.testing.assert_array_equal(self.read(buffer, view.shape), view)
+
+    def test_copies_timestamps(self):
+        from monaistream.streamrunner.arrays import array_data_pointer
+        from monaistream.streamrunner.gstreamer.utils import BufferTimestamps, array_to_buffer
+
+        Gst = self.Gst
+        source = Gst.Buffer.new_allocate(None, 1, None)
+        source.pts, source.dts, source.duration = 10 * Gst.MSECOND, 9 * Gst.MSECOND, 33 * Gst.MSECOND
+        source.offset, source.offset_end = 4, 5
+        timestamps = BufferTimestamps.from_buffer(source)
+
+        buffer = array_to_buffer(np.zeros((2, 2, 1), np.uint8), timestamp_source=timestamps)
+        self.assertEqual(BufferTimestamps.from_buffer(buffer), timestamps)
+
+        # a forwarded owner buffer is stamped in place
+        owner, frame = self.owned_frame((2, 2, 1))
+        self.assertIs(array_to_buffer(frame, {array_data_pointer(frame): owner}, source), owner)
+        self.assertEqual(BufferTimestamps.from_buffer(owner), timestamps)
+
+
+if __name__ == "__main__":
+    unittest.main()
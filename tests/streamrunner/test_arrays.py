@@ -0,0 +1,98 @@
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+import torch
+
+from monaistream.streamrunner.arrays import (
+    array_data_pointer,
+    array_types,
+    as_numpy,
+    get_array_type,
+    register_array_type,
+    to_array_type,
+)
+
+
+class DLPackOnly:
+    """Exposes an array only through the DLPack protocol."""
+
+    def __init__(self, array):
+        self._array = array
+
+    def __dlpack__(self, **kwargs):
+        return self._array.__dlpack__(**kwargs)
+
+    def __dlpack_device__(self):
+        return self._array.__dlpack_device__()
+
+
+class TestArrayTypes(unittest.TestCase):
+
+    def test_torch_round_trip_shares_memory(self):
+        frame = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        tensor = to_array_type(frame, "torch")
+        self.assertIsInstance(tensor, torch.Tensor)
+        self.assertEqual(array_data_pointer(tensor), array_data_pointer(frame))
+
+        view = as_numpy(tensor.permute(2, 0, 1))
+        self.assertEqual(view.shape, (3, 2, 4))
+        self.assertEqual(array_data_pointer(view), array_data_pointer(frame))
+
+    def test_planes(self):
+        planes = (np.zeros((4, 4), np.uint8), np.zeros((2, 2, 2), np.uint8))
+        tensors = to_array_type(planes, "torch")
+        self.assertEqual([t.shape for t in tensors], [(4, 4), (2, 2, 2)])
+        self.assertIs(to_array_type(planes, "numpy"), planes)
+
+    def test_read_only_frames_are_copied(self):
+        frame = np.zeros((2, 2, 3), np.uint8)
+        frame.flags.writeable = False
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            tensor = to_array_type(frame, "torch")
+        self.assertEqual([str(w.message) for w in caught], [])
+        self.assertNotEqual(array_data_pointer(tensor), array_data_pointer(frame))
+        tensor += 1  # writing to the tensor leaves the read-only memory untouched
+        self.assertEqual(int(frame.max()), 0)
+
+    def test_requires_grad_and_conj(self):
+        tensor = torch.ones(2, 3, requires_grad=True) * 2
+        np.testing.assert_array_equal(as_numpy(tensor), np.full((2, 3), 2.0, np.float32))
+        complex_tensor = torch.tensor([1 + 2j]).conj()
+        np.testing.assert_array_equal(as_numpy(complex_tensor), np.array([1 - 2j], np.complex64))
+
+    def test_dlpack_fallback(self):
+        array = np.arange(6, dtype=np.float32).reshape(2, 3)
+        view = as_numpy(DLPackOnly(array))
+        np.testing.assert_array_equal(view, array)
+        self.assertEqual(array_data_pointer(view), array_data_pointer(array))
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            get_array_type("cupy-but-misspelt")
+        with self.assertRaises(ValueError):
+            to_array_type(np.zeros(1), "cupy-but-misspelt")
+
+    def test_register(self):
+        # registered types are global, so put the registry back as it was for the other tests
+        registry = mock.patch.dict("monaistream.streamrunner.arrays._ARRAY_TYPES")
+        registry.start()
+        self.addCleanup(registry.stop)
+
+        class Wrapped:
+            def __init__(self, array):
+                self.array = array
+
+        register_array_type("wrapped", Wrapped, lambda w: w.array, lambda o: isinstance(o, Wrapped))
+        self.assertIn("wrapped", array_types())
+
+        frame = np.zeros((2, 2), np.uint8)
+        wrapped = to_array_type(frame, "wrapped")
+        self.assertIsInstance(wrapped, Wrapped)
+        self.assertIs(as_numpy(wrapped), frame)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+import numpy as np
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestQueuedInputSync(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+
+        Gst.init(None)
+        self.Gst = Gst
+
+    def feed(self, sinkpad, name):
+        """Link a source pad to `sinkpad` and send it the events that precede buffers."""
+        Gst = self.Gst
+        src = Gst.Pad.new(f"{name}_src", Gst.PadDirection.SRC)
+        self.assertEqual(src.link(sinkpad), Gst.PadLinkReturn.OK)
+        src.set_active(True)
+        src.push_event(Gst.Event.new_stream_start(name))
+        src.push_event(Gst.Event.new_caps(sinkpad.get_pad_template_caps()))
+        segment = Gst.Segment()
+        segment.init(Gst.Format.TIME)
+        src.push_event(Gst.Event.new_segment(segment))
+        return src
+
+    def push(self, src, ms):
+        """Push a 1x1 GRAY8 frame holding `ms`, with a PTS of `ms` milliseconds."""
+        buffer = self.Gst.Buffer.new_wrapped(bytes([ms]))
+        buffer.pts = ms * self.Gst.MSECOND
+        self.assertEqual(src.push(buffer), self.Gst.FlowReturn.OK)
+
+    def test_queued_inputs_aligned_on_timestamps(self):
+        from monaistream.streamrunner.gstreamer.backend import GstStreamRunnerBackend
+        from monaistream.streamrunner.gstreamer.utils import PadEntry
+
+        Gst = self.Gst
+        sets = list()
+        done = threading.Event()
+
+        def do_op(frames):
+            sets.append(tuple(int(np.asarray(f).flat[0]) for f in frames))
+            if len(sets) == 3:
+                done.set()
+            return [frames[0]]
+
+        caps = "video/x-raw,format=GRAY8,width=1,height=1,framerate=0/1"
+        backend = GstStreamRunnerBackend(
+            inputs=[PadEntry("sink_0", caps), PadEntry("sink_1", caps)],
+            outputs=[PadEntry("src_0", caps)],
+            do_op=do_op,
+            queue_policy="block",
+            sync_tolerance_ms=5,
+            primary_input="sink_1",
+        )
+        self.assertEqual(backend.set_state(Gst.State.PLAYING), Gst.StateChangeReturn.SUCCESS)
+        try:
+            secondary = self.feed(backend.get_static_pad("sink_0"), "sink_0")
+            primary = self.feed(backend.get_static_pad("sink_1"), "sink_1")
+            # the secondary input is ahead and offset from the primary by 2ms
+            for ms in (0, 10, 20, 30):
+                self.push(secondary, ms)
+            for ms in (12, 22, 32):
+                self.push(primary, ms)
+            self.assertTrue(done.wait(5.0))
+        finally:
+            backend.set_state(Gst.State.NULL)
+
+        # paired by closest timestamp, once per primary frame, rather than by queue position
+        self.assertEqual(sets, [(10, 12), (20, 22), (30, 32)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from contextlib import ExitStack
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestOutputPools(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+
+        Gst.init(None)
+        self.Gst = Gst
+
+    def caps(self, width=8, height=4, format="RGB"):
+        return self.Gst.Caps.from_string(f"video/x-raw,format={format},width={width},height={height},framerate=30/1")
+
+    def test_pool_requires_fixed_caps(self):
+        from monaistream.streamrunner.gstreamer.bufferpool import OutputBufferPool
+
+        with self.assertRaises(ValueError):
+            OutputBufferPool(self.Gst.Caps.from_string("video/x-raw,format=RGB,width=[1,16],height=4"))
+
+    def test_pool_buffers_sized_from_caps(self):
+        from monaistream.streamrunner.gstreamer.bufferpool import OutputBufferPool
+
+        pool = OutputBufferPool(self.caps(), min_buffers=2, max_buffers=2)
+        self.addCleanup(pool.close)
+        buffers = [pool.acquire(), pool.acquire()]
+        for buffer in buffers:
+            self.assertEqual(buffer.get_size(), pool.layout.size)
+        self.assertEqual(pool.layout.shape, (4, 8, 3))
+
+    def test_map_outputs(self):
+        from monaistream.streamrunner.gstreamer.bufferpool import OutputPools
+
+        Gst = self.Gst
+        pads = [Gst.Pad.new("src_0", Gst.PadDirection.SRC), Gst.Pad.new("src_1", Gst.PadDirection.SRC)]
+        pools = OutputPools()
+        self.addCleanup(pools.close)
+
+        with ExitStack() as stack:
+            buffers, arrays = pools.map_outputs(pads, stack, caps=[self.caps(), self.caps(16, 8, "GRAY8")])
+            self.assertEqual([a.shape for a in arrays], [(4, 8, 3), (8, 16, 1)])
+            arrays[0][...] = 5
+            arrays[1][...] = 6
+
+        for buffer, size, value in zip(buffers, (4 * 8 * 3, 8 * 16), (5, 6)):
+            is_mapped, map_info = buffer.map(Gst.MapFlags.READ)
+            self.assertTrue(is_mapped)
+            self.assertEqual(set(bytes(map_info.data)[:size]), {value})
+            buffer.unmap(map_info)
+
+    def test_pool_recreated_when_caps_change(self):
+        from monaistream.streamrunner.gstreamer.bufferpool import OutputPools
+
+        pad = self.Gst.Pad.new("src", self.Gst.PadDirection.SRC)
+        pools = OutputPools()
+        self.addCleanup(pools.close)
+
+        pool = pools.get(pad, self.caps())
+        self.assertIs(pools.get(pad, self.caps()), pool)
+        resized = pools.get(pad, self.caps(16, 8))
+        self.assertIsNot(resized, pool)
+        self.assertEqual(resized.layout.shape, (8, 16, 3))
+
+        pools.remove(pad)
+        self.assertIsNot(pools.get(pad, self.caps(16, 8)), resized)
+
+
+if __name__ == "__main__":
+    unittest.main()
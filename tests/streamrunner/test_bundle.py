@@ -0,0 +1,73 @@
+import os
+import unittest
+
+import numpy as np
+
+from monaistream.streamrunner.arrays import as_numpy
+from monaistream.streamrunner.bundle import BundleRunner, clear_bundle_cache, load_bundle
+
+BLUR_BUNDLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test_bundles", "blur")
+CPU = {"device": "$torch.device('cpu')"}
+
+
+class TestBundleRunner(unittest.TestCase):
+
+    def setUp(self):
+        clear_bundle_cache()
+
+    def test_run_frames(self):
+        runner = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (32, 40, 3), dtype=np.uint8) for _ in range(2)]
+        frames.append(rng.integers(0, 256, (16, 24, 3), dtype=np.uint8))
+
+        results = [as_numpy(r) for r in runner(frames)]
+
+        self.assertEqual([r.shape for r in results], [f.shape for f in frames])
+        self.assertTrue(all(r.dtype == np.uint8 for r in results))
+        # blurring with a wide kernel flattens the noise
+        self.assertLess(results[0].astype(float).std(), frames[0].astype(float).std())
+
+    def test_components_are_cached(self):
+        first = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        second = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        self.assertIs(first.components, second.components)
+        self.assertIs(load_bundle(BLUR_BUNDLE, overrides=CPU).network, first.components.network)
+
+        clear_bundle_cache()
+        self.assertIsNot(load_bundle(BLUR_BUNDLE, overrides=CPU), first.components)
+
+    def test_close_keeps_components_cached(self):
+        runner = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        components = runner.components
+        runner.close()
+        self.assertIsNone(runner.components)
+        # a runner created again, eg. when the pipeline is restarted, reuses the components
+        self.assertIs(BundleRunner(BLUR_BUNDLE, overrides=CPU).components, components)
+
+    def test_unload_evicts_when_unused(self):
+        first = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        second = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        components = first.components
+
+        first.unload()
+        self.assertIsNone(first.components)
+        self.assertIs(second.components, components)
+        self.assertIs(load_bundle(BLUR_BUNDLE, overrides=CPU), components)  # still used by the second runner
+
+        second.unload()
+        second.unload()  # no effect once released
+        self.assertIsNot(load_bundle(BLUR_BUNDLE, overrides=CPU), components)
+
+    def test_missing_config(self):
+        with self.assertRaises(ValueError):
+            load_bundle(BLUR_BUNDLE, config_file="configs/missing.json")
+
+    def test_planar_frames(self):
+        runner = BundleRunner(BLUR_BUNDLE, overrides=CPU)
+        with self.assertRaises(ValueError):
+            runner([(np.zeros((4, 4), np.uint8), np.zeros((2, 2, 2), np.uint8))])
+
+
+if __name__ == "__main__":
+    unittest.main()
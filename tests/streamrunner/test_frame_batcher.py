@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import torch
+
+from monaistream.streamrunner.gstreamer.batching import (
+    FrameBatcher,
+    FrameSet,
+    batch_inputs_by_shape,
+    scatter_batches,
+    stack_frames,
+    unstack_result,
+)
+
+
+class TestFrameBatcher(unittest.TestCase):
+
+    def test_full_batches_flush_in_order(self):
+        batches = list()
+        batcher = FrameBatcher(batches.append, max_batch=3, max_wait_ms=10000)
+        for i in range(7):
+            batcher.add(FrameSet([i], i))
+
+        self.assertEqual([[item.timestamps for item in b] for b in batches], [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(batcher.pending, 1)
+
+        batcher.flush()
+        self.assertEqual([item.timestamps for item in batches[-1]], [6])
+        batcher.close()
+
+    def test_deadline_flush(self):
+        flushed = threading.Event()
+        batches = list()
+
+        def flush(items):
+            batches.append(items)
+            flushed.set()
+
+        batcher = FrameBatcher(flush, max_batch=8, max_wait_ms=20)
+        start = time.monotonic()
+        batcher.add(FrameSet([0], 0))
+        batcher.add(FrameSet([1], 1))
+
+        self.assertTrue(flushed.wait(2.0))
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+        self.assertEqual([item.timestamps for item in batches[0]], [0, 1])
+        batcher.close()
+
+    def test_deadline_flush_error_keeps_thread(self):
+        flushed = threading.Event()
+        batches = list()
+
+        def flush(items):
+            if items[0].timestamps == 0:
+                raise ValueError("bad batch")
+            batches.append(items)
+            flushed.set()
+
+        batcher = FrameBatcher(flush, max_batch=8, max_wait_ms=10)
+        batcher.add(FrameSet([0], 0))
+        while batcher.pending:
+            time.sleep(0.001)
+        batcher.add(FrameSet([1], 1))
+
+        self.assertTrue(flushed.wait(2.0))
+        self.assertIsInstance(batcher.error, ValueError)
+        self.assertEqual([item.timestamps for item in batches[0]], [1])
+        batcher.close()
+        self.assertIsNone(batcher.error)
+
+    def test_clear_discards_pending(self):
+        batches = list()
+        batcher = FrameBatcher(batches.append, max_batch=4, max_wait_ms=10000)
+        batcher.add(FrameSet([0], 0))
+        batcher.clear()
+        batcher.flush()
+        self.assertEqual(batches, [])
+        batcher.close()
+
+    def test_stack_and_unstack(self):
+        frames = [np.full((2, 3, 1), i, dtype=np.uint8) for i in range(4)]
+        batch = stack_frames(frames)
+        self.assertEqual(batch.shape, (4, 2, 3, 1))
+
+        planes = stack_frames([(f, f[:1]) for f in frames])
+        self.assertEqual((planes[0].shape, planes[1].shape), ((4, 2, 3, 1), (4, 1, 3, 1)))
+
+        results = unstack_result(batch, 4)
+        self.assertTrue(all(np.array_equal(r, f) for r, f in zip(results, frames)))
+        with self.assertRaises(ValueError):
+            unstack_result(batch, 3)
+
+
+class TestCrossPadBatching(unittest.TestCase):
+
+    def test_group_and_scatter(self):
+        inputs = [
+            np.full((4, 6, 3), 0, dtype=np.uint8),
+            np.full((2, 2, 3), 1, dtype=np.uint8),
+            np.full((4, 6, 3), 2, dtype=np.uint8),
+        ]
+        batches, groups = batch_inputs_by_shape(inputs)
+
+        self.assertEqual(groups, [[0, 2], [1]])
+        self.assertEqual(batches[0].shape, (2, 3, 4, 6))
+        self.assertEqual(batches[1].shape, (1, 3, 2, 2))
+
+        outputs = scatter_batches([b + 1 for b in batches], groups, len(inputs))
+        for i, o in zip(inputs, outputs):
+            self.assertEqual(o.shape, i.shape)
+            np.testing.assert_array_equal(o, i + 1)
+
+    def test_temporal_batches_torch(self):
+        inputs = [torch.full((5, 4, 6, 3), i, dtype=torch.float32) for i in range(4)]
+        batches, groups = batch_inputs_by_shape(inputs)
+
+        self.assertEqual(groups, [[0, 1, 2, 3]])
+        self.assertEqual(tuple(batches[0].shape), (20, 3, 4, 6))
+
+        outputs = scatter_batches(batches[0] * 2, groups, len(inputs), frames_per_input=5)
+        for i, o in zip(inputs, outputs):
+            self.assertTrue(torch.equal(o, i * 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import threading
+import time
+import unittest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from monaistream.streamrunner.server import InferenceServer, get_server, register_server, unregister_server
+
+
+class RecordingModel:
+
+    def __init__(self):
+        self.batches = list()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch, states):
+        self.release.wait()
+        self.batches.append([int(frames[0][0]) for frames in batch])
+        for state in states:
+            state["calls"] = state.get("calls", 0) + 1
+        return [[frames[0] * 2] for frames in batch]
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    def hold(self, server, model):
+        """
+        Block the model on a first request, so the requests submitted next queue up behind it. Returns its future.
+        """
+        model.release.clear()
+        future = server.attach("blocker").submit([np.array([-1])])
+        while server.stats["blocker"].pending:
+            time.sleep(0.001)  # until the worker has taken the blocking request
+        return future
+
+    def test_results_per_stream(self):
+        model = RecordingModel()
+        server = InferenceServer(model, max_batch=4)
+        a, b = server.attach("a"), server.attach("b")
+        self.assertEqual(int(a([np.array([3])])[0][0]), 6)
+        self.assertEqual(int(b([np.array([5])])[0][0]), 10)
+        self.assertEqual(a.state, {"calls": 1})
+        self.assertEqual(server.stats["a"].completed, 1)
+        with self.assertRaises(ValueError):
+            server.attach("a")
+        server.close()
+
+    def test_batches_across_streams_weighted(self):
+        model = RecordingModel()
+        server = InferenceServer(model, max_batch=3)
+        heavy, light = server.attach("heavy", weight=2.0), server.attach("light")
+        futures = [self.hold(server, model)]
+        futures += [heavy.submit([np.array([i])]) for i in range(4)]
+        futures += [light.submit([np.array([100 + i])]) for i in range(4)]
+        model.release.set()
+        for f in futures:
+            f.result(5.0)
+        server.close()
+
+        # after the blocker, heavy gets two requests for each of light's, each stream in submission order
+        served = [i for batch in model.batches[1:] for i in batch]
+        self.assertEqual(served[:6], [0, 100, 1, 2, 101, 3])
+        self.assertTrue(all(len(batch) <= 3 for batch in model.batches))
+        self.assertEqual(server.stats["heavy"].completed, 4)
+
+    def test_deadline_policy(self):
+        model = RecordingModel()
+        server = InferenceServer(model, max_batch=1, policy="deadline")
+        relaxed, urgent = server.attach("relaxed", deadline_ms=10000), server.attach("urgent", deadline_ms=1)
+        futures = [self.hold(server, model)]
+        futures += [relaxed.submit([np.array([i])]) for i in range(2)]
+        futures += [urgent.submit([np.array([100 + i])]) for i in range(2)]
+        model.release.set()
+        for f in futures:
+            f.result(5.0)
+        server.close()
+        self.assertEqual([b[0] for b in model.batches[1:]], [100, 101, 0, 1])
+        self.assertEqual(server.stats["urgent"].completed, 2)
+
+    def test_collate_groups_by_shape(self):
+        calls = list()
+
+        def model(batch, states):
+            calls.append(batch[0].shape)
+            return [batch[0] + 1]
+
+        server = InferenceServer(model, max_batch=4, max_wait_ms=200, collate=True)
+        slots = [server.attach(str(i)) for i in range(4)]
+        shapes = [(2, 2), (2, 2), (3, 3), (2, 2)]
+        futures = [s.submit([np.zeros(shape)]) for s, shape in zip(slots, shapes)]
+        results = [f.result(5.0) for f in futures]
+        server.close()
+
+        self.assertEqual(sorted(calls), [(1, 3, 3), (3, 2, 2)])
+        self.assertEqual([r[0].shape for r in results], shapes)
+
+    def test_model_error_fails_requests(self):
+        def model(batch, states):
+            raise ValueError("bad batch")
+
+        server = InferenceServer(model)
+        slot = server.attach("a")
+        with self.assertRaises(ValueError):
+            slot([np.zeros(1)])
+        self.assertEqual(server.stats["a"].failed, 1)
+        slot.detach()
+        with self.assertRaises(RuntimeError):
+            slot.submit([np.zeros(1)])
+        server.close()
+
+    def test_stream_requests_not_run_concurrently(self):
+        model = RecordingModel()
+        model.release.clear()
+        server = InferenceServer(model, max_batch=1, n_workers=2)
+        slot = server.attach("a")
+        futures = [slot.submit([np.array([i])]) for i in range(2)]
+        time.sleep(0.05)
+        self.assertEqual(server.stats["a"].pending, 1)  # held back while the first runs on the other worker
+        model.release.set()
+        self.assertEqual([int(f.result(5.0)[0][0]) for f in futures], [0, 2])
+        server.close()
+        self.assertEqual(model.batches, [[0], [1]])
+        self.assertEqual(slot.state, {"calls": 2})
+
+    def test_timed_out_request_is_withdrawn(self):
+        model = RecordingModel()
+        server = InferenceServer(model, timeout=0.05)
+        blocker = self.hold(server, model)
+        slot = server.attach("a")
+        with self.assertRaises(FutureTimeoutError):
+            slot([np.array([1])])
+        self.assertEqual(server.stats["a"].pending, 0)
+        self.assertEqual(server.stats["a"].failed, 1)
+        model.release.set()
+        blocker.result(5.0)
+        server.close()
+        self.assertEqual(model.batches, [[-1]])
+
+    def test_registry(self):
+        server = InferenceServer(RecordingModel())
+        register_server("endoscopy", server)
+        try:
+            self.assertIs(get_server("endoscopy"), server)
+            with self.assertRaises(ValueError):
+                register_server("endoscopy", InferenceServer(RecordingModel()))
+        finally:
+            unregister_server("endoscopy")
+        with self.assertRaises(ValueError):
+            get_server("endoscopy")
+
+
+if __name__ == "__main__":
+    unittest.main()
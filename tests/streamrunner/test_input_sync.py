@@ -0,0 +1,120 @@
+import threading
+import unittest
+
+from monaistream.streamrunner.gstreamer.sync import InputSynchronizer
+
+MS = 1000000
+
+
+class TestInputSynchronizer(unittest.TestCase):
+
+    def setUp(self):
+        self.sets = list()
+        self.sync = InputSynchronizer(tolerance=10 * MS, primary="cam")
+        for name in ("cam", "depth"):
+            self.sync.add(name)
+
+    def push(self, name, t):
+        return self.sync.push(name, t * MS, f"{name}@{t}", self.sets.append)
+
+    def test_closest_within_tolerance(self):
+        for t in (0, 33, 66):
+            self.push("depth", t)
+        self.push("cam", 40)
+        self.push("cam", 70)
+        self.assertEqual(self.sets, [["cam@40", "depth@33"], ["cam@70", "depth@66"]])
+        self.assertEqual(self.sync.stats.discarded, 2)
+
+    def test_primary_waits_for_lagging_input(self):
+        self.push("depth", 0)
+        self.assertEqual(self.push("cam", 33), 0)
+        self.assertEqual(self.push("depth", 30), 1)
+        self.assertEqual(self.sets, [["cam@33", "depth@30"]])
+
+    def test_missed_and_finished(self):
+        self.push("depth", 100)
+        self.push("cam", 50)
+        self.assertEqual(self.sync.stats.missed, 1)
+
+        self.push("cam", 200)
+        self.assertEqual(self.sync.finish("depth", self.sets.append), 0)
+        self.assertEqual(self.sets, [])
+        self.assertEqual(self.sync.stats.missed, 2)
+
+    def test_any_tolerance_uses_latest(self):
+        self.sync.tolerance = None
+        self.push("depth", 0)
+        self.push("depth", 500)
+        self.push("cam", 1000)
+        self.assertEqual(self.sets, [["cam@1000", "depth@500"]])
+
+    def test_add_and_remove_inputs(self):
+        self.sync.add("ir")
+        self.push("depth", 30)
+        self.assertEqual(self.push("cam", 33), 0)  # waits for the new input
+        self.assertEqual(self.sync.remove("ir", self.sets.append), 1)
+        self.assertEqual(self.sets, [["cam@33", "depth@30"]])
+        self.assertEqual(self.push("ir", 40), 0)
+
+        self.push("cam", 66)
+        self.assertEqual(self.sync.remove("cam", self.sets.append), 0)
+        self.assertEqual(self.sync.stats.missed, 1)
+        self.assertEqual(self.sync.names, ("depth",))
+        self.push("depth", 70)
+        self.assertEqual(self.sets[-1], ["depth@70"])
+
+        # an input rejoining keeps its place in the sets
+        self.sync.add("cam", 0)
+        self.assertEqual(self.sync.names, ("cam", "depth"))
+        self.push("depth", 100)
+        self.push("cam", 100)
+        self.assertEqual(self.sets[-1], ["cam@100", "depth@100"])
+
+    def test_waiting_set_does_not_block_other_inputs(self):
+        sync = InputSynchronizer(tolerance=None)
+        sync.add("a")
+        handled = list()
+        entered, release = threading.Event(), threading.Event()
+
+        def handler(items):
+            if not handled:
+                entered.set()
+                release.wait(5.0)
+            handled.append(items[0])
+
+        first = threading.Thread(target=sync.push, args=("a", 0, 0, handler))
+        first.start()
+        self.assertTrue(entered.wait(5.0))
+        second = threading.Thread(target=sync.push, args=("a", 1, 1, handler))
+        second.start()
+
+        # the second set waits for its turn without holding the lock the other inputs need
+        done = threading.Event()
+        threading.Thread(target=lambda: (sync.add("b"), sync.push("b", 0, "b0", handler), done.set())).start()
+        self.assertTrue(done.wait(1.0))
+
+        release.set()
+        first.join(5.0)
+        second.join(5.0)
+        self.assertEqual(handled, [0, 1])
+
+    def test_concurrent_inputs_keep_order(self):
+        sync = InputSynchronizer(tolerance=0, max_pending=1000, max_slot=1000)
+        sync.add("a")
+        sync.add("b")
+        handled = list()
+
+        def feed(name):
+            for t in range(500):
+                sync.push(name, t, t, lambda items: handled.append(items[0]))
+
+        threads = [threading.Thread(target=feed, args=(n,)) for n in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(handled, list(range(500)))
+
+
+if __name__ == "__main__":
+    unittest.main()
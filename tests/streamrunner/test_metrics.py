@@ -0,0 +1,88 @@
+import unittest
+import urllib.request
+
+from monaistream.streamrunner.metrics import FRAMES, OP_SECONDS, QUEUE_DEPTH, MetricsRegistry, serve_metrics
+
+
+class Element:
+
+    def __init__(self, depth):
+        self.depth = depth
+
+    def collect(self):
+        yield QUEUE_DEPTH, dict(element="e0", pad="sink_0"), self.depth
+
+
+class CountingElement:
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def collect(self):
+        self.calls += 1
+        yield QUEUE_DEPTH, dict(element=self.name, pad="sink_0"), 1
+
+    def labels(self):
+        return dict(element=self.name)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_counters_histograms_and_collectors(self):
+        registry = MetricsRegistry()
+        registry.inc(FRAMES, element="e0", pad="sink_0")
+        registry.inc(FRAMES, 2, element="e0", pad="sink_0")
+        registry.inc(FRAMES, element="e1", pad="sink_0")
+        for value in (0.002, 0.004, 0.2):
+            registry.observe(OP_SECONDS, value, element="e0")
+        element = Element(3)
+        registry.add_collector(element.collect)
+
+        snapshot = registry.snapshot(element="e0")
+        self.assertEqual(snapshot[FRAMES], [({"element": "e0", "pad": "sink_0"}, 3)])
+        self.assertEqual(snapshot[QUEUE_DEPTH], [({"element": "e0", "pad": "sink_0"}, 3)])
+        histogram = snapshot[OP_SECONDS][0][1]
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.quantile(0.5), 0.005)
+
+        text = registry.to_prometheus()
+        self.assertIn("# TYPE monaistream_frames_total counter", text)
+        self.assertIn('monaistream_frames_total{element="e1",pad="sink_0"} 1', text)
+        self.assertIn('monaistream_do_op_seconds_bucket{element="e0",le="+Inf"} 3', text)
+
+        del element
+        registry.remove(element="e0")
+        self.assertEqual(set(registry.snapshot()), {FRAMES})
+
+    def test_filtered_export_skips_other_elements_collectors(self):
+        registry = MetricsRegistry()
+        elements = [CountingElement("e0"), CountingElement("e1")]
+        for element in elements:
+            registry.add_collector(element.collect, labels=element.labels)
+
+        self.assertEqual(registry.snapshot(element="e1")[QUEUE_DEPTH], [({"element": "e1", "pad": "sink_0"}, 1)])
+        self.assertEqual([e.calls for e in elements], [0, 1])
+        registry.snapshot(pad="sink_0")  # not filtered on the collectors' labels
+        self.assertEqual([e.calls for e in elements], [1, 2])
+
+        # the labels are read on each export, eg. after an element is renamed
+        elements[0].name = "e2"
+        self.assertEqual(len(registry.snapshot(element="e2")[QUEUE_DEPTH]), 1)
+        self.assertEqual([e.calls for e in elements], [2, 2])
+
+    def test_http_endpoint(self):
+        registry = MetricsRegistry()
+        registry.inc(FRAMES, element="e0", pad="sink_0")
+        server = serve_metrics(0, registry=registry)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+        self.assertIn('monaistream_frames_total{element="e0",pad="sink_0"} 1', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from monaistream.streamrunner.gstreamer.processes import ProcessWorkerPool, SharedFrameRing
+
+
+def scale(frames):
+    time.sleep(random.uniform(0, 0.01))
+    return [frames[0].astype(np.float32) * 2, (frames[1][0] + 1,)]
+
+
+def fail_on_three(frames):
+    if frames[0][0, 0] == 3:
+        raise ValueError("bad frame")
+    return [frames[0]]
+
+
+def exit_on_two(frames):
+    if frames[0][0, 0] == 2:
+        os._exit(3)
+    return [frames[0]]
+
+
+class ExitOnTwoOnce:
+    """Exits on frame 2, except in the process replacing the one that did, as a crash that does not recur would."""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __call__(self, frames):
+        if frames[0][0, 0] == 2 and not os.path.exists(self.marker):
+            open(self.marker, "w").close()
+            os._exit(3)
+        return [frames[0]]
+
+
+def upscale(frames):
+    return [np.repeat(frames[0].astype(np.float64), 4, axis=1)]
+
+
+def frame(value, shape=(4, 6)):
+    return np.full(shape, value, np.uint8)
+
+
+def copy(results):
+    if isinstance(results, (list, tuple)):
+        return type(results)(copy(r) for r in results)
+    return np.array(results) if isinstance(results, np.ndarray) else results
+
+
+class Collector:
+
+    def __init__(self):
+        self.emitted = list()
+        self.threads = set()
+
+    def __call__(self, results, context):
+        # results are views of the shared memory, so keep copies
+        self.emitted.append((context, copy(results)))
+        self.threads.add(threading.current_thread().name)
+
+
+class TestSharedFrameRing(unittest.TestCase):
+
+    def test_write_and_attach(self):
+        ring = SharedFrameRing(2, 256)
+        other = SharedFrameRing(2, 256, ring.name)
+        try:
+            desc = ring.write(1, [frame(7), (frame(1, (2, 3)), frame(2, (1, 3)))])
+            frames = other.read(1, desc)
+            self.assertEqual(frames[0].shape, (4, 6))
+            self.assertIsInstance(frames[1], tuple)
+            self.assertEqual([int(p[0, 0]) for p in frames[1]], [1, 2])
+
+            frames[0][:] = 9  # views share the memory
+            self.assertEqual(int(ring.read(1, desc)[0][0, 0]), 9)
+
+            big = np.zeros((64, 64), np.float32)
+            desc = ring.write(0, [big])
+            self.assertEqual(desc[0], "inline")  # too large for a slot
+            self.assertTrue(np.array_equal(other.read(0, desc)[0], big))
+            del frames
+        finally:
+            other.close()
+            ring.close(unlink=True)
+
+
+class TestProcessWorkerPool(unittest.TestCase):
+
+    def test_results_emitted_in_submission_order(self):
+        collector = Collector()
+        pool = ProcessWorkerPool(scale, collector, n_processes=3, max_in_flight=4)
+        for i in range(20):
+            pool.submit([frame(i), (frame(i, (2, 3)),)], context=i)
+        self.assertTrue(pool.drain(20.0))
+        pool.close()
+
+        self.assertIsNone(pool.error)
+        self.assertEqual([c for c, _ in collector.emitted], list(range(20)))
+        for i, (_, (scaled, planes)) in enumerate(collector.emitted):
+            self.assertEqual(scaled.dtype, np.float32)
+            self.assertEqual(float(scaled[0, 0]), 2.0 * i)
+            self.assertEqual(int(planes[0][0, 0]), i + 1)
+        self.assertEqual(pool.in_flight, 0)
+
+    def test_done_items_keep_their_place(self):
+        collector = Collector()
+        pool = ProcessWorkerPool(fail_on_three, collector, n_processes=2, max_in_flight=3)
+        pool.submit([frame(1)], context=1)
+        pool.submit_done(["forwarded"], context="skip")
+        pool.submit([frame(2)], context=2)
+        pool.submit([frame(3)], context=3)
+        pool.submit([frame(4)], context=4)
+        pool.close()
+
+        self.assertEqual([c for c, _ in collector.emitted], [1, "skip", 2, 4])
+        self.assertIsInstance(pool.error, RuntimeError)
+        self.assertIn("bad frame", str(pool.error))
+
+    def test_dead_worker_fails_outstanding_items(self):
+        collector = Collector()
+        pool = ProcessWorkerPool(exit_on_two, collector, n_processes=1, max_in_flight=3, max_restarts=0)
+        for i in range(1, 4):
+            pool.submit([frame(i)], context=i)
+        self.assertTrue(pool.drain(10.0))
+        pool.close()
+
+        self.assertEqual([c for c, _ in collector.emitted], [1])
+        self.assertIn("exited with code 3", str(pool.error))
+
+    def test_dead_worker_is_replaced(self):
+        collector = Collector()
+        marker = os.path.join(tempfile.mkdtemp(), "exited")
+        pool = ProcessWorkerPool(ExitOnTwoOnce(marker), collector, n_processes=1, max_in_flight=1)
+        for i in range(1, 5):
+            pool.submit([frame(i)], context=i)
+        self.assertTrue(pool.drain(20.0))
+        pool.close()
+
+        self.assertIsNone(pool.error)
+        self.assertEqual([c for c, _ in collector.emitted], [1, 3, 4])  # only the frame it died on is lost
+        self.assertEqual((pool.lost, pool.restarts), (1, 1))
+
+    def test_slots_grow_with_frames_and_results(self):
+        collector = Collector()
+        pool = ProcessWorkerPool(upscale, collector, n_processes=1, max_in_flight=2, result_slot_bytes=64)
+        pool.submit([frame(1)], context=1)
+        first = pool._rings.inputs.slot_bytes
+        for i in range(2, 5):
+            pool.submit([frame(i, (8, 12))], context=i)
+        self.assertTrue(pool.drain(20.0))
+        rings = pool._rings
+        pool.close()
+
+        self.assertIsNone(pool.error)
+        self.assertEqual([c for c, _ in collector.emitted], [1, 2, 3, 4])
+        self.assertEqual([r[0].shape for _, r in collector.emitted], [(4, 24)] + [(8, 48)] * 3)
+        self.assertGreaterEqual(rings.inputs.slot_bytes, frame(0, (8, 12)).nbytes)
+        self.assertGreater(rings.inputs.slot_bytes, first)
+        self.assertGreaterEqual(rings.outputs.slot_bytes, 8 * 48 * 8)  # results no longer sent inline
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from monaistream.streamrunner.gstreamer.qos import QosController
+
+MS = 1000000
+
+
+class TestQosController(unittest.TestCase):
+
+    def test_off_processes_everything(self):
+        qos = QosController()
+        qos.update(1.0, 50 * MS, 100 * MS)
+        self.assertEqual(qos.decide(10 * MS, now=500 * MS).action, "process")
+        self.assertEqual(qos.stats.processed, 1)
+
+    def test_downstream_qos_events(self):
+        qos = QosController("drop")
+        qos.update(1.5, 20 * MS, 100 * MS)
+
+        late = qos.decide(110 * MS)
+        self.assertEqual((late.action, late.jitter, late.from_clock), ("drop", 10 * MS, False))
+        self.assertEqual(qos.decide(130 * MS).action, "process")
+
+        qos.max_lateness = 15 * MS
+        self.assertEqual(qos.decide(110 * MS).action, "process")
+
+        qos.reset()
+        self.assertEqual(qos.decide(0).action, "process")
+        stats = qos.stats
+        self.assertEqual((stats.processed, stats.dropped, stats.skipped), (3, 1, 0))
+
+    def test_clock_deadline(self):
+        qos = QosController("skip")
+        qos.set_latency(40 * MS)
+
+        self.assertEqual(qos.decide(100 * MS, 33 * MS, now=170 * MS).action, "process")
+        late = qos.decide(100 * MS, 33 * MS, now=180 * MS)
+        self.assertEqual((late.action, late.jitter, late.from_clock), ("skip", 7 * MS, True))
+        self.assertEqual(qos.decide(None, now=180 * MS).action, "process")
+        self.assertEqual(qos.stats.skipped, 1)
+
+        with self.assertRaises(ValueError):
+            qos.mode = "fast"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import threading
+import unittest
+
+from monaistream.streamrunner.gstreamer.sync import InputSynchronizer
+from monaistream.streamrunner.queues import InputQueues, QueuePolicy, parse_queue_policy
+
+MS = 1000000
+
+
+class TestQueuePolicies(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertIsNone(parse_queue_policy(None))
+        self.assertEqual(parse_queue_policy("keep-latest"), QueuePolicy("keep-latest"))
+        self.assertEqual(parse_queue_policy({"kind": "drop-oldest", "max_items": 4}).max_items, 4)
+        with self.assertRaises(ValueError):
+            parse_queue_policy("lifo")
+        with self.assertRaises(ValueError):
+            parse_queue_policy("bounded-bytes")
+
+    def test_drop_policies(self):
+        cases = {
+            "drop-oldest": ([2, 3], 2, 0),
+            "drop-newest": ([0, 1], 0, 2),
+            "keep-latest": ([3], 3, 0),
+        }
+        for kind, (kept, dropped_oldest, dropped_newest) in cases.items():
+            queues = InputQueues(QueuePolicy(kind, max_items=2), ["sink_0"])
+            for i in range(4):
+                queues.put("sink_0", i)
+            stats = queues.stats["sink_0"]
+            counts = (stats.received, stats.dropped_oldest, stats.dropped_newest)
+            self.assertEqual(counts, (4, dropped_oldest, dropped_newest), kind)
+            self.assertEqual([queues.get_set()[0] for _ in kept], kept, kind)
+
+    def test_bounded_bytes(self):
+        queues = InputQueues(QueuePolicy("bounded-bytes", max_bytes=100), ["sink_0"])
+        for i in range(5):
+            queues.put("sink_0", i, nbytes=40)
+        stats = queues.stats["sink_0"]
+        self.assertEqual((stats.depth, stats.bytes, stats.dropped_oldest), (2, 80, 3))
+        self.assertEqual(queues.get_set(), [3])
+
+    def test_block_and_sets(self):
+        queues = InputQueues(QueuePolicy("block", max_items=1), ["sink_0", "sink_1"])
+        queues.put("sink_0", "a0")
+
+        put = threading.Event()
+        t = threading.Thread(target=lambda: (queues.put("sink_0", "a1"), put.set()))
+        t.start()
+        self.assertFalse(put.wait(0.1))
+        self.assertIsNone(queues.get_set(timeout=0.05))
+
+        queues.put("sink_1", "b0")
+        self.assertEqual(queues.get_set(), ["a0", "b0"])
+        self.assertTrue(put.wait(2.0))
+        t.join()
+        self.assertFalse(queues.wait_idle(timeout=0.05))
+        queues.task_done()
+        self.assertTrue(queues.wait_idle(timeout=0.05))
+
+        queues.close()
+        self.assertFalse(queues.put("sink_1", "b1"))
+        self.assertIsNone(queues.get_set())
+
+    def test_remove_releases_blocked_producer(self):
+        queues = InputQueues(QueuePolicy("block", max_items=1), ["sink_0", "sink_1"])
+        queues.put("sink_1", "b0")
+
+        results = list()
+        t = threading.Thread(target=lambda: results.append(queues.put("sink_1", "b1")))
+        t.start()
+        queues.remove("sink_1")
+        t.join(2.0)
+        self.assertEqual(results, [False])
+        self.assertFalse(queues.put("sink_1", "b2"))
+        self.assertEqual(queues.names, ("sink_0",))
+
+        queues.put("sink_0", "a0")
+        self.assertEqual(queues.get_set(timeout=0.05), ["a0"])
+
+        queues.add("sink_2")
+        queues.put("sink_0", "a1")
+        self.assertIsNone(queues.get_set(timeout=0.05))
+        queues.put("sink_2", "c0")
+        self.assertEqual(queues.get_set(timeout=0.05), ["a1", "c0"])
+
+        queues.add("sink_1", 1)
+        self.assertEqual(queues.names, ("sink_0", "sink_1", "sink_2"))
+
+    def test_get_next_in_arrival_order(self):
+        queues = InputQueues(QueuePolicy("drop-oldest", max_items=2), ["sink_0", "sink_1"])
+        for name, item in (("sink_1", "b0"), ("sink_0", "a0"), ("sink_0", "a1"), ("sink_0", "a2"), ("sink_1", "b1")):
+            queues.put(name, item)
+        taken = list()
+        for _ in range(4):
+            taken.append(queues.get_next(timeout=0.05))
+            queues.task_done()
+        self.assertEqual(taken, [("sink_1", "b0"), ("sink_0", "a1"), ("sink_0", "a2"), ("sink_1", "b1")])
+        self.assertTrue(queues.wait_idle(["sink_0"], timeout=0.05))
+        self.assertIsNone(queues.get_next(timeout=0.05))
+
+    def test_queued_inputs_aligned_on_timestamps(self):
+        # the backend's dispatcher: queued buffers go through the synchronizer, so sets pair the closest timestamps
+        # and follow the primary input rather than queue positions
+        queues = InputQueues(QueuePolicy("block", max_items=8), ["depth", "cam"])
+        sync = InputSynchronizer(tolerance=5 * MS, primary="cam")
+        for name in ("depth", "cam"):
+            sync.add(name)
+        for t in (0, 10, 20, 30):
+            queues.put("depth", (t * MS, f"depth@{t}"))
+        for t in (12, 22, 32):
+            queues.put("cam", (t * MS, f"cam@{t}"))
+
+        sets = list()
+        taken = queues.get_next(timeout=0.05)
+        while taken is not None:
+            name, (timestamp, item) = taken
+            sync.push(name, timestamp, item, sets.append)
+            queues.task_done()
+            taken = queues.get_next(timeout=0.05)
+        self.assertEqual(sets, [["depth@10", "cam@12"], ["depth@20", "cam@22"], ["depth@30", "cam@32"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
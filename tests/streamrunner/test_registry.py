@@ -0,0 +1,63 @@
+import ast
+import importlib.util
+import os
+import unittest
+
+from monaistream.streamrunner.gstreamer.registry import ELEMENTS, element_names, get_element_type
+
+PLUGIN_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "monaistream", "gstreamer", "python"
+)
+
+
+def class_definitions(module):
+    """Parse `module` without importing it and return its top-level classes by name."""
+    with open(importlib.util.find_spec(module).origin) as f:
+        tree = ast.parse(f.read())
+    return {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+
+
+def class_constant(node, name):
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and any(getattr(t, "id", None) == name for t in statement.targets):
+            return ast.literal_eval(statement.value)
+    return None
+
+
+class TestElementRegistry(unittest.TestCase):
+
+    def test_entries_match_implementations(self):
+        for entry in ELEMENTS.values():
+            with self.subTest(element=entry.name):
+                classes = class_definitions(entry.module)
+                self.assertIn(entry.class_name, classes)
+                node = classes[entry.class_name]
+                self.assertEqual(class_constant(node, "__gstmetadata__"), entry.metadata)
+                plugin_name = class_constant(node, "GST_PLUGIN_NAME")
+                if plugin_name is not None:
+                    self.assertEqual(plugin_name, entry.name)
+
+    def test_plugin_files(self):
+        files = sorted(f[:-3] for f in os.listdir(PLUGIN_DIR) if f.endswith(".py"))
+        self.assertSequenceEqual(files, sorted(element_names(advertised_only=True)))
+        # elements needing an op from Python get no plugin file, whether or not they have pad templates
+        self.assertEqual(files, ["gstbundlestreamrunner"])
+        self.assertTrue(ELEMENTS["gststreamrunnerbackend"].templates)
+        for name in files:
+            with open(os.path.join(PLUGIN_DIR, f"{name}.py")) as f:
+                self.assertIn(f'lazy_element_factory("{name}")', f.read())
+
+    def test_abstract_elements_not_registered_by_default(self):
+        abstract = {name for name, e in ELEMENTS.items() if e.abstract}
+        self.assertIn("gstinplacestreamrunner", abstract)
+        self.assertIn("gstadaptorstreamrunner", abstract)
+        self.assertFalse(abstract.intersection(element_names(concrete_only=True)))
+        self.assertEqual(set(element_names()) - set(element_names(concrete_only=True)), abstract)
+
+    def test_unknown_element(self):
+        with self.assertRaises(ValueError):
+            get_element_type("gstnosuchrunner")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import pickle
+import threading
+import unittest
+
+import numpy as np
+
+from monaistream.streamrunner.swap import SwappableOp
+
+
+class Model:
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.calls = list()
+        self.closed = False
+
+    def __call__(self, frames):
+        self.calls.append(int(frames[0][0]))
+        return [frames[0] * self.scale]
+
+    def close(self):
+        self.closed = True
+
+
+class Blocking(Model):
+
+    def __init__(self, scale):
+        super().__init__(scale)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, frames):
+        self.entered.set()
+        self.release.wait(5.0)
+        return super().__call__(frames)
+
+
+class TestSwappableOp(unittest.TestCase):
+
+    def test_swap_between_calls(self):
+        old, new = Model(2), Model(3)
+        op = SwappableOp(old)
+        self.assertEqual(int(op([np.array([1])])[0][0]), 2)
+        self.assertIs(op.swap(new), old)
+        self.assertTrue(old.closed)  # nothing was running on it
+        self.assertEqual(int(op([np.array([1])])[0][0]), 3)
+
+    def test_swap_with_own_release(self):
+        old = Model(2)
+        released = list()
+        op = SwappableOp(old, release=lambda o: self.fail("default release used"))
+        op.swap(None, release=released.append)
+        self.assertEqual(released, [old])
+        self.assertFalse(old.closed)
+
+    def test_old_op_released_after_in_flight_calls(self):
+        old, new = Blocking(2), Model(3)
+        op = SwappableOp(old)
+        results = list()
+        call = threading.Thread(target=lambda: results.append(op([np.array([1])])))
+        call.start()
+        self.assertTrue(old.entered.wait(5.0))
+
+        op.swap(new)
+        self.assertEqual(int(op([np.array([1])])[0][0]), 3)
+        self.assertFalse(old.closed)
+        self.assertFalse(op.drain(0.01))
+
+        old.release.set()
+        call.join(5.0)
+        self.assertTrue(op.drain(5.0))
+        self.assertTrue(old.closed)
+        self.assertEqual(int(results[0][0][0]), 2)  # the call that started on the old op finished on it
+
+    def test_load_warms_up_on_next_frame(self):
+        old, new = Model(2), Model(3)
+        op = SwappableOp(old)
+        future = op.load(lambda: new)
+
+        frame = np.array([7])
+        while not future.done():
+            op([frame])
+        self.assertIs(future.result(5.0), old)
+        self.assertEqual(new.calls[0], 7)  # warmed up on a copy of a streamed frame
+        self.assertIs(op.op, new)
+
+    def test_failed_load_keeps_current_op(self):
+        def fail():
+            raise ValueError("bad bundle")
+
+        old = Model(2)
+        op = SwappableOp(old)
+        future = op.load(fail, warmup_args=([np.array([1])],))
+        with self.assertRaises(ValueError):
+            future.result(5.0)
+        self.assertIs(op.op, old)
+        self.assertFalse(old.closed)
+
+    def test_superseded_load_is_cancelled(self):
+        old, first, second = Model(2), Blocking(3), Model(4)
+        op = SwappableOp(old)
+        args = ([np.array([1])],)
+        superseded = op.load(lambda: first, warmup_args=args)
+        self.assertTrue(first.entered.wait(5.0))
+        latest = op.load(lambda: second, warmup_args=args)
+        self.assertIs(latest.result(5.0), old)
+
+        first.release.set()
+        self.assertTrue(op.drain(5.0))
+        for _ in range(500):
+            if superseded.done():
+                break
+            threading.Event().wait(0.01)
+        self.assertTrue(superseded.cancelled())
+        self.assertTrue(first.closed)  # released without ever being swapped in
+        self.assertIs(op.op, second)
+        self.assertIs(op.warmup_args, args)
+
+    def test_pickles_current_op(self):
+        op = SwappableOp(Model(2))
+        op.swap(Model(5))
+        copy = pickle.loads(pickle.dumps(op))
+        self.assertEqual(copy.op.scale, 5)
+        with self.assertRaises(ValueError):
+            SwappableOp()([np.array([1])])
+
+
+if __name__ == "__main__":
+    unittest.main()
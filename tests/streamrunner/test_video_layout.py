@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestVideoLayout(unittest.TestCase):
+
+    def setUp(self):
+        import gi
+
+        gi.require_version("Gst", "1.0")
+        gi.require_version("GstVideo", "1.0")
+        from gi.repository import Gst, GstVideo
+
+        Gst.init(None)
+        self.Gst = Gst
+        self.GstVideo = GstVideo
+
+    def layout(self, format, width, height):
+        from monaistream.streamrunner.gstreamer.utils import VideoLayout
+
+        caps = self.Gst.Caps.from_string(f"video/x-raw,format={format},width={width},height={height}")
+        return VideoLayout.from_caps(caps)
+
+    def test_packed_rows_are_padded(self):
+        # RGB rows are padded to a multiple of 4 bytes
+        layout = self.layout("RGB", 5, 3)
+        self.assertEqual((layout.n_planes, layout.shape, layout.channels), (1, (3, 5, 3), 3))
+        self.assertEqual((layout.strides, layout.pixel_strides), ((16,), (3,)))
+        self.assertEqual(layout.size, 48)
+        self.assertFalse(layout.is_yuv)
+
+    def test_byte_order(self):
+        self.assertEqual(self.layout("GRAY16_LE", 4, 4).dtype, np.dtype("<u2"))
+        self.assertEqual(self.layout("GRAY16_BE", 4, 4).dtype, np.dtype(">u2"))
+
+    def test_subsampled_planes(self):
+        nv12 = self.layout("NV12", 5, 3)
+        self.assertTrue(nv12.is_yuv)
+        self.assertEqual(nv12.plane_shapes, ((3, 5, 1), (2, 3, 2)))
+
+        i420 = self.layout("I420", 5, 3)
+        self.assertEqual(i420.plane_shapes, ((3, 5, 1), (2, 3, 1), (2, 3, 1)))
+
+    def test_view(self):
+        layout = self.layout("RGB", 5, 3)
+        data = np.arange(layout.size, dtype=np.uint8)
+        view = layout.view(data)
+        self.assertEqual(view.shape, (3, 5, 3))
+        np.testing.assert_array_equal(view[1, 0], data[16:19])  # rows start at the padded stride
+
+        i420 = self.layout("I420", 4, 2)
+        planes = i420.view(np.zeros(i420.size, np.uint8))
+        self.assertEqual([p.shape for p in planes], [(2, 4, 1), (1, 2, 1), (1, 2, 1)])
+
+    def test_for_buffer_uses_video_meta(self):
+        Gst, GstVideo = self.Gst, self.GstVideo
+        layout = self.layout("GRAY8", 4, 2)
+        buffer = Gst.Buffer.new_allocate(None, 64, None)
+        self.assertIs(layout.for_buffer(buffer), layout)
+
+        # a decoder-style allocation with wider rows, described by a video meta
+        GstVideo.buffer_add_video_meta_full(
+            buffer, GstVideo.VideoFrameFlags.NONE, GstVideo.VideoFormat.GRAY8, 4, 2, 1, [8, 0, 0, 0], [16, 0, 0, 0]
+        )
+        padded = layout.for_buffer(buffer)
+        self.assertEqual((padded.offsets, padded.strides), ((8,), (16,)))
+        data = np.arange(64, dtype=np.uint8)
+        np.testing.assert_array_equal(padded.view(data)[1, :, 0], data[24:28])
+
+    def test_layout_cache(self):
+        from monaistream.streamrunner.gstreamer.utils import LayoutCache
+
+        Gst = self.Gst
+        pad = Gst.Pad.new("sink", Gst.PadDirection.SINK)
+        cache = LayoutCache()
+        with self.assertRaises(ValueError):
+            cache.get(pad)  # not negotiated
+
+        layout = cache.update(pad, Gst.Caps.from_string("video/x-raw,format=RGBA,width=4,height=2"))
+        self.assertIs(cache.get(pad), layout)
+        self.assertEqual(layout.shape, (2, 4, 4))
+        cache.remove(pad)
+        with self.assertRaises(ValueError):
+            cache.get(pad)
+
+
+if __name__ == "__main__":
+    unittest.main()
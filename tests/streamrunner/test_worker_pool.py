@@ -0,0 +1,62 @@
+import random
+import threading
+import time
+import unittest
+
+from monaistream.streamrunner.gstreamer.workers import OrderedWorkerPool
+
+
+class TestOrderedWorkerPool(unittest.TestCase):
+
+    def test_results_emitted_in_submission_order(self):
+        emitted = list()
+        pool = OrderedWorkerPool(emitted.append, n_workers=4, max_in_flight=8)
+        rng = random.Random(1234)
+
+        def work(i, delay):
+            time.sleep(delay)
+            return i
+
+        for i in range(40):
+            pool.submit(lambda i=i, d=rng.uniform(0, 0.005): work(i, d))
+
+        self.assertTrue(pool.drain(5.0))
+        self.assertEqual(emitted, list(range(40)))
+        pool.close()
+
+    def test_max_in_flight_blocks_submit(self):
+        release = threading.Event()
+        pool = OrderedWorkerPool(lambda r: None, n_workers=2, max_in_flight=2)
+        pool.submit(release.wait)
+        pool.submit(release.wait)
+
+        submitted = threading.Event()
+        t = threading.Thread(target=lambda: (pool.submit(lambda: None), submitted.set()))
+        t.start()
+        self.assertFalse(submitted.wait(0.1))
+        self.assertEqual(pool.in_flight, 2)
+
+        release.set()
+        self.assertTrue(submitted.wait(2.0))
+        t.join()
+        pool.close()
+        self.assertEqual(pool.in_flight, 0)
+
+    def test_error_is_recorded_and_skipped(self):
+        emitted = list()
+        pool = OrderedWorkerPool(emitted.append, n_workers=2, max_in_flight=4)
+
+        def fail():
+            raise RuntimeError("inference failed")
+
+        pool.submit(lambda: 0)
+        pool.submit(fail)
+        pool.submit(lambda: 2)
+        pool.close()
+
+        self.assertEqual(emitted, [0, 2])
+        self.assertIsInstance(pool.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+import torch
+
+from monaistream.streamrunner.gstreamer.yuv import YUV_TO_RGB_BT601, YUV_TO_RGB_BT601_FULL, yuv_to_rgb
+
+
+def reference(y, u, v, full_range=False):
+    """Per-pixel BT.601 conversion with each chroma sample covering a 2x2 block, in [0, 1]."""
+    height, width = y.shape
+    rows, cols = np.arange(height) // 2, np.arange(width) // 2
+    u = u[rows][:, cols].astype(np.float64) - 128.0
+    v = v[rows][:, cols].astype(np.float64) - 128.0
+    luma = y.astype(np.float64) - (0.0 if full_range else 16.0)
+    coefficients = YUV_TO_RGB_BT601_FULL if full_range else YUV_TO_RGB_BT601
+    rgb = np.stack([ky * luma + ku * u + kv * v for ky, ku, kv in coefficients], axis=-1)
+    return np.clip(rgb, 0.0, 255.0) / 255.0
+
+
+def random_planes(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 256, (height, width, 1), dtype=np.uint8)
+    uv = rng.integers(0, 256, ((height + 1) // 2, (width + 1) // 2, 2), dtype=np.uint8)
+    return y, uv
+
+
+class TestYuvToRgb(unittest.TestCase):
+
+    def test_nv12_matches_reference(self):
+        for height, width in ((4, 6), (5, 7), (48, 64)):
+            y, uv = random_planes(height, width)
+            for full_range in (False, True):
+                with self.subTest(shape=(height, width), full_range=full_range):
+                    rgb = yuv_to_rgb((y, uv), "NV12", full_range=full_range)
+                    self.assertEqual((rgb.shape, rgb.dtype), ((height, width, 3), np.float32))
+                    expected = reference(y[..., 0], uv[..., 0], uv[..., 1], full_range)
+                    np.testing.assert_allclose(rgb, expected, atol=1e-5)
+
+    def test_i420_into_channels_first_tensor(self):
+        y, uv = random_planes(6, 8, seed=1)
+        u, v = np.ascontiguousarray(uv[..., :1]), np.ascontiguousarray(uv[..., 1:])
+        out = torch.full((3, 6, 8), -1.0)
+        self.assertIs(yuv_to_rgb((y, u, v), "I420", out=out, channels_first=True), out)
+        expected = reference(y[..., 0], u[..., 0], v[..., 0]).transpose(2, 0, 1)
+        np.testing.assert_allclose(out.numpy(), expected, atol=1e-5)
+
+    def test_scale_and_clipping(self):
+        y = np.array([[[0], [255]], [[16], [235]]], np.uint8)
+        uv = np.full((1, 1, 2), 128, np.uint8)
+        rgb = yuv_to_rgb((y, uv), "NV12", scale=1.0)
+        np.testing.assert_allclose(rgb[..., 0], [[0.0, 255.0], [0.0, 1.164 * 219]], atol=1e-3)
+        np.testing.assert_allclose(rgb[..., 0], rgb[..., 2], atol=1e-3)  # grey without chroma
+
+    def test_unsupported_format(self):
+        y, uv = random_planes(2, 2)
+        with self.assertRaises(ValueError):
+            yuv_to_rgb((y, uv), "YUY2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from monai.utils.module import optional_import
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds allowed to import each module in a fresh interpreter, well above what it takes but far below the seconds
+# that importing Torch or MONAI costs
+IMPORT_BUDGET = 1.0
+HEAVY_MODULES = ("torch", "monai", "ignite")
+
+LIGHT_MODULES = (
+    "monaistream",
+    "monaistream.streamrunner.arrays",
+    "monaistream.streamrunner.metrics",
+    "monaistream.streamrunner.queues",
+    "monaistream.streamrunner.server",
+    "monaistream.streamrunner.swap",
+    "monaistream.streamrunner.gstreamer.qos",
+    "monaistream.streamrunner.gstreamer.sync",
+    "monaistream.streamrunner.gstreamer.batching",
+    "monaistream.streamrunner.gstreamer.workers",
+    "monaistream.streamrunner.gstreamer.processes",
+    "monaistream.streamrunner.gstreamer.registry",
+    "monaistream.streamrunner.gstreamer.yuv",
+)
+GST_MODULES = ("monaistream.streamrunner.gstreamer.backend", "monaistream.streamrunner.gstreamer_plugin")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps(dict(elapsed=elapsed, heavy=[m for m in sys.argv[2:] if m in sys.modules])))
+"""
+
+
+def import_in_fresh_process(module):
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE, module, *HEAVY_MODULES],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+class TestImportTime(unittest.TestCase):
+
+    def check_module(self, module):
+        result = import_in_fresh_process(module)
+        self.assertEqual(result["heavy"], [], f"importing {module} imported {result['heavy']}")
+        self.assertLess(result["elapsed"], IMPORT_BUDGET, f"importing {module} took {result['elapsed']:.2f}s")
+
+    def test_light_modules(self):
+        for module in LIGHT_MODULES:
+            with self.subTest(module=module):
+                self.check_module(module)
+
+    @unittest.skipUnless(optional_import("gi")[1], "PyGObject is not installed")
+    def test_gstreamer_modules(self):
+        for module in GST_MODULES:
+            with self.subTest(module=module):
+                self.check_module(module)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import unittest
+from queue import Empty, Full
+
+import torch
+
+from monaistream.streamrunner.metrics import DROPPED_FRAMES, QUEUE_DEPTH, MetricsRegistry
+from monaistream.transforms.gstreamer.streaming_sink_transform import SinkResult, StreamSinkTransform
+
+
+def batch(start, count=3):
+    return {
+        "pred": torch.arange(start, start + count).float().reshape(count, 1),
+        "frame_id": torch.arange(start, start + count),
+        "timestamp": [i * 40 for i in range(start, start + count)],
+    }
+
+
+class TestStreamSinkTransform(unittest.TestCase):
+
+    def test_result_per_call(self):
+        sink = StreamSinkTransform(result_key="pred", metrics=MetricsRegistry(), timeout=0.05)
+        data = batch(0)
+        self.assertIs(sink(data), data)
+        self.assertTrue(torch.equal(sink.get_result(), data["pred"]))
+        with self.assertRaises(Empty):
+            sink.get_result()
+
+    def test_decollate_tags_frames(self):
+        sink = StreamSinkTransform(
+            result_key="pred", decollate=True, id_key="frame_id", timestamp_key="timestamp", metrics=MetricsRegistry()
+        )
+        sink(batch(0))
+        sink(batch(3, 2))
+
+        results = sink.get_results(tagged=True)
+        self.assertEqual([(r.frame_id, r.timestamp) for r in results], [(i, i * 40) for i in range(5)])
+        self.assertIsInstance(results[0], SinkResult)
+        self.assertEqual([float(r.result) for r in results], [float(i) for i in range(5)])
+        self.assertEqual(sink.get_results(), [])
+
+    def test_bulk_get_limit(self):
+        sink = StreamSinkTransform(result_key="pred", decollate=True, metrics=MetricsRegistry())
+        sink(batch(0, 5))
+        self.assertEqual([float(r) for r in sink.get_results(max_n=2)], [0.0, 1.0])
+        self.assertEqual(sink.backlog, 3)
+
+    def test_overflow_policies(self):
+        expected = {"drop-oldest": [2.0, 3.0, 4.0], "drop-newest": [0.0, 1.0, 2.0], "keep-latest": [4.0]}
+        for policy, values in expected.items():
+            with self.subTest(policy=policy):
+                registry = MetricsRegistry()
+                sink = StreamSinkTransform(
+                    result_key="pred", buffer_size=3, policy=policy, decollate=True, metrics=registry, name="sink"
+                )
+                sink(batch(0, 5))
+                stats = sink.stats
+                self.assertEqual((stats.received, stats.dropped, stats.depth), (5, 5 - len(values), len(values)))
+                snapshot = registry.snapshot(element="sink")
+                self.assertEqual(snapshot[QUEUE_DEPTH][0][1], len(values))
+                self.assertEqual(snapshot[DROPPED_FRAMES][0][1], 5 - len(values))
+                self.assertEqual([float(r) for r in sink.get_results()], values)
+
+    def test_block_waits_for_consumer(self):
+        sink = StreamSinkTransform("pred", buffer_size=2, timeout=0.05, decollate=True, metrics=MetricsRegistry())
+        sink(batch(0, 1))
+        with self.assertRaises(Full):
+            sink(batch(1, 2))
+        self.assertEqual([float(r) for r in sink.get_results()], [0.0])  # none of the batch was added
+
+        sink = StreamSinkTransform("pred", buffer_size=2, timeout=2.0, decollate=True, metrics=MetricsRegistry())
+        consumed = list()
+        consumer = threading.Thread(target=lambda: consumed.extend(float(sink.get_result()) for _ in range(4)))
+        consumer.start()
+        sink(batch(0, 2))
+        sink(batch(2, 2))
+        consumer.join(2.0)
+        self.assertEqual(consumed, [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(sink.stats.max_depth, 2)
+
+        # a batch larger than the buffer is added whole once the sink is empty
+        sink = StreamSinkTransform("pred", buffer_size=1, timeout=0.05, decollate=True, metrics=MetricsRegistry())
+        sink(batch(0, 3))
+        self.assertEqual(sink.backlog, 3)
+
+    def test_unique_names_and_close(self):
+        registry = MetricsRegistry()
+        sinks = [StreamSinkTransform("pred", metrics=registry) for _ in range(2)]
+        self.assertNotEqual(sinks[0].name, sinks[1].name)
+        self.assertEqual(len(registry.snapshot()[QUEUE_DEPTH]), 2)
+        sinks[0].close()
+        self.assertEqual([labels["element"] for labels, _ in registry.snapshot()[QUEUE_DEPTH]], [sinks[1].name])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            StreamSinkTransform(policy="drop-everything")
+
+
+if __name__ == "__main__":
+    unittest.main()